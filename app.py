@@ -1,8 +1,36 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_from_directory, make_response, g, has_request_context, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import make_transient_to_detached
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+from passwords import PasswordHasher, PasswordHasherBusy
+from sessions import ServerSessionInterface, DatabaseSessionStore, FileSessionStore
+from ratelimit import SlidingWindowLimiter, MemoryRateStore, SQLiteRateStore, parse_rule
+from metrics import MetricsRegistry
+from events import EventBroker, SQLiteEventLog, TooManySubscribers, format_sse
+from cpf import cpf_digits, normalize_cpf, normalize_cpfs
+from collections import OrderedDict
 from functools import wraps
+from datetime import date, datetime, timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import base64
+import bisect
+import csv
+import hashlib
+import io
+import itertools
+import json
+import mimetypes
 import os
+import random
+import sqlite3
+import sys
+import threading
+import time
 
 app = Flask(__name__, 
             template_folder='pages',
@@ -12,39 +40,63 @@ app = Flask(__name__,
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 # SECRET_KEY: Em produção, gera automaticamente e salva em arquivo
+SECRET_KEY_FILE = os.path.join(basedir, '.secret_key')
+
+def create_secret_key_file(path=SECRET_KEY_FILE):
+    """
+    Gera a chave e grava o arquivo, se ele ainda não existir (feito no deploy por prepare_deployment)
+    Gravada em arquivo temporário e ligada com os.link: se vários workers subirem juntos sem
+    o arquivo, só um cria e todos leem a mesma chave, já completa
+    """
+    import secrets
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)  # apenas o owner
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        os.link(temp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.unlink(temp_path)
+
+def read_secret_key(path=SECRET_KEY_FILE):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
 def get_secret_key():
     """Obtém ou gera a SECRET_KEY para a aplicação"""
-    secret_key_file = os.path.join(basedir, '.secret_key')
-    
     # Primeiro, verifica variável de ambiente
     if os.environ.get('SECRET_KEY'):
         return os.environ.get('SECRET_KEY')
-    
-    # Tenta ler do arquivo
-    if os.path.exists(secret_key_file):
-        try:
-            with open(secret_key_file, 'r') as f:
-                key = f.read().strip()
-                if key:
-                    return key
-        except:
-            pass
-    
+
+    # Depois do deploy o arquivo já existe: apenas lê
+    key = read_secret_key()
+    if key:
+        return key
+
     # Gera nova chave e salva
-    import secrets
-    new_key = secrets.token_hex(32)
     try:
-        with open(secret_key_file, 'w') as f:
-            f.write(new_key)
-        # Define permissões restritas (apenas leitura para owner)
-        os.chmod(secret_key_file, 0o600)
-    except:
-        pass  # Se não conseguir salvar, usa a chave gerada apenas em memória
-    
-    return new_key
+        create_secret_key_file()
+        key = read_secret_key()
+    except OSError:
+        key = None
+    if not key:
+        import secrets
+        key = secrets.token_hex(32)  # Se não conseguir salvar, usa a chave gerada apenas em memória
+    return key
 
 app.config['SECRET_KEY'] = get_secret_key()
-app.config['SESSION_TYPE'] = 'filesystem'
+# Sessões: 'filesystem' ou 'database' guardam os dados no servidor (o cookie leva só o id);
+# 'cookie' usa o cookie assinado padrão do Flask
+app.config['SESSION_TYPE'] = os.environ.get('SESSION_TYPE', 'filesystem')
+app.config['SESSION_FILE_DIR'] = os.environ.get('SESSION_FILE_DIR', os.path.join(basedir, 'database', 'sessions'))
+app.config['SESSION_REFRESH_INTERVAL'] = int(os.environ.get('SESSION_REFRESH_INTERVAL', 60))  # renovação da expiração
+app.config['SESSION_SWEEP_INTERVAL'] = int(os.environ.get('SESSION_SWEEP_INTERVAL', 900))  # 0 = sem varredura
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hora
 
 # Rota para servir imagens da pasta images/
@@ -80,9 +132,235 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Ajustes do banco de dados (variáveis de ambiente DB_*)
+# SQLite: WAL permite leituras durante escritas; busy_timeout espera o lock em vez de falhar
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('DB_SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('DB_SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('DB_SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('DB_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('DB_SQLITE_CACHE_SIZE', -16000))  # negativo = KiB
+}
+
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'connect_args': {'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000}
+    }
+else:
+    # PostgreSQL e demais: pool de conexões reaproveitadas entre requisições
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true')
+    }
+
+# Cache do ranking compartilhado entre workers do Passenger
+# O arquivo guarda apenas um token de versão; vazio desativa o compartilhamento
+app.config['RANKING_CACHE_FILE'] = os.environ.get(
+    'RANKING_CACHE_FILE', os.path.join(basedir, 'database', '.ranking_version'))
+# Máximo de entradas nesse cache (ranking, snapshot, fragmentos e estatísticas)
+app.config['RANKING_CACHE_MAX'] = int(os.environ.get('RANKING_CACHE_MAX', 2048))
+# Páginas renderizadas por usuário/admin: cache próprio (LRU), um pico de logins não descarta o ranking
+app.config['PAGE_CACHE_MAX'] = int(os.environ.get('PAGE_CACHE_MAX', 512))
+# Mapa cupom -> embaixador (atribuição de vendas): versão própria, muda só ao criar/excluir
+app.config['COUPON_CACHE_FILE'] = os.environ.get(
+    'COUPON_CACHE_FILE', os.path.join(basedir, 'database', '.coupon_version'))
+app.config['COUPON_CACHE_MAX'] = int(os.environ.get('COUPON_CACHE_MAX', 10000))
+
+# Bytecode dos templates em disco: novos workers não recompilam os templates (vazio desativa)
+app.config['TEMPLATE_BYTECODE_DIR'] = os.environ.get(
+    'TEMPLATE_BYTECODE_DIR', os.path.join(basedir, '.jinja_cache'))
+if app.config['TEMPLATE_BYTECODE_DIR']:
+    try:
+        os.makedirs(app.config['TEMPLATE_BYTECODE_DIR'], exist_ok=True)
+        app.jinja_options = dict(app.jinja_options,
+                                 bytecode_cache=FileSystemBytecodeCache(app.config['TEMPLATE_BYTECODE_DIR']))
+    except OSError as e:
+        app.logger.warning('Cache de bytecode dos templates desativado: %s', e)
+
+# Arquivos estáticos gerados por build_assets.py (nome com hash do conteúdo + .gz/.br)
+# Sem o manifest, asset_url() usa os arquivos originais de assets/ e images/
+app.config['ASSETS_BUILD_DIR'] = os.environ.get('ASSETS_BUILD_DIR', os.path.join(basedir, 'assets', 'dist'))
+app.config['ASSETS_MAX_AGE'] = int(os.environ.get('ASSETS_MAX_AGE', 365 * 24 * 3600))  # nome muda a cada versão
+
+# Logs (app.logger) e métricas de desempenho (/admin/metrics)
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO').upper()
+app.logger.setLevel(app.config['LOG_LEVEL'])
+# Mesma consulta SQL repetida N vezes em uma requisição = suspeita de N+1
+app.config['METRICS_N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+# Log de requisições lentas (0 = desligado) com as consultas executadas, em uma amostra
+app.config['METRICS_SLOW_REQUEST_MS'] = int(os.environ.get('METRICS_SLOW_REQUEST_MS', 0))
+app.config['METRICS_SLOW_SAMPLE_RATE'] = float(os.environ.get('METRICS_SLOW_SAMPLE_RATE', 1.0))
+
+metrics = MetricsRegistry(n_plus_one_threshold=app.config['METRICS_N_PLUS_ONE_THRESHOLD'])
+
+# Hash de senhas: método/custo do Werkzeug e pool dedicado (0 = na própria requisição)
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+app.config['PASSWORD_HASH_MAX_QUEUE'] = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 32))
+
+password_hasher = PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_queue=app.config['PASSWORD_HASH_MAX_QUEUE'],
+    observer=metrics.observe_password_hash
+)
+
+# Limite de falhas de login por janela deslizante ('tentativas/segundos')
+app.config['LOGIN_RATE_LIMIT_ENABLED'] = os.environ.get('LOGIN_RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true')
+app.config['LOGIN_RATE_LIMIT_IP'] = os.environ.get('LOGIN_RATE_LIMIT_IP', '20/300')
+app.config['LOGIN_RATE_LIMIT_ACCOUNT'] = os.environ.get('LOGIN_RATE_LIMIT_ACCOUNT', '5/300')  # por CPF/usuário admin
+# 'memory' (por processo) ou 'sqlite' (compartilhado entre os workers)
+app.config['LOGIN_RATE_LIMIT_STORAGE'] = os.environ.get('LOGIN_RATE_LIMIT_STORAGE', 'memory')
+app.config['LOGIN_RATE_LIMIT_FILE'] = os.environ.get(
+    'LOGIN_RATE_LIMIT_FILE', os.path.join(basedir, 'database', 'ratelimit.db')
+)
+# Atrás de proxy reverso: usa o primeiro IP de X-Forwarded-For
+app.config['LOGIN_RATE_LIMIT_TRUST_PROXY'] = os.environ.get('LOGIN_RATE_LIMIT_TRUST_PROXY', '').lower() in ('1', 'true')
+
+login_limiter = SlidingWindowLimiter(
+    rules={
+        'ip': parse_rule(app.config['LOGIN_RATE_LIMIT_IP']),
+        'cpf': parse_rule(app.config['LOGIN_RATE_LIMIT_ACCOUNT']),
+        'admin': parse_rule(app.config['LOGIN_RATE_LIMIT_ACCOUNT'])
+    },
+    store=(SQLiteRateStore(app.config['LOGIN_RATE_LIMIT_FILE'])
+           if app.config['LOGIN_RATE_LIMIT_STORAGE'] == 'sqlite' else MemoryRateStore()),
+    enabled=app.config['LOGIN_RATE_LIMIT_ENABLED']
+)
+
+# Atualizações em tempo real (SSE): 'sqlite' distribui os avisos entre os workers, 'memory' só no processo
+# Desligado por padrão: no Passenger cada worker atende uma requisição por vez e cada painel aberto
+# prenderia um worker inteiro; os painéis então consultam /api/user, /admin/api/stats... com ETag.
+# Ligue (EVENTS_ENABLED=true) apenas com asgi.py (já liga sozinho) ou um servidor com threads
+app.config['EVENTS_ENABLED'] = os.environ.get('EVENTS_ENABLED', 'false').lower() in ('1', 'true')
+app.config['EVENTS_BACKEND'] = os.environ.get('EVENTS_BACKEND', 'sqlite')
+app.config['EVENTS_FILE'] = os.environ.get('EVENTS_FILE', os.path.join(basedir, 'database', 'events.db'))
+app.config['EVENTS_POLL_INTERVAL'] = float(os.environ.get('EVENTS_POLL_INTERVAL', 0.25))
+app.config['SSE_HEARTBEAT'] = int(os.environ.get('SSE_HEARTBEAT', 15))  # comentário ': ping' sem avisos
+app.config['SSE_QUEUE_SIZE'] = int(os.environ.get('SSE_QUEUE_SIZE', 32))
+# Cada conexão aberta ocupa uma thread do worker: limite por processo e duração máxima
+# (o navegador reconecta sozinho ao fim da conexão)
+app.config['SSE_MAX_CLIENTS'] = int(os.environ.get('SSE_MAX_CLIENTS', 50))
+app.config['SSE_MAX_DURATION'] = int(os.environ.get('SSE_MAX_DURATION', 300))
+
+event_broker = EventBroker(
+    log=SQLiteEventLog(app.config['EVENTS_FILE']) if app.config['EVENTS_BACKEND'] == 'sqlite' else None,
+    poll_interval=app.config['EVENTS_POLL_INTERVAL'],
+    queue_size=app.config['SSE_QUEUE_SIZE'],
+    max_subscribers=app.config['SSE_MAX_CLIENTS']
+)
+
+# Cache curto de User/Admin autenticados entre requisições (0 = desativado)
+app.config['AUTH_CACHE_TTL'] = float(os.environ.get('AUTH_CACHE_TTL', 0))
+app.config['AUTH_CACHE_MAX'] = int(os.environ.get('AUTH_CACHE_MAX', 1024))
+# Envia o cabeçalho X-Auth-DB-Loads com as consultas de autenticação da requisição
+app.config['AUTH_STATS_HEADER'] = os.environ.get('AUTH_STATS_HEADER', '').lower() in ('1', 'true')
+
+# Ranking completo (/api/ranking)
+RANKING_AROUND = 2
+RANKING_AROUND_MAX = 10
+RANKING_PAGE_SIZE = 20
+RANKING_PAGE_SIZE_MAX = 100
+
+# Paginação da listagem de usuários do admin
+USERS_PAGE_SIZE = 50
+USERS_PAGE_SIZE_MAX = 200
+# Acima disso /admin/api/users/changes pede o recarregamento da tabela
+USERS_CHANGES_MAX = 200
+
 # Inicialização
 db = SQLAlchemy(app)
 
+# ==================== BANCO DE DADOS ====================
+
+def apply_sqlite_pragmas(dbapi_connection):
+    """Aplica SQLITE_PRAGMAS em uma conexão sqlite3"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+@event.listens_for(Engine, 'connect')
+def on_engine_connect(dbapi_connection, connection_record):
+    # Executado uma vez por conexão física (o pool reaproveita as conexões)
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection)
+
+def report_database_config():
+    """Mostra na inicialização os ajustes efetivos do banco de dados"""
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                effective = {
+                    name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+                    for name in SQLITE_PRAGMAS
+                }
+            settings = ', '.join(f'{name}={value}' for name, value in effective.items())
+        else:
+            settings = ', '.join(f'{name}={value}' for name, value in app.config['SQLALCHEMY_ENGINE_OPTIONS'].items())
+        app.logger.info('Banco de dados: %s (%s)', engine.dialect.name, settings)
+
+# ==================== MÉTRICAS ====================
+
+SLOW_LOG_MAX_STATEMENTS = 5
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def on_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # No contexto da execução: um comando que falha não deixa sobra na conexão
+    context._query_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def on_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    if not has_request_context() or 'metrics_started' not in g:
+        return  # migrações, scripts e threads em segundo plano
+    g.db_queries += 1
+    g.db_seconds += elapsed
+    stat = g.db_statements.setdefault(statement, [0, 0.0])
+    stat[0] += 1
+    stat[1] += elapsed
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_seconds = 0.0
+    g.db_statements = {}  # sql -> [vezes, segundos]
+
+@app.after_request
+def record_request_metrics(response):
+    if 'metrics_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.metrics_started
+    endpoint = request.endpoint or 'sem_rota'
+    metrics.observe_request(endpoint, request.method, response.status_code,
+                            elapsed, g.db_queries, g.db_seconds)
+    
+    repeated = metrics.repeated_statements(g.db_statements)
+    if repeated:
+        metrics.observe_n_plus_one(endpoint)
+        for statement, times in repeated:
+            app.logger.warning('Possível N+1 em %s: consulta repetida %d vezes: %s',
+                               endpoint, times, ' '.join(statement.split())[:200])
+    
+    slow_ms = app.config['METRICS_SLOW_REQUEST_MS']
+    if slow_ms and elapsed * 1000 >= slow_ms and random.random() < app.config['METRICS_SLOW_SAMPLE_RATE']:
+        slowest = sorted(g.db_statements.items(), key=lambda item: item[1][1], reverse=True)
+        trace = ''.join(
+            f'\n    {times}x {seconds * 1000:.1f} ms  {" ".join(statement.split())[:200]}'
+            for statement, (times, seconds) in slowest[:SLOW_LOG_MAX_STATEMENTS]
+        )
+        app.logger.warning('Requisição lenta: %s %s %.0f ms (%d consultas, %.0f ms no banco)%s',
+                           request.method, request.path, elapsed * 1000,
+                           g.db_queries, g.db_seconds * 1000, trace)
+    return response
+
 # ==================== MODELOS ====================
 
 # Modelo de Usuário
@@ -92,9 +370,18 @@ class User(db.Model):
     cpf = db.Column(db.String(14), unique=True, nullable=False)  # CPF com formatação (000.000.000-00)
     password = db.Column(db.String(200), nullable=False)
     coupon = db.Column(db.String(50), unique=True, nullable=False)
-    total_sales = db.Column(db.Float, default=0.0)
+    total_sales = db.Column(db.Float, nullable=False, default=0.0, server_default='0')  # espelho de sales_cents em reais
     total_lists = db.Column(db.Integer, default=0)
     goal = db.Column(db.Float, default=50000.0)
+    sales_cents = db.Column(db.BigInteger, nullable=False, default=0)  # total exato (livro de vendas)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # incrementada a cada alteração
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # UTC (Last-Modified)
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0, server_default='0', index=True)  # contador global na última alteração
+    
+    @property
+    def etag(self):
+        # change_seq é global: um id reaproveitado pelo SQLite não repete a ETag do usuário excluído
+        return f'user-{self.id}-{self.change_seq}'
     
     def to_dict(self):
         return {
@@ -106,6 +393,67 @@ class User(db.Model):
             'totalLists': self.total_lists,
             'goal': self.goal
         }
+    
+    def to_admin_dict(self):
+        """Representação usada pelas rotas /admin/api"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'cpf': self.cpf,
+            'coupon': self.coupon,
+            'total_sales': self.total_sales,
+            'total_lists': self.total_lists,
+            'goal': self.goal
+        }
+
+# Índice do ranking: atende ORDER BY total_sales DESC, id ASC sem ordenar a tabela
+ranking_index = db.Index('ix_user_ranking', User.total_sales.desc(), User.id)
+
+# Contador global de alterações (sincronização incremental da tabela do admin)
+class ChangeCounter(db.Model):
+    __tablename__ = 'change_counter'
+    name = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+# Usuários excluídos, com o valor do contador na exclusão
+class UserTombstone(db.Model):
+    __tablename__ = 'user_tombstone'
+    user_id = db.Column(db.Integer, primary_key=True)
+    change_seq = db.Column(db.BigInteger, nullable=False, index=True)
+    deleted_at = db.Column(db.DateTime, nullable=False)
+
+def next_change_seq(conn=None):
+    """
+    Incrementa e retorna o contador de alterações de user (sem commit)
+    O UPDATE trava a linha até o fim da transação: os valores ficam visíveis
+    na mesma ordem em que foram gerados
+    """
+    conn = conn or db.session
+    table = ChangeCounter.__table__
+    conn.execute(table.update().where(table.c.name == 'user').values(value=table.c.value + 1))
+    return conn.execute(db.select(table.c.value).where(table.c.name == 'user')).scalar_one()
+
+def current_change_seq():
+    table = ChangeCounter.__table__
+    return db.session.execute(db.select(table.c.value).where(table.c.name == 'user')).scalar() or 0
+
+@event.listens_for(User, 'before_insert')
+def set_user_change_seq(mapper, connection, target):
+    target.change_seq = next_change_seq(connection)
+
+@event.listens_for(User, 'after_insert')
+def drop_reused_tombstone(mapper, connection, target):
+    """O SQLite reaproveita o id do último usuário excluído: a exclusão antiga deixa de valer"""
+    tombstones = UserTombstone.__table__
+    connection.execute(tombstones.delete().where(tombstones.c.user_id == target.id))
+
+@event.listens_for(User, 'before_update')
+def bump_user_version(mapper, connection, target):
+    """Alterações pelo ORM (meta, senha) incrementam a versão da linha e o contador global"""
+    if db.session.is_modified(target, include_collections=False):
+        target.version = User.version + 1
+        target.updated_at = datetime.utcnow()
+        target.change_seq = next_change_seq(connection)
 
 # Modelo de Administrador
 class Admin(db.Model):
@@ -116,27 +464,315 @@ class Admin(db.Model):
     name = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
+# Sessões guardadas no servidor (SESSION_TYPE = 'database'); expires_at em segundos (epoch)
+class SessionRecord(db.Model):
+    __tablename__ = 'server_session'
+    sid = db.Column(db.String(64), primary_key=True)
+    owner = db.Column(db.String(40), index=True)  # 'user:<id>' ou 'admin:<id>'
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.Integer, nullable=False, index=True)
+
+# Livro de vendas: eventos apenas incluídos, nunca alterados (valores são deltas)
+class SalesEvent(db.Model):
+    __tablename__ = 'sales_event'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    sales_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    lists = db.Column(db.Integer, nullable=False, default=0)
+    source = db.Column(db.String(20), nullable=False)  # admin, import, coupon, opening...
+    note = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sales': self.sales_cents / 100,
+            'lists': self.lists,
+            'source': self.source,
+            'note': self.note,
+            'created_at': self.created_at.isoformat()
+        }
+
+# Totais pré-agregados por embaixador e período (dia/mês), mantidos a cada evento
+class SalesBucket(db.Model):
+    __tablename__ = 'sales_bucket'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    period = db.Column(db.String(5), primary_key=True)  # 'day' ou 'month'
+    period_start = db.Column(db.Date, primary_key=True)
+    sales_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    lists = db.Column(db.Integer, nullable=False, default=0)
+
+# Ranking por período: lê o topo do bucket direto do índice
+sales_bucket_index = db.Index('ix_sales_bucket_ranking', SalesBucket.period, SalesBucket.period_start,
+                              SalesBucket.sales_cents.desc(), SalesBucket.user_id)
+
+# ==================== CACHE DO RANKING ====================
+
+CACHE_MISS = object()
+
+class LeaderboardCache:
+    """
+    Cache em memória dos dados de ranking e das páginas/fragmentos renderizados,
+    invalidado pelas rotas de escrita do admin (a versão funciona como versão dos dados)
+    Com version_file, a invalidação é vista por todos os workers
+    """
+    
+    def __init__(self, version_file=None, max_entries=2048):
+        self.version_file = version_file
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Sem arquivo, a versão começa em um valor único do processo: um ETag
+        # emitido antes de um reinício não é confundido com os dados atuais
+        self._local_version = time.time_ns()
+        self._local_modified = time.time()
+        self._entries = {}  # chave -> (versão, dados)
+    
+    def current_version(self):
+        if not self.version_file:
+            return self._local_version
+        try:
+            with open(self.version_file, 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return ''
+    
+    def last_modified(self):
+        """Momento (UTC) da última invalidação, para o Last-Modified das respostas; None se desconhecido"""
+        if not self.version_file:
+            return datetime.fromtimestamp(self._local_modified, timezone.utc)
+        try:
+            return datetime.fromtimestamp(os.stat(self.version_file).st_mtime, timezone.utc)
+        except OSError:
+            return None
+    
+    def get(self, key, loader):
+        """Retorna os dados da chave, chamando loader() apenas se a versão mudou"""
+        version, data = self.lookup(key)
+        if data is CACHE_MISS:
+            data = loader()
+            self.store(key, version, data)
+        return data
+    
+    def lookup(self, key):
+        """(versão atual, dados em cache ou CACHE_MISS): para quem carrega os dados por conta própria"""
+        version = self.current_version()
+        entry = self._entries.get(key)
+        if entry and entry[0] == version:
+            return version, entry[1]
+        return version, CACHE_MISS
+    
+    def store(self, key, version, data):
+        # Guarda com a versão lida antes da consulta: se houver escrita
+        # concorrente, a próxima leitura verá outra versão e recarregará
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))  # descarta a entrada mais antiga
+            self._entries[key] = (version, data)
+    
+    def invalidate(self):
+        """Descarta os dados em cache (chamar após o commit)"""
+        with self._lock:
+            self._entries = {}
+            self._local_version += 1
+            self._local_modified = time.time()
+        
+        if not self.version_file:
+            return
+        token = f'{time.time_ns():x}-{os.getpid():x}'
+        tmp_file = f'{self.version_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.version_file), exist_ok=True)
+            with open(tmp_file, 'w') as f:
+                f.write(token)
+            os.replace(tmp_file, self.version_file)
+        except OSError as e:
+            app.logger.warning('Não foi possível compartilhar a invalidação de %s: %s', self.version_file, e)
+
+class RankingSnapshot:
+    """
+    Ranking completo ordenado em memória (total_sales decrescente, id crescente)
+    A posição de um usuário é obtida por busca binária
+    """
+    
+    def __init__(self, rows):
+        # rows: (id, name, total_sales) já na ordem do índice ix_user_ranking;
+        # sorted() é linear nesse caso e garante a ordem mesmo com total_sales nulo
+        entries = sorted(((-(sales or 0.0), user_id, name) for user_id, name, sales in rows))
+        self.keys = [(key, user_id) for key, user_id, _ in entries]
+        self.names = [name for _, _, name in entries]
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def position_of(self, user_id, total_sales):
+        """Retorna a posição (base 1) do usuário ou None se ele não está no snapshot"""
+        key = (-(total_sales or 0.0), user_id)
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return index + 1
+        return None
+    
+    def slice(self, start, end):
+        """Retorna as entradas [start, end) com posição, id e nome"""
+        start = max(start, 0)
+        end = min(end, len(self.keys))
+        return [
+            {'position': i + 1, 'id': self.keys[i][1], 'name': self.names[i]}
+            for i in range(start, end)
+        ]
+
+ranking_cache = LeaderboardCache(app.config['RANKING_CACHE_FILE'] or None, app.config['RANKING_CACHE_MAX'])
+
+class PageCache:
+    """
+    Páginas renderizadas de cada usuário, válidas enquanto a versão do ranking_cache não muda
+    Guardadas à parte, em LRU: muitas páginas não empurram para fora o ranking e o snapshot
+    """
+    
+    def __init__(self, data_cache, max_entries=512):
+        self.data_cache = data_cache
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # chave -> (versão, html)
+    
+    def get(self, key, render):
+        version = self.data_cache.current_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+        html = render()
+        with self._lock:
+            self._entries[key] = (version, html)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+page_cache = PageCache(ranking_cache, app.config['PAGE_CACHE_MAX'])
+
+# ==================== CACHE DE AUTENTICAÇÃO ====================
+
+class PrincipalCache:
+    """
+    Cache com TTL dos dados de User/Admin logados, evitando a consulta por requisição
+    Cada entrada guarda a versão do ranking_cache: qualquer escrita do admin
+    (edição, exclusão, importação) a invalida em todos os workers
+    """
+    
+    def __init__(self, ttl=0, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = {}  # (modelo, id) -> (versão, expira em, valores das colunas)
+    
+    def get(self, model, principal_id, version):
+        if not self.ttl:
+            return None
+        entry = self._entries.get((model.__name__, principal_id))
+        if not entry or entry[0] != version or entry[1] < time.monotonic():
+            return None
+        
+        # Reconstrói a instância e a anexa à sessão atual sem consultar o banco
+        instance = model(**entry[2])
+        make_transient_to_detached(instance)
+        return db.session.merge(instance, load=False)
+    
+    def put(self, model, principal_id, instance, version):
+        if not self.ttl:
+            return
+        values = {c.key: getattr(instance, c.key) for c in model.__table__.columns}
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                self._entries.pop(next(iter(self._entries)))  # descarta a entrada mais antiga
+            self._entries[(model.__name__, principal_id)] = (version, time.monotonic() + self.ttl, values)
+    
+    def invalidate(self, model, principal_id):
+        with self._lock:
+            self._entries.pop((model.__name__, principal_id), None)
+
+principal_cache = PrincipalCache(app.config['AUTH_CACHE_TTL'], app.config['AUTH_CACHE_MAX'])
+
+# Contadores de autenticação (lookups = chamadas; db_loads = consultas ao banco)
+auth_stats = {'lookups': 0, 'cache_hits': 0, 'db_loads': 0}
+
+def load_principal(model, principal_id):
+    """Carrega um User/Admin pelo id, usando o cache TTL quando habilitado"""
+    auth_stats['lookups'] += 1
+    version = ranking_cache.current_version()
+    
+    instance = principal_cache.get(model, principal_id, version)
+    if instance is not None:
+        auth_stats['cache_hits'] += 1
+        return instance
+    
+    auth_stats['db_loads'] += 1
+    g.auth_db_loads = g.get('auth_db_loads', 0) + 1
+    instance = db.session.get(model, principal_id)
+    if instance is not None:
+        principal_cache.put(model, principal_id, instance, version)
+    return instance
+
+@app.after_request
+def add_auth_stats_header(response):
+    if app.config['AUTH_STATS_HEADER']:
+        response.headers['X-Auth-DB-Loads'] = str(g.get('auth_db_loads', 0))
+    return response
+
+# ==================== SESSÕES NO SERVIDOR ====================
+
+def session_owner(data):
+    """Dono da sessão, usado para revogar todas as sessões de um embaixador/admin"""
+    if data.get('user_id'):
+        return f"user:{data['user_id']}"
+    if data.get('admin_id'):
+        return f"admin:{data['admin_id']}"
+    return None
+
+if app.config['SESSION_TYPE'] == 'database':
+    session_store = DatabaseSessionStore(SessionRecord.__table__, lambda: db.engine)
+elif app.config['SESSION_TYPE'] == 'filesystem':
+    session_store = FileSessionStore(app.config['SESSION_FILE_DIR'])
+else:
+    session_store = None  # cookie assinado do Flask
+
+if session_store is not None:
+    app.session_interface = ServerSessionInterface(
+        session_store,
+        owner=session_owner,
+        refresh_interval=app.config['SESSION_REFRESH_INTERVAL'],
+        sweep_interval=app.config['SESSION_SWEEP_INTERVAL']
+    )
+
+def revoke_user_sessions(user_id):
+    """Encerra na hora todas as sessões do embaixador; retorna quantas (None se não suportado)"""
+    if session_store is None:
+        return None
+    return app.session_interface.revoke(f'user:{user_id}')
+
 # ==================== FUNÇÕES DE AUTENTICAÇÃO ====================
 
 def get_current_user():
-    """Retorna o usuário atualmente logado ou None"""
-    user_id = session.get('user_id')
-    if user_id:
-        return User.query.get(user_id)
-    return None
+    """Retorna o usuário atualmente logado ou None (carregado no máximo uma vez por requisição)"""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = load_principal(User, user_id) if user_id else None
+    return g.current_user
 
 def get_current_admin():
-    """Retorna o admin atualmente logado ou None"""
-    admin_id = session.get('admin_id')
-    if admin_id:
-        return Admin.query.get(admin_id)
-    return None
+    """Retorna o admin atualmente logado ou None (carregado no máximo uma vez por requisição)"""
+    if 'current_admin' not in g:
+        admin_id = session.get('admin_id')
+        g.current_admin = load_principal(Admin, admin_id) if admin_id else None
+    return g.current_admin
 
 def login_user_session(user):
     """Faz login do usuário na sessão (sem afetar sessão do admin)"""
     # Define chaves do usuário sem remover chaves do admin
     # Permite que ambos (user e admin) estejam logados simultaneamente
     session['user_id'] = user.id
+    g.current_user = user
     # user_type não é necessário para verificação, mas pode ser usado para informação
     # Como podemos ter ambos logados, não sobrescrevemos user_type
     if 'user_type' not in session:
@@ -148,6 +784,7 @@ def login_admin_session(admin):
     # Define chaves do admin sem remover chaves do user
     # Permite que ambos (user e admin) estejam logados simultaneamente
     session['admin_id'] = admin.id
+    g.current_admin = admin
     # user_type não é necessário para verificação, mas pode ser usado para informação
     # Como podemos ter ambos logados, não sobrescrevemos user_type
     if 'user_type' not in session:
@@ -157,6 +794,7 @@ def login_admin_session(admin):
 def logout_user_session():
     """Faz logout do usuário (remove apenas chaves do user)"""
     session.pop('user_id', None)
+    g.pop('current_user', None)
     # Remove user_type apenas se for 'user' (não afeta se for 'admin')
     if session.get('user_type') == 'user':
         session.pop('user_type', None)
@@ -165,6 +803,7 @@ def logout_user_session():
 def logout_admin_session():
     """Faz logout do admin (remove apenas chaves do admin)"""
     session.pop('admin_id', None)
+    g.pop('current_admin', None)
     # Remove user_type apenas se for 'admin' (não afeta se for 'user')
     if session.get('user_type') == 'admin':
         session.pop('user_type', None)
@@ -173,121 +812,1175 @@ def logout_admin_session():
 def logout_session():
     """Faz logout completo (limpa toda a sessão) - usar apenas quando necessário"""
     session.clear()
+    g.pop('current_user', None)
+    g.pop('current_admin', None)
+
+def check_password_and_upgrade(account, password):
+    """
+    Confere a senha de um User/Admin
+    Se o hash foi gerado com método/custo antigo, grava um novo hash transparentemente
+    """
+    valid, new_hash = password_hasher.verify_and_update(account.password, password or '')
+    if new_hash:
+        account.password = new_hash
+        try:
+            db.session.commit()
+            principal_cache.invalidate(type(account), account.id)
+        except Exception:
+            # O login continua válido; a atualização fica para a próxima vez
+            db.session.rollback()
+            app.logger.exception('Erro ao atualizar hash de senha')
+    return valid
+
+def password_busy_response(template):
+    """Resposta 503 quando a fila de hashing de senhas está cheia"""
+    message = 'Muitos acessos no momento. Tente novamente em instantes.'
+    if request.is_json:
+        response = make_response(jsonify({'success': False, 'message': message}), 503)
+    else:
+        flash(message, 'error')
+        response = make_response(render_template(template), 503)
+    response.headers['Retry-After'] = '1'
+    return response
+
+def client_ip():
+    """IP do cliente para o limite de tentativas de login"""
+    if app.config['LOGIN_RATE_LIMIT_TRUST_PROXY'] and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or 'desconhecido'
+
+def too_many_attempts_response(template, retry_after):
+    """Resposta 429 quando o limite de tentativas de login foi atingido"""
+    minutes = max(1, (retry_after + 59) // 60)
+    message = f'Muitas tentativas de login. Tente novamente em {minutes} minuto(s).'
+    if request.is_json:
+        response = make_response(jsonify({'success': False, 'message': message}), 429)
+    else:
+        flash(message, 'error')
+        response = make_response(render_template(template), 429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
 
 # ==================== DECORATORS ====================
 
-def user_required(f):
-    """Decorator para rotas que requerem autenticação de usuário"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        user = get_current_user()
-        if not user:
-            # Se for requisição JSON, retornar erro JSON
-            if request.is_json or request.headers.get('Content-Type') == 'application/json':
-                return jsonify({'success': False, 'message': 'Não autenticado. Faça login.', 'redirect': '/login'}), 401
-            return redirect(url_for('login'))
-        return f(*args, **kwargs)
-    return decorated_function
+def user_required(f):
+    """Decorator para rotas que requerem autenticação de usuário"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user = get_current_user()
+        if not user:
+            # Se for requisição JSON, retornar erro JSON
+            if request.is_json or request.headers.get('Content-Type') == 'application/json':
+                return jsonify({'success': False, 'message': 'Não autenticado. Faça login.', 'redirect': '/login'}), 401
+            return redirect(url_for('login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+def admin_required(f):
+    """Decorator para rotas que requerem autenticação de admin"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        admin = get_current_admin()
+        if not admin:
+            # Se for requisição JSON, retornar erro JSON
+            if request.is_json or request.headers.get('Content-Type') == 'application/json':
+                return jsonify({'success': False, 'message': 'Não autenticado. Faça login como administrador.', 'redirect': '/admin/login'}), 401
+            return redirect(url_for('admin_login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+# ==================== FUNÇÕES AUXILIARES ====================
+
+# Gerar cupom único
+COUPON_SUFFIX_START = 10
+
+def coupon_prefix(name):
+    """Prefixo do cupom: ODONTO + até 8 caracteres do nome"""
+    clean_name = ''.join(name.upper().split())[:8]
+    return f"ODONTO{clean_name}"
+
+class CouponAllocator:
+    """
+    Aloca cupons sem colisão em memória a partir dos cupons já existentes
+    O sufixo é o menor número livre a partir de 10 (10..99, depois 100, 101...)
+    """
+    
+    def __init__(self, existing_coupons):
+        self.used = set(existing_coupons)
+        self.next_suffix = {}  # prefixo -> próximo sufixo a testar
+    
+    def allocate(self, name):
+        prefix = coupon_prefix(name)
+        suffix = self.next_suffix.get(prefix, COUPON_SUFFIX_START)
+        while f"{prefix}{suffix}" in self.used:
+            suffix += 1
+        
+        coupon = f"{prefix}{suffix}"
+        self.used.add(coupon)
+        self.next_suffix[prefix] = suffix + 1
+        return coupon
+
+def generate_coupon(name):
+    # Uma única consulta traz os cupons que já usam o mesmo prefixo
+    prefix = coupon_prefix(name)
+    existing = db.session.query(User.coupon) \
+        .filter(User.coupon.startswith(prefix, autoescape=True)).all()
+    return CouponAllocator(coupon for (coupon,) in existing).allocate(name)
+
+# Cursores de paginação (keyset)
+# 'recent' ordena por id decrescente; 'sales' na ordem do ranking
+USER_SORTS = {
+    'recent': 1,  # cursor: [id]
+    'sales': 2    # cursor: [total_sales, id]
+}
+
+def encode_cursor(values):
+    """Codifica os valores da última linha da página em um cursor opaco"""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, sort):
+    """
+    Decodifica um cursor gerado por encode_cursor
+    Levanta ValueError se o cursor não for válido para a ordenação
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Cursor inválido')
+    
+    if not isinstance(values, list) or len(values) != USER_SORTS[sort]:
+        raise ValueError('Cursor inválido')
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        raise ValueError('Cursor inválido')
+    return values
+
+def user_search_filter(search, columns=User):
+    """Filtro por nome, CPF ou cupom contendo o termo (columns: User ou uma subquery)"""
+    # Escapa curingas do LIKE digitados pelo usuário
+    term = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    pattern = f'%{term}%'
+    return db.or_(
+        columns.name.ilike(pattern, escape='\\'),
+        columns.cpf.ilike(pattern, escape='\\'),
+        columns.coupon.ilike(pattern, escape='\\')
+    )
+
+def query_users_page(search=None, sort='recent', cursor=None, limit=USERS_PAGE_SIZE):
+    """
+    Retorna uma página de usuários e o cursor da próxima página (ou None)
+    Usa paginação por keyset: o custo não cresce com a posição da página
+    """
+    query = User.query
+    
+    if search:
+        query = query.filter(user_search_filter(search))
+    
+    if sort == 'sales':
+        if cursor:
+            last_sales, last_id = cursor
+            query = query.filter(db.or_(
+                User.total_sales < last_sales,
+                db.and_(User.total_sales == last_sales, User.id > last_id)
+            ))
+        # Mesma ordem do ranking (empates: cadastro mais antigo primeiro)
+        query = query.order_by(User.total_sales.desc(), User.id)
+    else:
+        if cursor:
+            query = query.filter(User.id < cursor[0])
+        query = query.order_by(User.id.desc())
+    
+    # Busca uma linha a mais para saber se existe próxima página
+    users = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        last = users[-1]
+        if sort == 'sales':
+            next_cursor = encode_cursor([last.total_sales, last.id])
+        else:
+            next_cursor = encode_cursor([last.id])
+    
+    return users, next_cursor
+
+# Estatísticas agregadas do painel admin
+def get_user_stats():
+    """Calcula totais de usuários, vendas e listas em uma única consulta"""
+    return user_stats_dict(db.session.execute(user_stats_select()).one())
+
+def user_stats_select():
+    return db.select(
+        db.func.count(User.id),
+        # Soma exata em centavos: somar o float total_sales acumula erro (2479.1099999999997)
+        db.func.coalesce(db.func.sum(User.sales_cents), 0),
+        db.func.coalesce(db.func.sum(User.total_lists), 0)
+    )
+
+def user_stats_dict(row):
+    total_users, sales_cents, total_lists = row
+    return {
+        'total_users': total_users,
+        'total_sales': int(sales_cents) / 100,  # convertido para reais uma única vez
+        'total_lists': int(total_lists)
+    }
+
+# Ranking dos 3 primeiros (carregado pelo ranking_cache)
+def load_ranking_top3():
+    """Busca os 3 usuários com maior total_sales e retorna (ranking, etag)"""
+    return ranking_top3(db.session.execute(ranking_top3_select()).scalars())
+
+def ranking_top3_select():
+    return db.select(User.name).order_by(User.total_sales.desc(), User.id).limit(3)
+
+def ranking_top3(names):
+    """(ranking, etag) a partir dos nomes do Top 3 em ordem"""
+    ranking = []
+    positions = ['1º', '2º', '3º']
+    
+    for index, name in enumerate(names):
+        ranking.append({
+            'position': positions[index],
+            'name': name
+        })
+    
+    payload = json.dumps(ranking, sort_keys=True, separators=(',', ':')).encode()
+    etag = hashlib.sha1(payload).hexdigest()[:20]
+    return ranking, etag
+
+# Ranking completo (carregado pelo ranking_cache)
+def load_ranking_snapshot():
+    """Lê o ranking completo percorrendo o índice ix_user_ranking"""
+    rows = db.session.query(User.id, User.name, User.total_sales) \
+        .order_by(User.total_sales.desc(), User.id).all()
+    return RankingSnapshot(rows)
+
+def render_ranking_top3():
+    """Fragmento HTML do Top 3 para a página do embaixador"""
+    ranking, _ = ranking_cache.get('top3', load_ranking_top3)
+    return Markup(render_template('_ranking_top3.html', ranking=ranking))
+
+def load_admin_first_page():
+    """Primeira página da tabela de usuários já renderizada, com as estatísticas"""
+    change_seq = current_change_seq()  # lido antes: alterações concorrentes voltam no próximo /changes
+    users, next_cursor = query_users_page()
+    return {
+        'users_rows': Markup(render_template('admin/_users_rows.html', users=users)),
+        'stats': get_user_stats(),
+        'next_cursor': next_cursor,
+        'change_seq': change_seq
+    }
+
+def conditional_json(etag, last_modified, build):
+    """
+    Resposta JSON com ETag/Last-Modified
+    Se o cliente já tem esta versão (If-None-Match / If-Modified-Since), responde 304
+    sem chamar build(), a função que consulta e monta os dados
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = jsonify(build())
+    else:
+        response = make_response('', 304)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # O navegador pode guardar, mas deve revalidar a cada uso
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def data_etag(*parts):
+    """ETag de uma resposta que depende da versão global dos dados (ranking_cache)"""
+    key = '|'.join(str(p) for p in (ranking_cache.current_version(),) + parts)
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+def user_last_modified(user):
+    """updated_at (gravado em UTC) como datetime com fuso, para o Last-Modified"""
+    return user.updated_at.replace(tzinfo=timezone.utc) if user.updated_at else None
+
+def precompile_templates():
+    """Compila todos os templates (grava o bytecode em disco); usado na subida do worker e no deploy"""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+# ==================== LIVRO DE VENDAS ====================
+
+SALES_PERIODS = ('day', 'month')
+SALES_HISTORY_PAGE_SIZE = 50
+
+def to_cents(value):
+    """Converte um valor em reais (número, texto ou Decimal) para centavos inteiros"""
+    try:
+        amount = Decimal(str(value)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f'Valor inválido: {value}')
+    return int(amount * 100)
+
+def period_start(period, moment):
+    """Primeiro dia do período ('day' ou 'month') que contém moment"""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    return day if period == 'day' else day.replace(day=1)
+
+def upsert_sales_buckets(rows):
+    """Soma sales_cents/lists nos buckets (insere os que ainda não existem)"""
+    table = SalesBucket.__table__
+    dialect = db.session.get_bind().dialect.name
+    
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.period, table.c.period_start],
+            set_={
+                'sales_cents': table.c.sales_cents + stmt.excluded.sales_cents,
+                'lists': table.c.lists + stmt.excluded.lists
+            }
+        )
+        db.session.execute(stmt, rows)
+        return
+    
+    # Outros bancos: atualiza e insere apenas se o bucket não existia
+    for row in rows:
+        result = db.session.execute(
+            table.update()
+            .where(table.c.user_id == row['user_id'],
+                   table.c.period == row['period'],
+                   table.c.period_start == row['period_start'])
+            .values(sales_cents=table.c.sales_cents + row['sales_cents'],
+                    lists=table.c.lists + row['lists'])
+        )
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(**row))
+
+def record_sales_changes(changes, source, note=None):
+    """
+    Registra variações de vendas/listas no livro de vendas (sem commit)
+    changes: dicts {'user_id', 'sales_cents', 'lists'} com os deltas
+    Grava os eventos, soma os deltas aos totais do usuário e aos buckets de dia e mês
+    Retorna a quantidade de eventos gravados
+    """
+    changes = [c for c in changes if c['sales_cents'] or c['lists']]
+    if not changes:
+        return 0
+    
+    now = datetime.now()
+    db.session.execute(SalesEvent.__table__.insert(), [{
+        'user_id': c['user_id'],
+        'sales_cents': c['sales_cents'],
+        'lists': c['lists'],
+        'source': source,
+        'note': note,
+        'created_at': now
+    } for c in changes])
+    
+    # Totais correntes atualizados no próprio banco (seguro com escritas concorrentes)
+    user_table = User.__table__
+    db.session.execute(
+        user_table.update()
+        .where(user_table.c.id == db.bindparam('b_user_id'))
+        .values(
+            sales_cents=user_table.c.sales_cents + db.bindparam('b_sales_cents'),
+            total_sales=(user_table.c.sales_cents + db.bindparam('b_sales_cents')) / 100.0,
+            total_lists=db.func.coalesce(user_table.c.total_lists, 0) + db.bindparam('b_lists'),
+            version=user_table.c.version + 1,
+            updated_at=datetime.utcnow(),
+            change_seq=next_change_seq()
+        ),
+        [{'b_user_id': c['user_id'], 'b_sales_cents': c['sales_cents'], 'b_lists': c['lists']} for c in changes]
+    )
+    
+    buckets = {}
+    for c in changes:
+        for period in SALES_PERIODS:
+            key = (c['user_id'], period, period_start(period, now))
+            bucket = buckets.setdefault(key, {
+                'user_id': key[0], 'period': key[1], 'period_start': key[2],
+                'sales_cents': 0, 'lists': 0
+            })
+            bucket['sales_cents'] += c['sales_cents']
+            bucket['lists'] += c['lists']
+    upsert_sales_buckets(list(buckets.values()))
+    
+    return len(changes)
+
+# ==================== CUPONS ====================
+
+COUPON_BATCH_MAX = 1000  # cupons/atribuições por requisição
+
+def normalize_coupon(value):
+    """Cupom como gravado no banco (maiúsculas, sem espaços nas pontas)"""
+    return str(value or '').strip().upper()
+
+class CouponMap:
+    """
+    Mapa cupom -> (id, nome) do embaixador em memória, com limite LRU
+    Os cupons só mudam quando embaixadores são criados ou excluídos: a versão é
+    própria (a do ranking muda a cada venda) e, com version_file, a invalidação
+    vale para todos os workers. Cupons inexistentes também ficam no mapa
+    """
+    
+    def __init__(self, version_file=None, max_size=10000):
+        self.max_size = max_size
+        self._versions = LeaderboardCache(version_file, max_entries=0)  # usado só pela versão
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # cupom -> (id, nome) ou None; mais recente no fim
+        self._entries_version = None
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def resolve_many(self, coupons):
+        """{cupom: (id, nome) ou None} para os cupons (já normalizados)"""
+        version, result, missing = self.lookup(coupons)
+        
+        # Uma consulta por lote no índice único de user.coupon
+        loaded = {}
+        for start in range(0, len(missing), IMPORT_BATCH_SIZE):
+            loaded.update(self.rows_to_owners(
+                db.session.execute(self.load_select(missing[start:start + IMPORT_BATCH_SIZE]))
+            ))
+        return self.store(version, result, missing, loaded)
+    
+    def lookup(self, coupons):
+        """(versão, resultado parcial, cupons fora do mapa): quem carrega os faltantes chama store()"""
+        version = self._versions.current_version()
+        result = {}
+        missing = []
+        with self._lock:
+            if self._entries_version != version:
+                self._entries.clear()
+                self._entries_version = version
+            for coupon in coupons:
+                if coupon in result:
+                    continue
+                if coupon in self._entries:
+                    self._entries.move_to_end(coupon)
+                    result[coupon] = self._entries[coupon]
+                    self.stats['hits'] += 1
+                else:
+                    result[coupon] = None
+                    missing.append(coupon)
+            self.stats['misses'] += len(missing)
+        return version, result, missing
+    
+    @staticmethod
+    def load_select(coupons):
+        return db.select(User.coupon, User.id, User.name).where(User.coupon.in_(coupons))
+    
+    @staticmethod
+    def rows_to_owners(rows):
+        return {coupon: (user_id, name) for coupon, user_id, name in rows}
+    
+    def store(self, version, result, missing, loaded):
+        """Completa o resultado com os cupons carregados e os guarda no mapa"""
+        with self._lock:
+            # Se houve invalidação durante a consulta, o resultado não entra no mapa
+            keep = self._entries_version == version
+            for coupon in missing:
+                result[coupon] = loaded.get(coupon)
+                if keep:
+                    self._entries[coupon] = result[coupon]
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return result
+    
+    def resolve(self, coupon):
+        """(id, nome) do dono do cupom ou None"""
+        return self.resolve_many([coupon])[coupon]
+    
+    def invalidate(self):
+        """Descarta o mapa neste e nos demais workers (chamar após o commit)"""
+        self.stats['invalidations'] += 1
+        self._versions.invalidate()
+
+coupon_map = CouponMap(app.config['COUPON_CACHE_FILE'] or None, app.config['COUPON_CACHE_MAX'])
+
+def attribute_sales(items, dry_run=False):
+    """
+    Lança no livro de vendas as vendas atribuídas por cupom (checkout)
+    items: dicts {'coupon', 'sales' (reais), 'lists', 'note'}; estornos com valores negativos
+    Tudo ou nada: qualquer item inválido cancela o lote (com dry_run apenas valida)
+    """
+    report = {'processed': 0, 'recorded': 0, 'error_count': 0, 'errors': []}
+    
+    def add_error(index, message):
+        report['error_count'] += 1
+        if len(report['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+            report['errors'].append({'index': index, 'message': message})
+    
+    parsed = []
+    for index, item in enumerate(items):
+        report['processed'] += 1
+        if not isinstance(item, dict):
+            add_error(index, 'Item inválido')
+            continue
+        coupon = normalize_coupon(item.get('coupon'))
+        if not coupon:
+            add_error(index, 'Cupom não informado')
+            continue
+        try:
+            sales_cents = to_cents(item.get('sales', 0))
+            lists = int(item.get('lists', 0))
+        except (TypeError, ValueError):
+            add_error(index, 'Valores inválidos')
+            continue
+        if not sales_cents and not lists:
+            add_error(index, 'Informe vendas ou listas')
+            continue
+        note = str(item.get('note') or '').strip()[:200] or None
+        parsed.append((index, coupon, sales_cents, lists, note))
+    
+    owners = coupon_map.resolve_many([coupon for _, coupon, _, _, _ in parsed])
+    user_ids = {owner[0] for owner in owners.values() if owner}
+    
+    # Totais atuais: confere estornos e se o mapa não apontou para um usuário excluído
+    totals = {}
+    ids = sorted(user_ids)
+    for start in range(0, len(ids), IMPORT_BATCH_SIZE):
+        totals.update(
+            (user_id, [sales, lists or 0]) for user_id, sales, lists in
+            db.session.query(User.id, User.sales_cents, User.total_lists)
+            .filter(User.id.in_(ids[start:start + IMPORT_BATCH_SIZE]))
+        )
+    if len(totals) < len(user_ids):
+        coupon_map.invalidate()
+    
+    groups = {}  # observação -> alterações (record_sales_changes grava uma observação por chamada)
+    for index, coupon, sales_cents, lists, note in parsed:
+        owner = owners[coupon]
+        if owner is None or owner[0] not in totals:
+            add_error(index, f'Cupom não encontrado: {coupon}')
+            continue
+        total = totals[owner[0]]
+        total[0] += sales_cents
+        total[1] += lists
+        if total[0] < 0 or total[1] < 0:
+            add_error(index, f'O estorno deixaria o total negativo: {coupon}')
+            continue
+        groups.setdefault(note, []).append({'user_id': owner[0], 'sales_cents': sales_cents, 'lists': lists})
+    
+    report['errors'].sort(key=lambda error: error['index'])
+    report['success'] = report['error_count'] == 0
+    report['applied'] = report['success'] and not dry_run
+    report['dry_run'] = dry_run
+    if not report['applied']:
+        return report
+    
+    changed = sorted({change['user_id'] for changes in groups.values() for change in changes})
+    try:
+        for note, changes in groups.items():
+            report['recorded'] += record_sales_changes(changes, 'coupon', note)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    ranking_cache.invalidate()
+    for user_id in changed:
+        principal_cache.invalidate(User, user_id)
+    publish_changes(changed)
+    return report
+
+# ==================== IMPORTAÇÃO EM LOTE ====================
+
+# Cabeçalhos aceitos na planilha de vendas (nome da coluna -> campo)
+IMPORT_COLUMNS = {
+    'coupon': 'coupon',
+    'cupom': 'coupon',
+    'cpf': 'cpf',
+    'total_sales': 'total_sales',
+    'vendas': 'total_sales',
+    'total_lists': 'total_lists',
+    'listas': 'total_lists',
+    'goal': 'goal',
+    'meta': 'goal'
+}
+IMPORT_VALUE_FIELDS = ('total_sales', 'total_lists', 'goal')
+IMPORT_BATCH_SIZE = 500  # abaixo do limite de parâmetros do SQLite no IN (...)
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+def parse_decimal(value):
+    """Converte '1.234,56', '1234.56' ou número para Decimal (sem passar por float)"""
+    if not isinstance(value, (int, float)):
+        value = str(value).strip().replace('R$', '').replace(' ', '')
+        if ',' in value:
+            value = value.replace('.', '').replace(',', '.')
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f'Valor inválido: {value}')
+    if not number.is_finite():
+        raise ValueError(f'Valor inválido: {value}')
+    return number
+
+def read_import_file(stream, filename, columns=IMPORT_COLUMNS):
+    """
+    Abre a planilha (CSV ou XLSX) para leitura linha a linha
+    columns mapeia os nomes de coluna aceitos para os campos
+    Retorna (campos reconhecidos no cabeçalho, gerador de (nº da linha, dict))
+    """
+    if filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError('A importação de .xlsx requer o pacote openpyxl')
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+    else:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        first_line = text.readline()
+        # Planilhas exportadas pelo Excel em pt-BR usam ';'
+        delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+        header = next(csv.reader([first_line], delimiter=delimiter), [])
+        rows = csv.reader(text, delimiter=delimiter)
+    
+    fields = [columns.get(str(name or '').strip().lower()) for name in header]
+    
+    def generate():
+        for line, values in enumerate(rows, start=2):
+            row = {
+                field: value for field, value in zip(fields, values)
+                if field and value is not None and str(value).strip() != ''
+            }
+            if row:
+                yield line, row
+    
+    return {field for field in fields if field}, generate()
+
+def with_normalized_cpfs(rows, field='cpf', batch_size=IMPORT_BATCH_SIZE):
+    """
+    (nº da linha, dict, CPF formatado ou None) para cada linha
+    Os CPFs são validados em lotes (normalize_cpfs) sem ler a planilha inteira
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        cpfs = normalize_cpfs([row.get(field) for _, row in batch])
+        for (line, row), cpf_formatted in zip(batch, cpfs):
+            yield line, row, cpf_formatted
+
+def import_sales(fields, rows, key=None, dry_run=False):
+    """
+    Atualiza total_sales/total_lists/goal a partir das linhas da planilha
+    As linhas são validadas à medida que são lidas e gravadas em lotes (executemany)
+    na mesma transação: qualquer erro desfaz a importação inteira
+    Vendas e listas entram no livro de vendas como a diferença para o total atual
+    """
+    started = time.perf_counter()
+    
+    if key is None:
+        key = 'coupon' if 'coupon' in fields else 'cpf'
+    if key not in ('coupon', 'cpf') or key not in fields:
+        raise ValueError('A planilha precisa de uma coluna "cupom" ou "cpf"')
+    if not fields.intersection(IMPORT_VALUE_FIELDS):
+        raise ValueError('A planilha precisa de ao menos uma coluna: "vendas", "listas" ou "meta"')
+    
+    key_column = User.coupon if key == 'coupon' else User.cpf
+    key_label = 'Cupom' if key == 'coupon' else 'CPF'
+    report = {'processed': 0, 'updated': 0, 'error_count': 0, 'errors': []}
+    seen_keys = set()
+    batch = []
+    
+    def add_error(line, message):
+        report['error_count'] += 1
+        if len(report['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line, 'message': message})
+    
+    def flush(batch):
+        # Uma consulta por lote para resolver cupom/CPF -> id e totais atuais
+        found = {
+            k: (user_id, sales_cents, total_lists)
+            for k, user_id, sales_cents, total_lists in db.session.query(
+                key_column, User.id, User.sales_cents, User.total_lists
+            ).filter(key_column.in_([k for _, k, _ in batch])).all()
+        }
+        changes = []
+        goals = []
+        for line, k, values in batch:
+            if k not in found:
+                add_error(line, f'{key_label} não encontrado: {k}')
+                continue
+            user_id, sales_cents, total_lists = found[k]
+            
+            # A planilha traz totais; o livro de vendas registra a diferença
+            changes.append({
+                'user_id': user_id,
+                'sales_cents': to_cents(values['total_sales']) - sales_cents if 'total_sales' in values else 0,
+                'lists': int(values['total_lists']) - (total_lists or 0) if 'total_lists' in values else 0
+            })
+            if 'goal' in values:
+                goals.append({'b_id': user_id, 'b_goal': float(values['goal'])})
+        
+        report['updated'] += len(changes)
+        # Depois do primeiro erro apenas valida: a transação será desfeita
+        if not dry_run and not report['error_count']:
+            record_sales_changes(changes, 'import')
+            if goals:
+                user_table = User.__table__
+                db.session.execute(
+                    user_table.update()
+                    .where(user_table.c.id == db.bindparam('b_id'))
+                    .values(goal=db.bindparam('b_goal'), version=user_table.c.version + 1,
+                            updated_at=datetime.utcnow(), change_seq=next_change_seq()),
+                    goals
+                )
+    
+    if key == 'cpf':
+        rows = with_normalized_cpfs(rows)
+    else:
+        rows = ((line, row, None) for line, row in rows)
+    
+    try:
+        for line, row, cpf_formatted in rows:
+            report['processed'] += 1
+            
+            raw_key = str(row.get(key, '')).strip()
+            if key == 'cpf':
+                if not cpf_formatted:
+                    add_error(line, f'CPF inválido: {raw_key}')
+                    continue
+                user_key = cpf_formatted
+            else:
+                user_key = raw_key.upper()
+            
+            if not user_key:
+                add_error(line, f'{key_label} não informado')
+                continue
+            if user_key in seen_keys:
+                add_error(line, f'{key_label} repetido na planilha: {user_key}')
+                continue
+            seen_keys.add(user_key)
+            
+            values = {}
+            try:
+                for field in IMPORT_VALUE_FIELDS:
+                    if field in row:
+                        values[field] = parse_decimal(row[field])
+            except ValueError:
+                add_error(line, f'Valor numérico inválido: {row[field]}')
+                continue
+            
+            if not values:
+                add_error(line, 'Nenhum valor de vendas, listas ou meta informado')
+                continue
+            if any(v < 0 for v in values.values()):
+                add_error(line, 'Valores não podem ser negativos')
+                continue
+            if 'total_lists' in values:
+                if values['total_lists'] != values['total_lists'].to_integral_value():
+                    add_error(line, f'Quantidade de listas deve ser inteira: {row["total_lists"]}')
+                    continue
+                values['total_lists'] = int(values['total_lists'])
+            
+            batch.append((line, user_key, values))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush(batch)
+                batch = []
+        
+        if batch:
+            flush(batch)
+        
+        report['success'] = report['error_count'] == 0
+        if report['success'] and not dry_run:
+            db.session.commit()
+            ranking_cache.invalidate()
+            publish_changes()
+        else:
+            db.session.rollback()
+            if not report['success']:
+                report['updated'] = 0
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    elapsed = time.perf_counter() - started
+    report['applied'] = report['success'] and not dry_run
+    report['dry_run'] = dry_run
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['processed'] / elapsed) if elapsed > 0 else report['processed']
+    return report
+
+# Cadastro de embaixadores em lote (nome da coluna -> campo)
+ONBOARD_COLUMNS = {
+    'name': 'name',
+    'nome': 'name',
+    'cpf': 'cpf',
+    'password': 'password',
+    'senha': 'password'
+}
+# Processos para os hashes do script onboard_users.py; a rota usa o pool de threads do password_hasher
+ONBOARD_HASH_PROCESSES = int(os.environ.get('ONBOARD_HASH_PROCESSES', os.cpu_count() or 1))
+
+def onboard_users(fields, rows, dry_run=False, processes=1):
+    """
+    Cadastra embaixadores em lote a partir das linhas (nome, CPF, senha)
+    CPFs e cupons existentes são lidos em uma única consulta; os cupons são
+    alocados em memória e os usuários inseridos em lotes, tudo ou nada
+    """
+    started = time.perf_counter()
+    
+    missing = {'name', 'cpf', 'password'} - fields
+    if missing:
+        raise ValueError('A planilha precisa das colunas "nome", "cpf" e "senha"')
+    
+    existing = db.session.query(User.cpf, User.coupon).all()
+    existing_cpfs = {cpf for cpf, _ in existing}
+    coupons = CouponAllocator(coupon for _, coupon in existing)
+    
+    report = {'processed': 0, 'created': 0, 'error_count': 0, 'errors': [], 'users': []}
+    seen_cpfs = set()
+    valid = []
+    
+    def add_error(line, message):
+        report['error_count'] += 1
+        if len(report['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line, 'message': message})
+    
+    for line, row, cpf_formatted in with_normalized_cpfs(rows):
+        report['processed'] += 1
+        name = str(row.get('name', '')).strip()
+        password = str(row.get('password', ''))
+        
+        if not name or not row.get('cpf') or not password:
+            add_error(line, 'Nome, CPF e senha são obrigatórios')
+            continue
+        if len(name) > 100:
+            add_error(line, 'Nome deve ter no máximo 100 caracteres')
+            continue
+        if len(password) < 6:
+            add_error(line, 'A senha deve ter pelo menos 6 caracteres')
+            continue
+        if not cpf_formatted:
+            add_error(line, f'CPF inválido: {row.get("cpf")}')
+            continue
+        if cpf_formatted in existing_cpfs:
+            add_error(line, f'CPF já cadastrado: {cpf_formatted}')
+            continue
+        if cpf_formatted in seen_cpfs:
+            add_error(line, f'CPF repetido na planilha: {cpf_formatted}')
+            continue
+        seen_cpfs.add(cpf_formatted)
+        valid.append((name, cpf_formatted, password))
+    
+    report['success'] = report['error_count'] == 0
+    
+    # Só gasta CPU com hashes quando a planilha inteira é válida
+    if report['success'] and not dry_run:
+        hashes = password_hasher.hash_many((password for _, _, password in valid), processes)
+        mappings = []
+        for (name, cpf_formatted, _), hashed_password in zip(valid, hashes):
+            coupon = coupons.allocate(name)
+            mappings.append({
+                'name': name,
+                'cpf': cpf_formatted,
+                'password': hashed_password,
+                'coupon': coupon,
+                'total_sales': 0.0,
+                'total_lists': 0,
+                'goal': 50000.0
+            })
+            report['users'].append({'name': name, 'cpf': cpf_formatted, 'coupon': coupon})
+        
+        try:
+            # Inserção em lote não passa pelos eventos do ORM: um valor do contador para o lote
+            change_seq = next_change_seq()
+            for mapping in mappings:
+                mapping['change_seq'] = change_seq
+            for start in range(0, len(mappings), IMPORT_BATCH_SIZE):
+                db.session.execute(db.insert(User), mappings[start:start + IMPORT_BATCH_SIZE])
+            # Sem os eventos do ORM: ids reaproveitados de usuários excluídos saem da lista de exclusões
+            db.session.execute(db.delete(UserTombstone).where(UserTombstone.user_id.in_(db.select(User.id))))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        ranking_cache.invalidate()
+        coupon_map.invalidate()
+        publish_changes([])
+        report['created'] = len(mappings)
+    
+    elapsed = time.perf_counter() - started
+    report['applied'] = report['success'] and not dry_run
+    report['dry_run'] = dry_run
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['processed'] / elapsed) if elapsed > 0 else report['processed']
+    return report
+
+# ==================== EXPORTAÇÃO ====================
 
-def admin_required(f):
-    """Decorator para rotas que requerem autenticação de admin"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        admin = get_current_admin()
-        if not admin:
-            # Se for requisição JSON, retornar erro JSON
-            if request.is_json or request.headers.get('Content-Type') == 'application/json':
-                return jsonify({'success': False, 'message': 'Não autenticado. Faça login como administrador.', 'redirect': '/admin/login'}), 401
-            return redirect(url_for('admin_login'))
-        return f(*args, **kwargs)
-    return decorated_function
+# Colunas exportáveis -> cabeçalho do CSV (cupom/vendas/listas/meta são aceitos de volta pela importação)
+EXPORT_COLUMNS = {
+    'position': 'posicao',
+    'id': 'id',
+    'name': 'nome',
+    'cpf': 'cpf',
+    'coupon': 'cupom',
+    'total_sales': 'vendas',
+    'total_lists': 'listas',
+    'goal': 'meta',
+    'progress': 'progresso'
+}
+EXPORT_DEFAULT_COLUMNS = ('position', 'name', 'cpf', 'coupon', 'total_sales', 'total_lists', 'goal', 'progress')
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_SORTS = ('ranking', 'id')
+EXPORT_BATCH_SIZE = 1000  # linhas lidas do banco e enviadas por vez
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
 
-# ==================== FUNÇÕES AUXILIARES ====================
+def csv_safe(value):
+    """Texto que a planilha leria como fórmula (ex.: nome '=HYPERLINK(...)') ganha um ' na frente"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
 
-# Validar CPF
-def validate_cpf(cpf):
+def parse_export_options(values):
     """
-    Valida CPF brasileiro
-    Remove formatação e verifica se é válido
+    Valida as opções da exportação (parâmetros da URL ou da linha de comando)
+    values: format, columns ('name,cpf,...'), q, goal_reached (true/false), min_sales, sort, delimiter
     """
-    # Remove caracteres não numéricos
-    cpf = ''.join(filter(str.isdigit, str(cpf)))
+    def flag(name):
+        value = str(values.get(name) or '').strip().lower()
+        if not value:
+            return None
+        if value not in ('1', 'true', '0', 'false'):
+            raise ValueError(f'Valor inválido para {name}: {value}')
+        return value in ('1', 'true')
     
-    # Verifica se tem 11 dígitos
-    if len(cpf) != 11:
-        return False
+    fmt = values.get('format') or 'csv'
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Formato inválido: {fmt}')
     
-    # Verifica se todos os dígitos são iguais (CPF inválido)
-    if cpf == cpf[0] * 11:
-        return False
+    columns = [c.strip() for c in (values.get('columns') or '').split(',') if c.strip()]
+    columns = columns or list(EXPORT_DEFAULT_COLUMNS)
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f'Coluna(s) inválida(s): {", ".join(unknown)}')
     
-    # Validação dos dígitos verificadores
-    def calculate_digit(cpf, positions):
-        sum = 0
-        for i, pos in enumerate(positions):
-            sum += int(cpf[i]) * pos
-        remainder = sum % 11
-        return 0 if remainder < 2 else 11 - remainder
-    
-    # Verifica primeiro dígito
-    first_digit = calculate_digit(cpf[:9], range(10, 1, -1))
-    if int(cpf[9]) != first_digit:
-        return False
+    sort = values.get('sort') or 'ranking'
+    if sort not in EXPORT_SORTS:
+        raise ValueError(f'Ordenação inválida: {sort}')
     
-    # Verifica segundo dígito
-    second_digit = calculate_digit(cpf[:10], range(11, 1, -1))
-    if int(cpf[10]) != second_digit:
-        return False
+    min_sales = values.get('min_sales')
+    delimiter = values.get('delimiter') or ','
+    if delimiter not in (',', ';'):
+        raise ValueError('Separador deve ser "," ou ";"')
     
-    return True
+    return {
+        'format': fmt,
+        'columns': columns,
+        'search': (values.get('q') or '').strip(),
+        'goal_reached': flag('goal_reached'),
+        'min_sales_cents': to_cents(min_sales) if min_sales not in (None, '') else None,
+        'sort': sort,
+        'delimiter': delimiter
+    }
 
-# Formatar CPF (000.000.000-00)
-def format_cpf(cpf):
+def export_rows(options):
     """
-    Formata CPF removendo caracteres não numéricos e adicionando formatação
+    Linhas da exportação lidas em lotes (yield_per): a memória não cresce com a tabela
+    A posição é a do ranking geral (calculada antes dos filtros)
     """
-    cpf = ''.join(filter(str.isdigit, str(cpf)))
-    if len(cpf) == 11:
-        return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
-    return cpf
+    columns = [User.id, User.name, User.cpf, User.coupon, User.sales_cents,
+               User.total_sales, User.total_lists, User.goal]
+    if 'position' in options['columns']:
+        columns.append(db.func.row_number().over(order_by=(User.total_sales.desc(), User.id)).label('position'))
+    users = db.select(*columns).subquery('u')
+    
+    query = db.select(users)
+    if options['search']:
+        query = query.where(user_search_filter(options['search'], users.c))
+    if options['goal_reached'] is not None:
+        reached = db.func.coalesce(users.c.total_sales, 0) >= users.c.goal
+        query = query.where(reached if options['goal_reached'] else ~reached)
+    if options['min_sales_cents'] is not None:
+        query = query.where(users.c.sales_cents >= options['min_sales_cents'])
+    
+    if options['sort'] == 'ranking':
+        query = query.order_by(users.c.total_sales.desc(), users.c.id)
+    else:
+        query = query.order_by(users.c.id)
+    
+    return db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
 
-# Gerar cupom único
-def generate_coupon(name):
-    import random
-    clean_name = ''.join(name.upper().split())[:8]
-    random_num = random.randint(10, 99)
-    coupon = f"ODONTO{clean_name}{random_num}"
+def export_record(row, columns):
+    """Valores de uma linha nas colunas pedidas"""
+    sales = row.sales_cents / 100
+    goal = row.goal or 0
+    values = {
+        'position': getattr(row, 'position', None),
+        'id': row.id,
+        'name': row.name,
+        'cpf': row.cpf,
+        'coupon': row.coupon,
+        'total_sales': sales,
+        'total_lists': row.total_lists or 0,
+        'goal': goal,
+        'progress': round(sales / goal * 100, 1) if goal > 0 else 0.0
+    }
+    return {column: values[column] for column in columns}
+
+def generate_export(options, stats=None):
+    """
+    Gera o arquivo em pedaços de EXPORT_BATCH_SIZE linhas (CSV ou NDJSON)
+    stats: dict opcional que recebe a contagem de linhas ('rows')
+    """
+    columns = options['columns']
+    buffer = io.StringIO()
+    writer = None
+    if options['format'] == 'csv':
+        writer = csv.writer(buffer, delimiter=options['delimiter'])
+        buffer.write('\ufeff')  # BOM: o Excel reconhece o UTF-8
+        writer.writerow([EXPORT_COLUMNS[c] for c in columns])
     
-    while User.query.filter_by(coupon=coupon).first():
-        random_num = random.randint(10, 99)
-        coupon = f"ODONTO{clean_name}{random_num}"
+    count = 0
+    for row in export_rows(options):
+        record = export_record(row, columns)
+        if writer:
+            writer.writerow([csv_safe(record[c]) for c in columns])
+        else:
+            buffer.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
     
-    return coupon
+    if stats is not None:
+        stats['rows'] = count
+    yield buffer.getvalue()
 
-# Criar admin padrão se não existir
-def create_default_admin():
-    with app.app_context():
-        if not Admin.query.filter_by(username='admin').first():
-            admin = Admin(
-                username='admin',
-                email='admin@odontomaster.com',
-                password=generate_password_hash('adminmaster123'),
-                name='Administrador'
-            )
-            db.session.add(admin)
-            db.session.commit()
-            print('Admin padrão criado: admin / adminmaster123')
+# ==================== ARQUIVOS ESTÁTICOS ====================
+
+ASSET_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # ordem de preferência
+
+_asset_manifest = None
+
+def load_asset_manifest():
+    """Lê o manifest.json do build (nome original -> nome com hash); {} se não houver build"""
+    global _asset_manifest
+    path = os.path.join(app.config['ASSETS_BUILD_DIR'], 'manifest.json')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            _asset_manifest = json.load(f)
+    except (OSError, ValueError):
+        _asset_manifest = {}
+    return _asset_manifest
+
+@app.template_global()
+def asset_url(name):
+    """
+    URL de um arquivo estático pelo nome original (ex.: 'CSS/style.css', 'images/logo-ranking.png')
+    Com o build, aponta para a versão com hash (cache imutável); sem ele, para o arquivo original
+    """
+    manifest = _asset_manifest if _asset_manifest is not None else load_asset_manifest()
+    built = manifest.get(name)
+    if built:
+        return url_for('built_asset', filename=built)
+    if name.startswith('images/'):
+        return url_for('images', filename=name[len('images/'):])
+    return url_for('static', filename=name)
+
+@app.route('/assets/dist/<path:filename>')
+def built_asset(filename):
+    """Serve a versão com hash, pré-comprimida conforme o Accept-Encoding do navegador"""
+    build_dir = app.config['ASSETS_BUILD_DIR']
+    # Tipo do arquivo original (não o application/gzip da variante comprimida)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    encoding, suffix = None, ''
+    for name, ext in ASSET_ENCODINGS:
+        if request.accept_encodings[name] and os.path.isfile(safe_join(build_dir, filename + ext) or ''):
+            encoding, suffix = name, ext
+            break
+
+    response = send_from_directory(build_dir, filename + suffix, mimetype=mimetype,
+                                   max_age=app.config['ASSETS_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+    return response
+
+# ==================== EVENTOS EM TEMPO REAL ====================
+
+SSE_RETRY_MS = 3000  # espera do navegador antes de reconectar
+
+def publish_changes(user_ids=None):
+    """
+    Avisa as conexões SSE de uma escrita (chamar após o commit e o ranking_cache.invalidate())
+    user_ids: usuários alterados; None = todos (importações em lote)
+    """
+    if not app.config['EVENTS_ENABLED']:
+        return
+    channels = ['ranking', 'stats']
+    if user_ids is None:
+        channels.append('user:*')
+    else:
+        channels.extend(f'user:{user_id}' for user_id in user_ids)
+    event_broker.publish(*channels)
+
+def event_stream(channels, render):
+    """
+    Resposta text/event-stream: envia render(canais) na conexão e a cada aviso recebido
+    render retorna [(evento, dados)], ou None para encerrar a conexão
+    """
+    if not app.config['EVENTS_ENABLED']:
+        return jsonify({'success': False, 'message': 'Atualizações em tempo real desativadas!'}), 404
+    if event_broker.subscriber_count() >= event_broker.max_subscribers:
+        response = jsonify({'success': False, 'message': 'Muitas conexões no momento.'})
+        response.headers['Retry-After'] = '60'
+        return response, 503
+    
+    # Servidores que avisam a desconexão do cliente (asgi.py); nos demais vale o SSE_MAX_DURATION
+    disconnected = request.environ.get('app.client_disconnected')
+    
+    def generate():
+        try:
+            subscription = event_broker.subscribe(channels)
+        except TooManySubscribers:
+            return
+        try:
+            yield f'retry: {SSE_RETRY_MS}\n\n'
+            deadline = time.monotonic() + app.config['SSE_MAX_DURATION']
+            changed = set(channels)
+            while True:
+                if changed:
+                    messages = render(changed)
+                    # Não mantém a transação (nem o snapshot do SQLite) aberta entre avisos
+                    db.session.remove()
+                    if messages is None:
+                        return
+                    for event_name, data in messages:
+                        yield format_sse(event_name, json.dumps(data))
+                if time.monotonic() >= deadline or (disconnected is not None and disconnected.is_set()):
+                    return
+                changed = subscription.wait(app.config['SSE_HEARTBEAT'])
+                if not changed:
+                    yield ': ping\n\n'
+        finally:
+            subscription.close()
+    
+    response = app.response_class(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # proxies não devem acumular as mensagens
+    return response
 
 # ==================== ROTAS DO USUÁRIO ====================
 
 @app.route('/')
 def home():
-    user = get_current_user()
-    admin = get_current_admin()
-    
-    if admin:
+    # O usuário só é consultado se não houver admin logado
+    if get_current_admin():
         return redirect(url_for('admin_dashboard'))
-    if user:
+    if get_current_user():
         return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
@@ -299,6 +1992,11 @@ def login():
         return redirect(url_for('dashboard'))
     
     if request.method == 'POST':
+        ip = client_ip()
+        retry_after = login_limiter.retry_after([('ip', ip)])
+        if retry_after:
+            return too_many_attempts_response('login.html', retry_after)
+        
         data = request.get_json() if request.is_json else request.form
         cpf = data.get('cpf')
         password = data.get('password')
@@ -311,22 +2009,35 @@ def login():
             return render_template('login.html')
         
         # Remover formatação e validar CPF
-        cpf_clean = ''.join(filter(str.isdigit, str(cpf)))
-        if not validate_cpf(cpf_clean):
+        cpf_formatted = normalize_cpf(cpf)
+        if not cpf_formatted:
             if request.is_json:
                 return jsonify({'success': False, 'message': 'CPF inválido!'}), 400
             flash('CPF inválido!', 'error')
             return render_template('login.html')
         
-        cpf_formatted = format_cpf(cpf_clean)
+        cpf_clean = cpf_digits(cpf_formatted)
+        
+        # Recusa antes de consultar o banco ou calcular o hash
+        retry_after = login_limiter.retry_after([('cpf', cpf_clean)])
+        if retry_after:
+            return too_many_attempts_response('login.html', retry_after)
+        
         user = User.query.filter_by(cpf=cpf_formatted).first()
         
-        if user and check_password_hash(user.password, password):
+        try:
+            password_ok = user is not None and check_password_and_upgrade(user, password)
+        except PasswordHasherBusy:
+            return password_busy_response('login.html')
+        
+        if password_ok:
+            login_limiter.reset('cpf', cpf_clean)
             login_user_session(user)
             if request.is_json:
                 return jsonify({'success': True, 'message': 'Login realizado com sucesso!', 'redirect': url_for('dashboard')})
             return redirect(url_for('dashboard'))
         else:
+            login_limiter.hit([('ip', ip), ('cpf', cpf_clean)])
             if request.is_json:
                 return jsonify({'success': False, 'message': 'CPF ou senha incorretos!'}), 401
             flash('CPF ou senha incorretos!', 'error')
@@ -337,36 +2048,139 @@ def login():
 @user_required
 def dashboard():
     user = get_current_user()
-    return render_template('index.html', user=user)
+    # A página só muda com escritas do admin: fica guardada até a próxima invalidação
+    return page_cache.get(('dashboard', user.id), lambda: render_template(
+        'index.html', user=user, ranking_html=ranking_cache.get('top3_html', render_ranking_top3)
+    ))
 
 @app.route('/api/user')
 @user_required
 def get_user():
     user = get_current_user()
-    return jsonify(user.to_dict())
+    return conditional_json(user.etag, user_last_modified(user), user.to_dict)
+
+@app.route('/api/events')
+@user_required
+def api_events():
+    """Top 3, posição e progresso do embaixador enviados a cada alteração (SSE)"""
+    user_id = get_current_user().id
+    user_channel = f'user:{user_id}'
+    
+    def render(changed):
+        user = load_principal(User, user_id)
+        if user is None:
+            return None  # usuário excluído
+        messages = []
+        if user_channel in changed or 'user:*' in changed:
+            messages.append(('progress', user.to_dict()))
+        if 'ranking' in changed:
+            ranking, _ = ranking_cache.get('top3', load_ranking_top3)
+            snapshot = ranking_cache.get('snapshot', load_ranking_snapshot)
+            messages.append(('ranking', {
+                'top3': ranking,
+                'position': snapshot.position_of(user.id, user.total_sales),
+                'total': len(snapshot)
+            }))
+        return messages
+    
+    return event_stream({'ranking', user_channel, 'user:*'}, render)
 
 @app.route('/api/ranking/top3')
 @user_required
 def api_ranking_top3():
     """Retorna os 3 usuários com maior total_sales (apenas nome e posição)"""
     try:
-        # Buscar os 3 usuários com maior total_sales, ordenados por total_sales descendente
-        top_users = User.query.order_by(User.total_sales.desc()).limit(3).all()
+        ranking, etag = ranking_cache.get('top3', load_ranking_top3)
+        return conditional_json(etag, ranking_cache.last_modified(), lambda: ranking)
+    except Exception as e:
+        app.logger.exception('Erro ao buscar ranking')
+        return jsonify({'success': False, 'message': f'Erro ao buscar ranking: {str(e)}'}), 500
+
+@app.route('/api/ranking')
+@user_required
+def api_ranking():
+    """
+    Retorna a posição do usuário logado, seus vizinhos e uma página do ranking
+    Parâmetros: around (vizinhos acima/abaixo), offset e limit (página do ranking)
+    """
+    try:
+        around = min(max(int(request.args.get('around', RANKING_AROUND)), 0), RANKING_AROUND_MAX)
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', RANKING_PAGE_SIZE)), 0), RANKING_PAGE_SIZE_MAX)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parâmetros inválidos!'}), 400
+    
+    try:
+        user = get_current_user()
+        snapshot = ranking_cache.get('snapshot', load_ranking_snapshot)
+        position = snapshot.position_of(user.id, user.total_sales)
         
-        # Preparar dados para retorno (apenas nome e posição)
-        ranking = []
-        positions = ['1º', '2º', '3º']
+        neighbours = []
+        if position is not None:
+            neighbours = snapshot.slice(position - 1 - around, position + around)
         
-        for index, user in enumerate(top_users):
-            ranking.append({
-                'position': positions[index],
-                'name': user.name
-            })
+        next_offset = offset + limit if offset + limit < len(snapshot) else None
         
-        return jsonify(ranking)
+        return jsonify({
+            'total': len(snapshot),
+            'position': position,
+            'around': [
+                {'position': e['position'], 'name': e['name'], 'isMe': e['id'] == user.id}
+                for e in neighbours
+            ],
+            'leaderboard': [
+                {'position': e['position'], 'name': e['name']}
+                for e in snapshot.slice(offset, offset + limit)
+            ],
+            'next_offset': next_offset
+        })
     except Exception as e:
+        app.logger.exception('Erro ao buscar ranking')
         return jsonify({'success': False, 'message': f'Erro ao buscar ranking: {str(e)}'}), 500
 
+@app.route('/api/ranking/period')
+@user_required
+def api_ranking_period():
+    """
+    Ranking de um período a partir dos buckets pré-agregados
+    Parâmetros: period (day|month), date (AAAA-MM-DD ou AAAA-MM; padrão hoje) e limit
+    """
+    period = request.args.get('period', 'month')
+    if period not in SALES_PERIODS:
+        return jsonify({'success': False, 'message': 'Período inválido!'}), 400
+    
+    try:
+        raw_date = request.args.get('date')
+        if not raw_date:
+            day = date.today()
+        elif len(raw_date) == 7:
+            day = datetime.strptime(raw_date, '%Y-%m').date()
+        else:
+            day = datetime.strptime(raw_date, '%Y-%m-%d').date()
+        limit = min(max(int(request.args.get('limit', RANKING_PAGE_SIZE)), 1), RANKING_PAGE_SIZE_MAX)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parâmetros inválidos!'}), 400
+    
+    start = period_start(period, day)
+    user = get_current_user()
+    
+    rows = db.session.query(User.name) \
+        .join(SalesBucket, SalesBucket.user_id == User.id) \
+        .filter(SalesBucket.period == period, SalesBucket.period_start == start) \
+        .order_by(SalesBucket.sales_cents.desc(), SalesBucket.user_id) \
+        .limit(limit).all()
+    mine = db.session.get(SalesBucket, (user.id, period, start))
+    
+    return jsonify({
+        'period': period,
+        'period_start': start.isoformat(),
+        'ranking': [{'position': i + 1, 'name': name} for i, (name,) in enumerate(rows)],
+        'me': {
+            'sales': mine.sales_cents / 100 if mine else 0.0,
+            'lists': mine.lists if mine else 0
+        }
+    })
+
 @app.route('/logout')
 def logout():
     logout_user_session()  # Remove apenas sessão do user
@@ -390,14 +2204,28 @@ def admin_login():
         username = data.get('username')
         password = data.get('password')
         
+        # Recusa antes de consultar o banco ou calcular o hash
+        ip = client_ip()
+        username_key = str(username or '').strip().lower()
+        retry_after = login_limiter.retry_after([('ip', ip), ('admin', username_key)])
+        if retry_after:
+            return too_many_attempts_response('admin/login.html', retry_after)
+        
         admin = Admin.query.filter_by(username=username).first()
         
-        if admin and check_password_hash(admin.password, password):
+        try:
+            password_ok = admin is not None and check_password_and_upgrade(admin, password)
+        except PasswordHasherBusy:
+            return password_busy_response('admin/login.html')
+        
+        if password_ok:
+            login_limiter.reset('admin', username_key)
             login_admin_session(admin)
             if request.is_json:
                 return jsonify({'success': True, 'message': 'Login realizado com sucesso!', 'redirect': url_for('admin_dashboard')})
             return redirect(url_for('admin_dashboard'))
         else:
+            login_limiter.hit([('ip', ip), ('admin', username_key)])
             if request.is_json:
                 return jsonify({'success': False, 'message': 'Usuário ou senha incorretos!'}), 401
             flash('Usuário ou senha incorretos!', 'error')
@@ -408,32 +2236,212 @@ def admin_login():
 @admin_required
 def admin_dashboard():
     admin = get_current_admin()
-    users = User.query.order_by(User.id.desc()).all()
-    total_users = len(users)
-    total_sales = sum(u.total_sales for u in users)
-    total_lists = sum(u.total_lists for u in users)
     
-    stats = {
-        'total_users': total_users,
-        'total_sales': total_sales,
-        'total_lists': total_lists
-    }
+    def render_page():
+        # Apenas a primeira página é renderizada; o restante é carregado via /admin/api/users
+        first_page = ranking_cache.get('admin_first_page', load_admin_first_page)
+        return render_template('admin/dashboard.html', admin=admin, **first_page)
     
-    return render_template('admin/dashboard.html', admin=admin, users=users, stats=stats)
+    # Página guardada por admin até a próxima escrita (nenhuma consulta nem template no acerto)
+    return page_cache.get(('admin_dashboard', admin.id), render_page)
+
+@app.route('/admin/api/stats')
+@admin_required
+def admin_get_stats():
+    return conditional_json(data_etag('stats'), ranking_cache.last_modified(), get_user_stats)
+
+@app.route('/admin/api/events')
+@admin_required
+def admin_events():
+    """Estatísticas e versão da tabela de usuários enviadas a cada alteração (SSE)"""
+    def render(changed):
+        stats = ranking_cache.get('admin_stats', get_user_stats)
+        return [('stats', dict(stats, version=current_change_seq()))]
+    
+    return event_stream({'stats'}, render)
+
+@app.route('/admin/api/ratelimit')
+@admin_required
+def admin_get_ratelimit():
+    """Contadores do limite de tentativas de login (monitoramento)"""
+    return jsonify(login_limiter.snapshot())
+
+@app.route('/admin/metrics')
+@admin_required
+def admin_metrics():
+    """Métricas no formato texto do Prometheus (valores do worker que atendeu)"""
+    gauges = [
+        ('password_hash_operations', 'Operações do serviço de hash de senhas',
+         {(('operation', name),): value for name, value in password_hasher.stats.items()}),
+        ('login_rate_limit_events', 'Contadores do limite de tentativas de login',
+         {(('event', name),): value for name, value in login_limiter.snapshot().items()
+          if not isinstance(value, dict)}),
+        ('auth_principal_lookups', 'Carregamentos de usuário/admin logado',
+         {(('result', name),): value for name, value in auth_stats.items()}),
+        ('sse_events', 'Avisos de tempo real (publicados, entregues, filas cheias, conexões recusadas)',
+         {(('event', name),): value for name, value in event_broker.stats.items()}),
+        ('sse_connections', 'Conexões SSE abertas neste worker',
+         {(): event_broker.subscriber_count()}),
+        ('coupon_map_operations', 'Mapa de cupons (acertos, consultas ao banco, descartes LRU, invalidações)',
+         {(('operation', name),): value for name, value in coupon_map.stats.items()}),
+        ('coupon_map_entries', 'Cupons no mapa deste worker',
+         {(): len(coupon_map)})
+    ]
+    response = make_response(metrics.render(gauges))
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/admin/api/users')
 @admin_required
 def admin_get_users():
-    users = User.query.order_by(User.id.desc()).all()
-    return jsonify([{
-        'id': u.id,
-        'name': u.name,
-        'cpf': u.cpf,
-        'coupon': u.coupon,
-        'total_sales': u.total_sales,
-        'total_lists': u.total_lists,
-        'goal': u.goal
-    } for u in users])
+    """
+    Lista usuários paginados
+    Parâmetros: q (nome, CPF ou cupom), sort (recent|sales), limit e cursor
+    """
+    search = request.args.get('q', '').strip()
+    sort = request.args.get('sort', 'recent')
+    cursor = request.args.get('cursor')
+    
+    if sort not in USER_SORTS:
+        return jsonify({'success': False, 'message': 'Ordenação inválida!'}), 400
+    
+    try:
+        limit = int(request.args.get('limit', USERS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Tamanho de página inválido!'}), 400
+    limit = max(1, min(limit, USERS_PAGE_SIZE_MAX))
+    
+    try:
+        cursor_values = decode_cursor(cursor, sort) if cursor else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Cursor inválido!'}), 400
+    
+    def build():
+        change_seq = current_change_seq()
+        users, next_cursor = query_users_page(search, sort, cursor_values, limit)
+        return {
+            'users': [u.to_admin_dict() for u in users],
+            'next_cursor': next_cursor,
+            'version': change_seq
+        }
+    
+    # Qualquer escrita muda a versão global: sem ela, a página pedida é a mesma
+    etag = data_etag('users', search, sort, cursor, limit)
+    return conditional_json(etag, ranking_cache.last_modified(), build)
+
+@app.route('/admin/api/users/changes')
+@admin_required
+def admin_get_user_changes():
+    """
+    Usuários criados/alterados e ids excluídos desde a versão 'since' do contador
+    Com reset=true o cliente deve recarregar a tabela (versão desconhecida ou alterações demais)
+    """
+    try:
+        since = int(request.args.get('since', ''))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Versão inválida!'}), 400
+    
+    def build():
+        version = current_change_seq()
+        if since < 0 or since > version:
+            # Banco restaurado ou versão de outro servidor
+            return {'version': version, 'reset': True, 'users': [], 'deleted': []}
+        
+        users = User.query.filter(User.change_seq > since) \
+            .order_by(User.change_seq).limit(USERS_CHANGES_MAX + 1).all()
+        deleted = db.session.query(UserTombstone.user_id) \
+            .filter(UserTombstone.change_seq > since).limit(USERS_CHANGES_MAX + 1).all()
+        if len(users) + len(deleted) > USERS_CHANGES_MAX:
+            return {'version': version, 'reset': True, 'users': [], 'deleted': []}
+        
+        return {
+            'version': version,
+            'reset': False,
+            'users': [u.to_admin_dict() for u in users],
+            'deleted': [user_id for user_id, in deleted]
+        }
+    
+    return conditional_json(data_etag('changes', since), ranking_cache.last_modified(), build)
+
+@app.route('/admin/api/export/users')
+@admin_required
+def admin_export_users():
+    """
+    Exporta os embaixadores em CSV ou NDJSON, enviados enquanto são lidos do banco
+    Parâmetros: format (csv|ndjson), columns, q, goal_reached, min_sales, sort (ranking|id), delimiter
+    """
+    try:
+        options = parse_export_options(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    filename = f"embaixadores-{datetime.now():%Y%m%d-%H%M}.{options['format']}"
+    response = app.response_class(stream_with_context(generate_export(options)),
+                                  mimetype=EXPORT_FORMATS[options['format']])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/admin/api/users/import', methods=['POST'])
+@admin_required
+def admin_import_sales():
+    """
+    Importa vendas em lote a partir de uma planilha CSV/XLSX (campo "file")
+    Campos opcionais: key (coupon|cpf) e dry_run (apenas valida)
+    """
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'message': 'Nenhum arquivo enviado!'}), 400
+    
+    key = request.form.get('key') or None
+    dry_run = request.form.get('dry_run', '').lower() in ('1', 'true', 'on')
+    
+    try:
+        fields, rows = read_import_file(upload.stream, upload.filename)
+        report = import_sales(fields, rows, key, dry_run)
+    except (ValueError, csv.Error) as e:
+        return jsonify({'success': False, 'message': f'Planilha inválida: {str(e)}'}), 400
+    except Exception as e:
+        app.logger.exception('Erro ao importar vendas')
+        return jsonify({'success': False, 'message': f'Erro ao importar vendas: {str(e)}'}), 500
+    
+    if not report['success']:
+        report['message'] = 'Nenhuma alteração aplicada: corrija os erros da planilha.'
+        return jsonify(report), 400
+    
+    report['message'] = 'Planilha validada com sucesso!' if dry_run else 'Vendas importadas com sucesso!'
+    return jsonify(report)
+
+@app.route('/admin/api/users/onboard', methods=['POST'])
+@admin_required
+def admin_onboard_users():
+    """
+    Cadastra embaixadores em lote a partir de uma planilha CSV/XLSX (campo "file")
+    Colunas: nome, cpf e senha. Campo opcional: dry_run (apenas valida)
+    """
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'message': 'Nenhum arquivo enviado!'}), 400
+    
+    dry_run = request.form.get('dry_run', '').lower() in ('1', 'true', 'on')
+    
+    try:
+        fields, rows = read_import_file(upload.stream, upload.filename, ONBOARD_COLUMNS)
+        report = onboard_users(fields, rows, dry_run)
+    except (ValueError, csv.Error) as e:
+        return jsonify({'success': False, 'message': f'Planilha inválida: {str(e)}'}), 400
+    except Exception as e:
+        app.logger.exception('Erro ao cadastrar usuários')
+        return jsonify({'success': False, 'message': f'Erro ao cadastrar usuários: {str(e)}'}), 500
+    
+    if not report['success']:
+        report['message'] = 'Nenhum usuário cadastrado: corrija os erros da planilha.'
+        return jsonify(report), 400
+    
+    report['message'] = 'Planilha validada com sucesso!' if dry_run else 'Usuários cadastrados com sucesso!'
+    return jsonify(report)
 
 @app.route('/admin/api/user', methods=['POST'])
 @admin_required
@@ -455,17 +2463,15 @@ def admin_create_user():
         return jsonify({'success': False, 'message': 'A senha deve ter pelo menos 6 caracteres!'}), 400
     
     # Validar e formatar CPF
-    cpf_clean = ''.join(filter(str.isdigit, str(cpf)))
-    if not validate_cpf(cpf_clean):
+    cpf_formatted = normalize_cpf(cpf)
+    if not cpf_formatted:
         return jsonify({'success': False, 'message': 'CPF inválido!'}), 400
     
-    cpf_formatted = format_cpf(cpf_clean)
-    
     if User.query.filter_by(cpf=cpf_formatted).first():
         return jsonify({'success': False, 'message': 'Este CPF já está cadastrado!'}), 400
     
     try:
-        hashed_password = generate_password_hash(password)
+        hashed_password = password_hasher.hash(password)
         coupon = generate_coupon(name)
         
         new_user = User(
@@ -480,6 +2486,9 @@ def admin_create_user():
         
         db.session.add(new_user)
         db.session.commit()
+        ranking_cache.invalidate()
+        coupon_map.invalidate()
+        publish_changes([])
         
         return jsonify({
             'success': True,
@@ -494,26 +2503,20 @@ def admin_create_user():
                 'goal': new_user.goal
             }
         })
+    except PasswordHasherBusy:
+        response = jsonify({'success': False, 'message': 'Servidor ocupado. Tente novamente em instantes.'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     except Exception as e:
         db.session.rollback()
-        import traceback
-        print(f"Erro ao criar usuário: {str(e)}")
-        print(traceback.format_exc())
+        app.logger.exception('Erro ao criar usuário')
         return jsonify({'success': False, 'message': f'Erro ao criar usuário: {str(e)}'}), 500
 
 @app.route('/admin/api/user/<int:user_id>', methods=['GET'])
 @admin_required
 def admin_get_user(user_id):
     user = User.query.get_or_404(user_id)
-    return jsonify({
-        'id': user.id,
-        'name': user.name,
-        'cpf': user.cpf,
-        'coupon': user.coupon,
-        'total_sales': user.total_sales,
-        'total_lists': user.total_lists,
-        'goal': user.goal
-    })
+    return conditional_json(user.etag, user_last_modified(user), user.to_admin_dict)
 
 @app.route('/admin/api/user/<int:user_id>', methods=['PUT'])
 @admin_required
@@ -522,14 +2525,26 @@ def admin_update_user(user_id):
     data = request.get_json()
     
     try:
+        # Os novos totais entram no livro de vendas como diferença
+        change = {'user_id': user.id, 'sales_cents': 0, 'lists': 0}
         if 'total_sales' in data:
-            user.total_sales = float(data['total_sales'])
+            change['sales_cents'] = to_cents(data['total_sales']) - user.sales_cents
         if 'total_lists' in data:
-            user.total_lists = int(data['total_lists'])
-        if 'goal' in data:
-            user.goal = float(data['goal'])
+            change['lists'] = int(data['total_lists']) - (user.total_lists or 0)
+        goal = float(data['goal']) if 'goal' in data else None
         
+        recorded = record_sales_changes([change], 'admin')
+        if goal is not None:
+            if recorded:
+                # O UPDATE do livro de vendas já incrementou version/change_seq da linha
+                user_table = User.__table__
+                db.session.execute(user_table.update().where(user_table.c.id == user.id).values(goal=goal))
+            else:
+                user.goal = goal
         db.session.commit()
+        ranking_cache.invalidate()
+        principal_cache.invalidate(User, user_id)
+        publish_changes([user_id])
         
         return jsonify({
             'success': True,
@@ -544,6 +2559,7 @@ def admin_update_user(user_id):
         })
     except Exception as e:
         db.session.rollback()
+        app.logger.exception('Erro ao atualizar usuário')
         return jsonify({'success': False, 'message': f'Erro ao atualizar: {str(e)}'}), 500
 
 @app.route('/admin/api/user/<int:user_id>', methods=['DELETE'])
@@ -552,111 +2568,227 @@ def admin_delete_user(user_id):
     user = User.query.get_or_404(user_id)
     
     try:
+        SalesBucket.query.filter_by(user_id=user_id).delete()
+        SalesEvent.query.filter_by(user_id=user_id).delete()
         db.session.delete(user)
+        # Marca a exclusão para a sincronização incremental (o id pode ser reutilizado depois)
+        UserTombstone.query.filter_by(user_id=user_id).delete()
+        db.session.add(UserTombstone(user_id=user_id, change_seq=next_change_seq(), deleted_at=datetime.utcnow()))
         db.session.commit()
+        ranking_cache.invalidate()
+        coupon_map.invalidate()
+        principal_cache.invalidate(User, user_id)
+        publish_changes([user_id])
+        revoke_user_sessions(user_id)
         return jsonify({'success': True, 'message': 'Usuário excluído com sucesso!'})
     except Exception as e:
         db.session.rollback()
+        app.logger.exception('Erro ao excluir usuário')
         return jsonify({'success': False, 'message': f'Erro ao excluir: {str(e)}'}), 500
 
+@app.route('/admin/api/user/<int:user_id>/sessions', methods=['DELETE'])
+@admin_required
+def admin_revoke_user_sessions(user_id):
+    """Desconecta o embaixador de todos os dispositivos"""
+    User.query.get_or_404(user_id)
+    
+    try:
+        revoked = revoke_user_sessions(user_id)
+    except Exception as e:
+        app.logger.exception('Erro ao encerrar sessões')
+        return jsonify({'success': False, 'message': f'Erro ao encerrar sessões: {str(e)}'}), 500
+    
+    if revoked is None:
+        return jsonify({
+            'success': False,
+            'message': 'Revogação de sessões exige SESSION_TYPE "filesystem" ou "database"!'
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'message': f'{revoked} sessão(ões) encerrada(s)!',
+        'revoked': revoked
+    })
+
+@app.route('/admin/api/user/<int:user_id>/sales', methods=['POST'])
+@admin_required
+def admin_add_sales(user_id):
+    """Registra um lançamento (positivo ou estorno) de vendas/listas para o usuário"""
+    user = User.query.get_or_404(user_id)
+    data = request.get_json() or {}
+    
+    try:
+        change = {
+            'user_id': user.id,
+            'sales_cents': to_cents(data.get('sales', 0)),
+            'lists': int(data.get('lists', 0))
+        }
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Valores inválidos!'}), 400
+    
+    if not change['sales_cents'] and not change['lists']:
+        return jsonify({'success': False, 'message': 'Informe vendas ou listas!'}), 400
+    if user.sales_cents + change['sales_cents'] < 0 or (user.total_lists or 0) + change['lists'] < 0:
+        return jsonify({'success': False, 'message': 'O estorno deixaria o total negativo!'}), 400
+    
+    note = (data.get('note') or '').strip()[:200] or None
+    
+    try:
+        record_sales_changes([change], 'admin', note)
+        db.session.commit()
+        ranking_cache.invalidate()
+        principal_cache.invalidate(User, user_id)
+        publish_changes([user_id])
+        
+        return jsonify({
+            'success': True,
+            'message': 'Lançamento registrado com sucesso!',
+            'user': user.to_admin_dict()
+        })
+    except Exception as e:
+        db.session.rollback()
+        app.logger.exception('Erro ao registrar lançamento')
+        return jsonify({'success': False, 'message': f'Erro ao registrar lançamento: {str(e)}'}), 500
+
+@app.route('/admin/api/user/<int:user_id>/sales', methods=['GET'])
+@admin_required
+def admin_get_sales_history(user_id):
+    """Histórico de lançamentos do usuário, do mais recente ao mais antigo (cursor: before)"""
+    User.query.get_or_404(user_id)
+    
+    try:
+        before = int(request.args['before']) if request.args.get('before') else None
+        limit = min(max(int(request.args.get('limit', SALES_HISTORY_PAGE_SIZE)), 1), USERS_PAGE_SIZE_MAX)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parâmetros inválidos!'}), 400
+    
+    query = SalesEvent.query.filter_by(user_id=user_id)
+    if before:
+        query = query.filter(SalesEvent.id < before)
+    events = query.order_by(SalesEvent.id.desc()).limit(limit + 1).all()
+    
+    next_before = events[limit - 1].id if len(events) > limit else None
+    return jsonify({
+        'events': [e.to_dict() for e in events[:limit]],
+        'next_before': next_before
+    })
+
+@app.route('/admin/api/coupons/<coupon>', methods=['GET'])
+@admin_required
+def admin_resolve_coupon(coupon):
+    """Embaixador dono do cupom (checkout)"""
+    coupon = normalize_coupon(coupon)
+    owner = coupon_map.resolve(coupon)
+    if owner is None:
+        return jsonify({'success': False, 'message': f'Cupom não encontrado: {coupon}'}), 404
+    return jsonify({'success': True, 'coupon': coupon, 'user': {'id': owner[0], 'name': owner[1]}})
+
+@app.route('/admin/api/coupons/resolve', methods=['POST'])
+@admin_required
+def admin_resolve_coupons():
+    """Donos de vários cupons: {"coupons": [...]} -> {"users": {cupom: {id, name} ou null}}"""
+    data = request.get_json(silent=True) or {}
+    coupons = data.get('coupons')
+    if not isinstance(coupons, list) or not coupons:
+        return jsonify({'success': False, 'message': 'Informe a lista "coupons"!'}), 400
+    if len(coupons) > COUPON_BATCH_MAX:
+        return jsonify({'success': False, 'message': f'Máximo de {COUPON_BATCH_MAX} cupons por requisição!'}), 400
+    
+    owners = coupon_map.resolve_many([normalize_coupon(c) for c in coupons])
+    return jsonify({
+        'success': True,
+        'users': {
+            coupon: {'id': owner[0], 'name': owner[1]} if owner else None
+            for coupon, owner in owners.items()
+        }
+    })
+
+@app.route('/admin/api/coupons/attributions', methods=['POST'])
+@admin_required
+def admin_attribute_sales():
+    """
+    Lança vendas por cupom em lote: {"attributions": [{"coupon", "sales", "lists", "note"}], "dry_run"}
+    Tudo ou nada: com qualquer erro nenhum lançamento é gravado
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('attributions')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': 'Informe a lista "attributions"!'}), 400
+    if len(items) > COUPON_BATCH_MAX:
+        return jsonify({'success': False, 'message': f'Máximo de {COUPON_BATCH_MAX} lançamentos por requisição!'}), 400
+    
+    try:
+        report = attribute_sales(items, dry_run=bool(data.get('dry_run')))
+    except Exception as e:
+        app.logger.exception('Erro ao atribuir vendas')
+        return jsonify({'success': False, 'message': f'Erro ao atribuir vendas: {str(e)}'}), 500
+    
+    if not report['success']:
+        report['message'] = 'Nenhuma alteração aplicada: corrija os erros do lote.'
+        return jsonify(report), 400
+    report['message'] = ('Lote validado com sucesso!' if report['dry_run']
+                         else f"{report['recorded']} lançamento(s) registrado(s)!")
+    return jsonify(report)
+
 @app.route('/admin/logout')
 def admin_logout():
     logout_admin_session()  # Remove apenas sessão do admin
     return redirect(url_for('admin_login'))
 
 # ==================== INICIALIZAÇÃO ====================
+# Importar o módulo apenas configura o app; o que é caro fica para o deploy
+# (prepare_deployment) ou para a subida de cada worker (init_worker)
+
+_worker_ready = False
 
-def migrate_email_to_cpf():
+def init_worker():
     """
-    Migra a coluna email para cpf na tabela user
+    Preparação de cada worker (passenger_wsgi.py, asgi.py), uma vez por processo:
+    confere o banco, carrega os templates e o manifest dos arquivos estáticos
     """
-    import sqlite3
-    from sqlalchemy import inspect
-    
-    # Define o caminho do banco de dados
-    database_dir = os.path.join(basedir, 'database')
-    db_path = os.path.join(database_dir, 'users.db')
-    if not os.path.exists(db_path):
-        return  # Banco não existe ainda, será criado com a estrutura correta
-    
-    try:
-        # Verificar se a tabela user existe
-        inspector = inspect(db.engine)
-        if 'user' not in inspector.get_table_names():
-            return  # Tabela não existe ainda
-        
-        columns = [col['name'] for col in inspector.get_columns('user')]
-        
-        # Se já tem cpf e não tem email, já está migrado
-        if 'cpf' in columns and 'email' not in columns:
-            return
-        
-        # Se não tem email e não tem cpf, não precisa migrar (tabela vazia ou já atualizada)
-        if 'email' not in columns and 'cpf' not in columns:
-            return
-        
-        # Conectar diretamente ao SQLite para fazer a migração
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Recriar a tabela sem a coluna email
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_new (
-                id INTEGER PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                cpf VARCHAR(14) NOT NULL UNIQUE,
-                password VARCHAR(200) NOT NULL,
-                coupon VARCHAR(50) NOT NULL UNIQUE,
-                total_sales FLOAT,
-                total_lists INTEGER,
-                goal FLOAT
-            )
-        ''')
-        
-        # Se já tem cpf na tabela antiga, copiar dados incluindo cpf
-        if 'cpf' in columns:
-            # Verificar se há CPFs válidos (não o padrão)
-            cursor.execute("SELECT COUNT(*) FROM user WHERE cpf IS NOT NULL AND cpf != '000.000.000-00'")
-            valid_cpf_count = cursor.fetchone()[0]
-            
-            if valid_cpf_count > 0:
-                # Copiar apenas usuários com CPF válido
-                cursor.execute('''
-                    INSERT INTO user_new (id, name, cpf, password, coupon, total_sales, total_lists, goal)
-                    SELECT id, name, cpf, password, coupon, total_sales, total_lists, goal
-                    FROM user
-                    WHERE cpf IS NOT NULL AND cpf != '000.000.000-00'
-                ''')
-            # Se não há CPFs válidos, tabela nova fica vazia (admin precisará recriar usuários)
-        else:
-            # Se não tem cpf na tabela antiga, não podemos migrar (não há como converter email para CPF)
-            # A tabela nova ficará vazia e o admin precisará recriar os usuários com CPF
-            print('Aviso: Usuários existentes serão removidos pois não há como converter email para CPF.')
-            print('O administrador precisará recriar os usuários com CPF.')
-        
-        # Remover tabela antiga e renomear nova
-        cursor.execute('DROP TABLE user')
-        cursor.execute('ALTER TABLE user_new RENAME TO user')
-        
-        conn.commit()
-        conn.close()
-        print('Migração de email para cpf concluída com sucesso!')
-        
-    except Exception as e:
-        import traceback
-        print(f'Erro na migração: {str(e)}')
-        print(traceback.format_exc())
-        # Se der erro, deixa o db.create_all() criar a estrutura correta
+    global _worker_ready
+    if _worker_ready:
+        return
+    _worker_ready = True
+    report_database_config()
+    # Carrega os templates do cache de bytecode (ou compila e grava) antes da primeira requisição
+    precompile_templates()
+    # Nomes com hash dos arquivos estáticos (assets/dist/manifest.json)
+    load_asset_manifest()
+
+def prepare_deployment():
+    """
+    Trabalho feito uma vez por deploy (python migrations.py), e não por cada worker novo:
+    cria a SECRET_KEY e grava o bytecode dos módulos (.pyc) e dos templates
+    Deve rodar com o mesmo Python dos workers (o .pyc é por versão)
+    """
+    import compileall
+    if os.environ.get('SECRET_KEY'):
+        secret_key = 'variável de ambiente'
+    else:
+        secret_key = 'criada' if create_secret_key_file() else 'existente'
+    modules = sorted(name for name in os.listdir(basedir) if name.endswith('.py'))
+    compiled = compileall.compile_dir(basedir, maxlevels=0, quiet=1)
+    templates = precompile_templates() if app.config['TEMPLATE_BYTECODE_DIR'] else 0
+    return {
+        'secret_key': secret_key,
+        'modules': len(modules) if compiled else 0,
+        'templates': templates
+    }
 
 def create_tables():
-    with app.app_context():
-        # Executar migração antes de criar tabelas
-        migrate_email_to_cpf()
-        db.create_all()
-        create_default_admin()
+    """
+    Aplica as migrações pendentes (equivale a: python migrations.py)
+    Não é chamada pelos workers: o esquema é atualizado uma vez por deploy
+    """
+    from migrations import migrate
+    migrate()
 
 if __name__ == '__main__':
+    # migrations.py importa "app": reaproveita este módulo em vez de carregá-lo de novo
+    sys.modules.setdefault('app', sys.modules[__name__])
     create_tables()
+    report_database_config()
     # Em produção, usar variável de ambiente PORT
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
@@ -0,0 +1,384 @@
+"""
+Entrada ASGI opcional, ao lado do passenger_wsgi.py
+Execute: uvicorn asgi:application --workers 2
+
+As rotas JSON mais chamadas (ASYNC_ROUTES: dados do embaixador, Top 3, estatísticas
+e cupons do checkout) são atendidas no event loop, com o banco acessado pelo
+SQLAlchemy asyncio (aiosqlite no SQLite, asyncpg no PostgreSQL): uma consulta
+lenta não prende o worker. As demais rotas (páginas, escritas, importações, SSE...)
+passam pela ponte WSGI (a2wsgi) e rodam o app Flask em um pool de threads (ASGI_WSGI_THREADS),
+cada requisição inteira na mesma thread; as sessões das rotas assíncronas são lidas
+em um pool à parte (ASGI_SESSION_THREADS). O hash de senhas dessas rotas vai para o
+pool do password_hasher (PASSWORD_HASH_WORKERS, ligado por padrão neste modo).
+
+Requer: pip install uvicorn a2wsgi aiosqlite greenlet (asyncpg no PostgreSQL)
+Sem o driver assíncrono, todas as rotas passam pela ponte WSGI.
+"""
+
+import asyncio
+import inspect
+import io
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 16))
+
+# O hash de senhas fora da thread da requisição: o pool da ponte não fica preso a ele
+os.environ.setdefault('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1)))
+# SSE ligado: cada conexão ocupa uma thread da ponte, não o worker inteiro; metade das
+# threads fica reservada às demais rotas
+os.environ.setdefault('EVENTS_ENABLED', 'true')
+os.environ.setdefault('SSE_MAX_CLIENTS', str(max(1, WSGI_THREADS // 2)))
+
+from flask import session
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from werkzeug.http import http_date, is_resource_modified, quote_etag
+
+from app import (app, db, User, Admin, apply_sqlite_pragmas, metrics,
+                 ranking_cache, coupon_map, CACHE_MISS, COUPON_BATCH_MAX, IMPORT_BATCH_SIZE,
+                 normalize_coupon, data_etag, user_last_modified, user_stats_select, user_stats_dict,
+                 ranking_top3_select, ranking_top3, init_worker)
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}
+# Pool próprio para ler sessões: as rotas assíncronas não entram na fila da ponte
+SESSION_THREADS = int(os.environ.get('ASGI_SESSION_THREADS', 2))
+WSGI_QUEUE_CHUNKS = 8  # pedaços da resposta em espera antes de a thread aguardar o cliente
+
+def async_database_url(url):
+    """URL do banco com o driver assíncrono correspondente (None se não houver)"""
+    scheme, sep, rest = url.partition('://')
+    dialect = scheme.split('+', 1)[0]
+    driver = ASYNC_DRIVERS.get(dialect)
+    return f'{dialect}+{driver}://{rest}' if driver and sep else None
+
+def create_async_db_engine():
+    """Engine assíncrono com as mesmas opções do app; None se o driver não está instalado"""
+    url = async_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url is None:
+        return None
+    try:
+        from sqlalchemy import event
+        from sqlalchemy.ext.asyncio import create_async_engine
+        engine = create_async_engine(url, **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    except ImportError as e:
+        logger.warning('Rotas assíncronas desativadas (%s): tudo passa pela ponte WSGI', e)
+        return None
+
+    if url.startswith('sqlite'):
+        @event.listens_for(engine.sync_engine, 'connect')
+        def on_connect(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection)
+    return engine
+
+# ==================== PONTE WSGI ====================
+
+# Sinaliza ao app (environ) que o cliente desconectou: event_stream encerra o SSE
+DISCONNECTED_KEY = 'app.client_disconnected'
+
+def merge_cookie_headers(scope):
+    """
+    Vários cabeçalhos Cookie (permitidos no HTTP/2) em um só, separados por '; '
+    Os adaptadores juntam cabeçalhos repetidos com ',', o que corromperia os cookies
+    """
+    cookies = [value for name, value in scope.get('headers', []) if name == b'cookie']
+    if len(cookies) < 2:
+        return scope
+    headers = [(name, value) for name, value in scope['headers'] if name != b'cookie']
+    return dict(scope, headers=headers + [(b'cookie', b'; '.join(cookies))])
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+class WSGIBridge:
+    """
+    Executa o app WSGI (Flask) com o WSGIMiddleware do a2wsgi: cada requisição roda
+    inteira em uma thread do pool e a resposta volta em pedaços (SSE, exportação)
+    O corpo é lido antes e a desconexão do cliente chega ao app pelo environ
+    (DISCONNECTED_KEY): o a2wsgi só descarta os pedaços enviados depois dela
+    """
+
+    def __init__(self, wsgi_app, threads):
+        def wsgi_with_disconnect(environ, start_response):
+            environ[DISCONNECTED_KEY] = environ['asgi.scope'][DISCONNECTED_KEY]
+            environ['wsgi.input_terminated'] = True  # corpo completo: lido até o fim (inclusive chunked)
+            return wsgi_app(environ, start_response)
+        self.middleware = WSGIMiddleware(wsgi_with_disconnect, workers=threads,
+                                         send_queue_size=WSGI_QUEUE_CHUNKS)
+
+    def shutdown(self):
+        self.middleware.executor.shutdown(wait=False)
+
+    async def __call__(self, scope, receive, send):
+        body = await read_body(receive)
+        disconnected = threading.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await asyncio.shield(watcher)
+            return {'type': 'http.disconnect'}
+
+        try:
+            await self.middleware(dict(scope, **{DISCONNECTED_KEY: disconnected}), replay_receive, send)
+        finally:
+            watcher.cancel()
+
+# ==================== ROTAS ASSÍNCRONAS ====================
+
+class AsyncRequest:
+    """Dados de uma requisição atendida no event loop"""
+
+    def __init__(self, scope, environ, params, conn):
+        self.scope = scope
+        self.environ = environ
+        self.params = params
+        self.conn = conn
+        self.user = None
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    async def execute(self, statement):
+        started = time.perf_counter()
+        result = await self.conn.execute(statement)
+        self.queries += 1
+        self.query_seconds += time.perf_counter() - started
+        return result
+
+    def json_body(self):
+        try:
+            return app.json.loads(self.environ['wsgi.input'].getvalue() or b'null')
+        except ValueError:
+            return None
+
+def json_response(data, status=200, headers=None):
+    # Mesmo corpo do jsonify()
+    body = f"{app.json.dumps(data, separators=(',', ':'))}\n".encode('utf-8')
+    return status, [('Content-Type', 'application/json')] + (headers or []), body
+
+async def conditional_json(request, etag, last_modified, build):
+    """Como conditional_json() do app: 304 sem chamar build() se o cliente tem a versão"""
+    headers = [('ETag', quote_etag(etag)), ('Cache-Control', 'private, no-cache')]
+    if last_modified:
+        headers.append(('Last-Modified', http_date(last_modified)))
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return 304, headers, b''
+    data = build()
+    if inspect.isawaitable(data):
+        data = await data
+    return json_response(data, headers=headers)
+
+async def get_user(request):
+    user = request.user
+    return await conditional_json(request, user.etag, user_last_modified(user), user.to_dict)
+
+async def api_ranking_top3(request):
+    version, cached = ranking_cache.lookup('top3')
+    if cached is CACHE_MISS:
+        cached = ranking_top3((await request.execute(ranking_top3_select())).scalars())
+        ranking_cache.store('top3', version, cached)
+    ranking, etag = cached
+    return await conditional_json(request, etag, ranking_cache.last_modified(), lambda: ranking)
+
+async def admin_get_stats(request):
+    async def build():
+        return user_stats_dict((await request.execute(user_stats_select())).one())
+    return await conditional_json(request, data_etag('stats'), ranking_cache.last_modified(), build)
+
+async def resolve_coupons(request, coupons):
+    version, result, missing = coupon_map.lookup(coupons)
+    loaded = {}
+    for start in range(0, len(missing), IMPORT_BATCH_SIZE):
+        rows = await request.execute(coupon_map.load_select(missing[start:start + IMPORT_BATCH_SIZE]))
+        loaded.update(coupon_map.rows_to_owners(rows))
+    return coupon_map.store(version, result, missing, loaded)
+
+async def admin_resolve_coupon(request):
+    coupon = normalize_coupon(request.params['coupon'])
+    owner = (await resolve_coupons(request, [coupon]))[coupon]
+    if owner is None:
+        return json_response({'success': False, 'message': f'Cupom não encontrado: {coupon}'}, 404)
+    return json_response({'success': True, 'coupon': coupon, 'user': {'id': owner[0], 'name': owner[1]}})
+
+async def admin_resolve_coupons(request):
+    data = request.json_body() or {}
+    coupons = data.get('coupons') if isinstance(data, dict) else None
+    if not isinstance(coupons, list) or not coupons:
+        return json_response({'success': False, 'message': 'Informe a lista "coupons"!'}, 400)
+    if len(coupons) > COUPON_BATCH_MAX:
+        return json_response({'success': False, 'message': f'Máximo de {COUPON_BATCH_MAX} cupons por requisição!'}, 400)
+
+    owners = await resolve_coupons(request, [normalize_coupon(c) for c in coupons])
+    return json_response({
+        'success': True,
+        'users': {
+            coupon: {'id': owner[0], 'name': owner[1]} if owner else None
+            for coupon, owner in owners.items()
+        }
+    })
+
+# (método, caminho, quem pode acessar, função); os nomes das funções são os endpoints do app
+ASYNC_ROUTES = [
+    ('GET', '/api/user', 'user', get_user),
+    ('GET', '/api/ranking/top3', 'user', api_ranking_top3),
+    ('GET', '/admin/api/stats', 'admin', admin_get_stats),
+    ('GET', '/admin/api/coupons/(?P<coupon>[^/]+)', 'admin', admin_resolve_coupon),
+    ('POST', '/admin/api/coupons/resolve', 'admin', admin_resolve_coupons),
+]
+ASYNC_ROUTES = [(method, re.compile(path), role, handler) for method, path, role, handler in ASYNC_ROUTES]
+
+def read_session(environ):
+    """
+    (user_id, admin_id, cabeçalhos) da sessão do Flask, lida pela interface do app
+    (cookie ou armazenamento no servidor); a renovação da expiração também é aplicada
+    """
+    with app.request_context(environ):
+        user_id = session.get('user_id')
+        admin_id = session.get('admin_id')
+        response = app.response_class()
+        app.session_interface.save_session(app, session._get_current_object(), response)
+        headers = [(k, v) for k, v in response.headers.items() if k in ('Set-Cookie', 'Vary')]
+    return user_id, admin_id, headers
+
+def unauthorized(environ, role):
+    """Mesma resposta dos decorators user_required/admin_required"""
+    is_json = environ.get('CONTENT_TYPE', '').split(';')[0].strip() == 'application/json'
+    if role == 'admin':
+        if is_json:
+            return json_response({'success': False, 'message': 'Não autenticado. Faça login como administrador.',
+                                  'redirect': '/admin/login'}, 401)
+        return 302, [('Location', '/admin/login')], b''
+    if is_json:
+        return json_response({'success': False, 'message': 'Não autenticado. Faça login.', 'redirect': '/login'}, 401)
+    return 302, [('Location', '/login')], b''
+
+# ==================== APLICAÇÃO ====================
+
+class AsgiApplication:
+    """Despacha as rotas de ASYNC_ROUTES no event loop e as demais para a ponte WSGI"""
+
+    def __init__(self, wsgi_app, threads=WSGI_THREADS):
+        self.bridge = WSGIBridge(wsgi_app, threads)
+        self.session_executor = ThreadPoolExecutor(max_workers=SESSION_THREADS, thread_name_prefix='session')
+        self.engine = None
+        self._started = False
+
+    def startup(self):
+        if self._started:
+            return
+        self._started = True
+        init_worker()
+        self.engine = create_async_db_engine()
+
+    async def shutdown(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+        self.bridge.shutdown()
+        self.session_executor.shutdown(wait=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return  # websockets não são usados pelo app
+
+        self.startup()  # servidores sem lifespan
+        scope = merge_cookie_headers(scope)
+        route = self.match(scope['method'], scope['path'])
+        if route is None or self.engine is None:
+            await self.bridge(scope, receive, send)
+            return
+        await self.handle(scope, receive, send, *route)
+
+    def match(self, method, path):
+        for route_method, pattern, role, handler in ASYNC_ROUTES:
+            if route_method == method:
+                found = pattern.fullmatch(path)
+                if found:
+                    return role, handler, found.groupdict()
+        return None
+
+    async def handle(self, scope, receive, send, role, handler, params):
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        environ = build_environ(scope, io.BytesIO(await read_body(receive)))
+
+        # A sessão pode estar em arquivo ou no banco (síncronos): lida no pool das sessões
+        user_id, admin_id, session_headers = await loop.run_in_executor(
+            self.session_executor, read_session, environ)
+
+        async with self.engine.connect() as conn:
+            request = AsyncRequest(scope, environ, params, conn)
+            response = None
+            if role == 'user':
+                row = (await request.execute(
+                    db.select(User.__table__).where(User.id == user_id)
+                )).first() if user_id else None
+                if row is None:
+                    response = unauthorized(environ, role)
+                else:
+                    request.user = User(**row._mapping)
+            elif not admin_id or (await request.execute(
+                    db.select(Admin.id).where(Admin.id == admin_id))).first() is None:
+                response = unauthorized(environ, role)
+
+            if response is None:
+                try:
+                    response = await handler(request)
+                except Exception:
+                    logger.exception('Erro na rota assíncrona %s', scope['path'])
+                    response = json_response({'success': False, 'message': 'Erro interno do servidor'}, 500)
+
+        status, headers, body = response
+        headers = headers + session_headers + [('Content-Length', str(len(body)))]
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+        metrics.observe_request(handler.__name__, scope['method'], status,
+                                time.perf_counter() - started, request.queries, request.query_seconds)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+application = AsgiApplication(app)
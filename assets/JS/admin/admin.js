@@ -25,6 +25,18 @@ document.addEventListener('DOMContentLoaded', function() {
         searchInput.addEventListener('input', handleSearch);
     }
     
+    // Ordenação da tabela
+    const sortSelect = document.getElementById('sortSelect');
+    if (sortSelect) {
+        sortSelect.addEventListener('change', handleSortChange);
+    }
+    
+    // Carregamento paginado ao rolar a tabela
+    setupInfiniteScroll();
+    
+    // Estatísticas e tabela atualizadas pelo servidor a cada alteração
+    subscribeToUpdates();
+    
     // Refresh button
     const refreshBtn = document.getElementById('refreshBtn');
     if (refreshBtn) {
@@ -143,20 +155,312 @@ function toggleSidebar() {
     mainContent.classList.toggle('expanded');
 }
 
-function handleSearch(e) {
-    const searchTerm = e.target.value.toLowerCase().trim();
-    const rows = document.querySelectorAll('#usersTableBody tr');
+// ==================== REQUISIÇÕES CONDICIONAIS ====================
+
+// Últimas respostas GET por URL com seus validadores (ETag/Last-Modified)
+const conditionalCache = new Map();
+const CONDITIONAL_CACHE_MAX = 50;
+
+// GET que envia If-None-Match/If-Modified-Since: com 304 o servidor não
+// consulta nem reenvia os dados, e a resposta guardada é reaproveitada
+async function fetchConditional(url) {
+    const cached = conditionalCache.get(url);
+    const headers = {};
+    if (cached) {
+        if (cached.etag) headers['If-None-Match'] = cached.etag;
+        if (cached.lastModified) headers['If-Modified-Since'] = cached.lastModified;
+    }
+    
+    const response = await fetch(url, { credentials: 'same-origin', headers });
+    if (response.status === 304 && cached) {
+        return { response, data: cached.data, notModified: true };
+    }
+    if (!response.ok) {
+        return { response, data: null, notModified: false };
+    }
+    
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    const lastModified = response.headers.get('Last-Modified');
+    if (etag || lastModified) {
+        conditionalCache.delete(url);
+        if (conditionalCache.size >= CONDITIONAL_CACHE_MAX) {
+            conditionalCache.delete(conditionalCache.keys().next().value);
+        }
+        conditionalCache.set(url, { etag, lastModified, data });
+    }
+    return { response, data, notModified: false };
+}
+
+// ==================== TEMPO REAL ====================
+
+const POLL_INTERVAL_MS = 30000;
+let pollTimer = null;
+
+// Avisos do servidor (SSE): estatísticas novas e, se a tabela mudou, sincronização incremental
+// Com o SSE desligado no servidor (padrão no Passenger), consulta periódica com ETag
+function subscribeToUpdates() {
+    if (!document.getElementById('usersTableBody')) return;
+    if (document.body.dataset.events !== 'on' || !('EventSource' in window)) {
+        startPolling();
+        return;
+    }
+    
+    const source = new EventSource('/admin/api/events');
+    
+    source.addEventListener('stats', e => {
+        const data = JSON.parse(e.data);
+        updateStats(data);
+        if (usersState.version !== null && data.version !== usersState.version && !usersState.loading) {
+            syncUsers().catch(error => console.error('Erro ao sincronizar usuários:', error));
+        }
+    });
+    
+    source.onerror = () => {
+        // Conexão recusada (limite do servidor ou sessão expirada): tenta de novo mais tarde
+        if (source.readyState === EventSource.CLOSED) {
+            setTimeout(subscribeToUpdates, 60000);
+        }
+    };
+}
+
+// Estatísticas com If-None-Match: 304 = nenhuma alteração desde a última consulta;
+// senão a tabela recebe só as alterações (/admin/api/users/changes)
+async function pollUpdates() {
+    if (document.hidden) return;
+    try {
+        const { data: stats, notModified } = await fetchConditional('/admin/api/stats');
+        if (!stats || notModified) return;
+        updateStats(stats);
+        if (usersState.version !== null && !usersState.loading) {
+            await syncUsers();
+        }
+    } catch (error) {
+        console.error('Erro ao atualizar o painel:', error);
+    }
+}
+
+function startPolling() {
+    if (pollTimer) return;
+    pollTimer = setInterval(pollUpdates, POLL_INTERVAL_MS);
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden) pollUpdates();
+    });
+}
+
+// ==================== PAGINAÇÃO ====================
+
+// Estado da listagem paginada de usuários
+const usersState = {
+    search: '',
+    sort: 'recent',
+    nextCursor: null,
+    version: null,      // contador de alterações da última carga (sincronização incremental)
+    loading: false,
+    requestId: 0
+};
+
+let searchTimeout = null;
+let usersObserver = null;
+
+function setupInfiniteScroll() {
+    const tbody = document.getElementById('usersTableBody');
+    const sentinel = document.getElementById('usersSentinel');
+    if (!tbody || !sentinel) return;
+    
+    // Cursor da próxima página renderizado pelo servidor (se houver)
+    usersState.nextCursor = tbody.dataset.nextCursor || null;
+    if (tbody.dataset.version !== undefined && tbody.dataset.version !== '') {
+        usersState.version = Number(tbody.dataset.version);
+    }
     
-    rows.forEach(row => {
-        const name = row.querySelector('.user-name')?.textContent.toLowerCase() || '';
-        const cpf = row.querySelector('.user-cpf')?.textContent.toLowerCase() || '';
-        const coupon = row.querySelector('.coupon-badge')?.textContent.toLowerCase() || '';
+    if (!('IntersectionObserver' in window)) return;
+    
+    usersObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreUsers();
+        }
+    }, { rootMargin: '200px' });
+    usersObserver.observe(sentinel);
+}
+
+function recheckSentinel() {
+    // Reobservar força nova verificação caso a sentinela continue visível
+    const sentinel = document.getElementById('usersSentinel');
+    if (usersObserver && sentinel) {
+        usersObserver.unobserve(sentinel);
+        usersObserver.observe(sentinel);
+    }
+}
+
+async function fetchUsersPage(cursor) {
+    const params = new URLSearchParams({ sort: usersState.sort });
+    if (usersState.search) params.set('q', usersState.search);
+    if (cursor) params.set('cursor', cursor);
+    
+    const { response, data } = await fetchConditional(`/admin/api/users?${params.toString()}`);
+    
+    if (!data) {
+        // Tentar parsear erro JSON
+        try {
+            const errorData = await response.json();
+            showToast(errorData.message || 'Erro ao carregar dados!', 'error');
+            // Se for erro de autenticação, redirecionar para login
+            if (response.status === 401 || response.status === 403) {
+                // Fazer logout e redirecionar imediatamente
+                fetch('/admin/logout', { credentials: 'same-origin', method: 'GET' })
+                    .finally(() => {
+                        window.location.href = errorData.redirect || '/admin/login';
+                    });
+            }
+        } catch {
+            // Se não conseguir parsear JSON, verificar se é redirect
+            if (response.redirected || response.status === 302) {
+                window.location.href = '/admin/login';
+                return null;
+            }
+            showToast('Erro ao carregar dados!', 'error');
+        }
+        return null;
+    }
+    
+    return data;
+}
+
+// Recarrega a tabela a partir da primeira página
+async function reloadUsers() {
+    const requestId = ++usersState.requestId;
+    usersState.loading = true;
+    
+    try {
+        const data = await fetchUsersPage(null);
+        if (!data || requestId !== usersState.requestId) return false;
         
-        if (name.includes(searchTerm) || cpf.includes(searchTerm) || coupon.includes(searchTerm)) {
-            row.style.display = '';
-        } else {
-            row.style.display = 'none';
+        usersState.nextCursor = data.next_cursor;
+        usersState.version = data.version;
+        updateUsersTable(data.users);
+        recheckSentinel();
+        return true;
+    } finally {
+        if (requestId === usersState.requestId) {
+            usersState.loading = false;
+        }
+    }
+}
+
+// Acrescenta a próxima página ao final da tabela
+async function loadMoreUsers() {
+    if (usersState.loading || !usersState.nextCursor) return;
+    
+    const requestId = usersState.requestId;
+    usersState.loading = true;
+    
+    try {
+        const data = await fetchUsersPage(usersState.nextCursor);
+        // Descarta a página se a busca/ordenação mudou nesse meio tempo
+        if (!data || requestId !== usersState.requestId) return;
+        
+        usersState.nextCursor = data.next_cursor;
+        updateUsersTable(data.users, true);
+        recheckSentinel();
+    } catch (error) {
+        console.error('Erro ao carregar mais usuários:', error);
+        showToast('Erro ao carregar mais usuários!', 'error');
+    } finally {
+        if (requestId === usersState.requestId) {
+            usersState.loading = false;
+        }
+    }
+}
+
+// Aplica na tabela apenas os usuários criados, alterados ou excluídos desde a última carga
+async function syncUsers() {
+    if (usersState.version === null) return reloadUsers();
+    
+    const requestId = usersState.requestId;
+    const response = await fetch(`/admin/api/users/changes?since=${usersState.version}`, {
+        credentials: 'same-origin'
+    });
+    // Erros (inclusive de autenticação) são tratados pela carga completa
+    if (!response.ok) return reloadUsers();
+    
+    const changes = await response.json();
+    if (requestId !== usersState.requestId) return false;
+    if (changes.reset) return reloadUsers();
+    
+    applyUserChanges(changes);
+    usersState.version = changes.version;
+    recheckSentinel();
+    return true;
+}
+
+function applyUserChanges(changes) {
+    const tbody = document.getElementById('usersTableBody');
+    if (!tbody) return;
+    
+    changes.deleted.forEach(id => {
+        const row = tbody.querySelector(`tr[data-user-id="${id}"]`);
+        if (row) row.remove();
+    });
+    
+    changes.users.forEach(user => {
+        const row = tbody.querySelector(`tr[data-user-id="${user.id}"]`);
+        if (row) {
+            row.remove();
+        } else if (!matchesSearch(user)) {
+            return;
         }
+        placeUserRow(tbody, user);
+    });
+}
+
+// Mesmo filtro da busca do servidor (nome, CPF ou cupom)
+function matchesSearch(user) {
+    const term = usersState.search.toLowerCase();
+    if (!term) return true;
+    return [user.name, user.cpf, user.coupon].some(value => value.toLowerCase().includes(term));
+}
+
+// Insere a linha na posição da ordenação atual
+function placeUserRow(tbody, user) {
+    const comesBefore = row => {
+        const rowId = Number(row.dataset.userId);
+        if (usersState.sort === 'sales') {
+            const rowSales = Number(row.dataset.sales);
+            return user.total_sales > rowSales || (user.total_sales === rowSales && user.id < rowId);
+        }
+        return user.id > rowId;
+    };
+    
+    const next = Array.from(tbody.rows).find(comesBefore);
+    if (next) {
+        next.insertAdjacentHTML('beforebegin', userRowHTML(user));
+    } else if (!usersState.nextCursor) {
+        tbody.insertAdjacentHTML('beforeend', userRowHTML(user));
+    }
+    // Depois da última linha carregada com páginas pendentes: virá com a rolagem
+}
+
+function handleSearch(e) {
+    const searchTerm = e.target.value.trim();
+    
+    // Aguarda o usuário parar de digitar antes de consultar o servidor
+    clearTimeout(searchTimeout);
+    searchTimeout = setTimeout(() => {
+        if (searchTerm === usersState.search) return;
+        usersState.search = searchTerm;
+        reloadUsers().catch(error => {
+            console.error('Erro ao buscar usuários:', error);
+            showToast('Erro ao buscar usuários!', 'error');
+        });
+    }, 300);
+}
+
+function handleSortChange(e) {
+    usersState.sort = e.target.value;
+    reloadUsers().catch(error => {
+        console.error('Erro ao ordenar usuários:', error);
+        showToast('Erro ao ordenar usuários!', 'error');
     });
 }
 
@@ -171,39 +475,10 @@ async function refreshUsers() {
     `;
     
     try {
-        const response = await fetch('/admin/api/users', {
-            credentials: 'same-origin'
-        });
-        
-        if (!response.ok) {
-            // Tentar parsear erro JSON
-            try {
-                const errorData = await response.json();
-                showToast(errorData.message || 'Erro ao carregar dados!', 'error');
-                // Se for erro de autenticação, redirecionar para login
-                if (response.status === 401 || response.status === 403) {
-                    // Fazer logout e redirecionar imediatamente
-                    fetch('/admin/logout', { credentials: 'same-origin', method: 'GET' })
-                        .finally(() => {
-                            window.location.href = errorData.redirect || '/admin/login';
-                        });
-                    return;
-                }
-            } catch {
-                // Se não conseguir parsear JSON, verificar se é redirect
-                if (response.redirected || response.status === 302) {
-                    window.location.href = '/admin/login';
-                    return;
-                }
-                showToast('Erro ao carregar dados!', 'error');
-            }
-            return;
+        const [loaded] = await Promise.all([syncUsers(), refreshStats()]);
+        if (loaded) {
+            showToast('Dados atualizados com sucesso!', 'success');
         }
-        
-        const users = await response.json();
-        updateUsersTable(users);
-        updateStats(users);
-        showToast('Dados atualizados com sucesso!', 'success');
     } catch (error) {
         console.error('Erro ao atualizar dados:', error);
         showToast('Erro ao atualizar dados!', 'error');
@@ -218,12 +493,22 @@ async function refreshUsers() {
     }
 }
 
-function updateUsersTable(users) {
+function updateUsersTable(users, append = false) {
     const tbody = document.getElementById('usersTableBody');
     if (!tbody) return;
     
-    tbody.innerHTML = users.map(user => `
-        <tr data-user-id="${user.id}">
+    const rowsHTML = users.map(userRowHTML).join('');
+    
+    if (append) {
+        tbody.insertAdjacentHTML('beforeend', rowsHTML);
+    } else {
+        tbody.innerHTML = rowsHTML;
+    }
+}
+
+function userRowHTML(user) {
+    return `
+        <tr data-user-id="${user.id}" data-sales="${user.total_sales}">
             <td>
                 <div class="user-info">
                     <div class="user-avatar">${user.name.charAt(0).toUpperCase()}</div>
@@ -265,21 +550,29 @@ function updateUsersTable(users) {
                 </div>
             </td>
         </tr>
-    `).join('');
+    `;
 }
 
-function updateStats(users) {
-    const totalUsers = users.length;
-    const totalSales = users.reduce((sum, u) => sum + u.total_sales, 0);
-    const totalLists = users.reduce((sum, u) => sum + u.total_lists, 0);
-    
+// Busca apenas os totais agregados (não depende da lista de usuários)
+async function refreshStats() {
+    try {
+        const { data: stats, notModified } = await fetchConditional('/admin/api/stats');
+        if (stats && !notModified) {
+            updateStats(stats);
+        }
+    } catch (error) {
+        console.error('Erro ao atualizar estatísticas:', error);
+    }
+}
+
+function updateStats(stats) {
     const statUsers = document.getElementById('statUsers');
     const statSales = document.getElementById('statSales');
     const statLists = document.getElementById('statLists');
     
-    if (statUsers) statUsers.textContent = totalUsers;
-    if (statSales) statSales.textContent = formatCurrency(totalSales);
-    if (statLists) statLists.textContent = totalLists;
+    if (statUsers) statUsers.textContent = stats.total_users;
+    if (statSales) statSales.textContent = formatCurrency(stats.total_sales);
+    if (statLists) statLists.textContent = stats.total_lists;
 }
 
 // ==================== CREATE MODAL ====================
@@ -415,11 +708,9 @@ async function openEditModal(userId) {
     const modal = document.getElementById('editModal');
     
     try {
-        const response = await fetch(`/admin/api/user/${userId}`, {
-            credentials: 'same-origin'
-        });
+        const { response, data: user } = await fetchConditional(`/admin/api/user/${userId}`);
         
-        if (!response.ok) {
+        if (!user) {
             try {
                 const errorData = await response.json();
                 showToast(errorData.message || 'Erro ao carregar dados do usuário!', 'error');
@@ -440,7 +731,6 @@ async function openEditModal(userId) {
             return;
         }
         
-        const user = await response.json();
         document.getElementById('editUserId').value = user.id;
         document.getElementById('editAvatar').textContent = user.name.charAt(0).toUpperCase();
         document.getElementById('editName').textContent = user.name;
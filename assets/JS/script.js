@@ -159,6 +159,13 @@ function removePrizeBanner() {
 
 // Carregar ranking dos top 3 embaixadores
 async function loadRanking() {
+    // Top 3 já renderizado pelo servidor junto com a página: não precisa buscar de novo
+    const renderedList = document.getElementById('rankingList');
+    if (renderedList && renderedList.dataset.rendered === 'true') {
+        console.log('✅ Ranking já renderizado pelo servidor');
+        return;
+    }
+    
     console.log('🔍 Iniciando busca pelo elemento rankingList...');
     
     // Tentar encontrar o elemento com retry
@@ -325,27 +332,7 @@ async function loadRanking() {
             return;
         }
         
-        // Definir classes de medalha
-        const badgeClasses = ['gold', 'silver', 'bronze'];
-        
-        // Criar HTML do ranking
-        let rankingHTML = '';
-        ranking.forEach((user, index) => {
-            const badgeClass = badgeClasses[index] || '';
-            
-            rankingHTML += `
-                <div class="ranking-item">
-                    <div class="ranking-position">
-                        <div class="position-badge ${badgeClass}">${user.position}</div>
-                    </div>
-                    <div class="ranking-name">
-                        <span>${user.name || 'Sem nome'}</span>
-                    </div>
-                </div>
-            `;
-        });
-        
-        rankingList.innerHTML = rankingHTML;
+        rankingList.innerHTML = rankingHTML(ranking);
         console.log('✅ Ranking exibido com sucesso!');
     } catch (error) {
         console.error('❌ Erro ao carregar ranking:', error);
@@ -376,6 +363,149 @@ async function loadRanking() {
     }
 }
 
+// HTML dos itens do Top 3 (mesma marcação de pages/_ranking_top3.html)
+function rankingHTML(ranking) {
+    if (ranking.length === 0) {
+        return `
+            <div class="ranking-empty">
+                <p>Nenhum embaixador no ranking ainda.</p>
+            </div>
+        `;
+    }
+    
+    // Definir classes de medalha
+    const badgeClasses = ['gold', 'silver', 'bronze'];
+    
+    return ranking.map((user, index) => `
+        <div class="ranking-item">
+            <div class="ranking-position">
+                <div class="position-badge ${badgeClasses[index] || ''}">${user.position}</div>
+            </div>
+            <div class="ranking-name">
+                <span>${user.name || 'Sem nome'}</span>
+            </div>
+        </div>
+    `).join('');
+}
+
+function showMyPosition(position, total) {
+    const rankingMe = document.getElementById('rankingMe');
+    if (!rankingMe || !position) return;
+    
+    rankingMe.innerHTML = `Sua posição: <strong>${position}º</strong> de ${total} embaixadores`;
+    rankingMe.classList.remove('hidden');
+}
+
+// Atualizações enviadas pelo servidor (SSE): ranking e progresso sem recarregar a página
+// Com o SSE desligado no servidor (padrão no Passenger), consulta periódica com ETag
+function subscribeToUpdates() {
+    if (document.body.dataset.events !== 'on' || !('EventSource' in window)) {
+        startPolling();
+        return;
+    }
+    
+    const source = new EventSource('/api/events');
+    
+    source.addEventListener('ranking', e => {
+        const data = JSON.parse(e.data);
+        const rankingList = document.getElementById('rankingList');
+        if (rankingList) {
+            rankingList.innerHTML = rankingHTML(data.top3);
+        }
+        showMyPosition(data.position, data.total);
+    });
+    
+    source.addEventListener('progress', e => {
+        Object.assign(userData, JSON.parse(e.data));
+        initializeData();
+    });
+    
+    source.onerror = () => {
+        // Conexão recusada (limite do servidor ou sessão expirada): tenta de novo mais tarde
+        if (source.readyState === EventSource.CLOSED) {
+            setTimeout(subscribeToUpdates, 60000);
+        }
+    };
+}
+
+const POLL_INTERVAL_MS = 30000;
+let pollTimer = null;
+
+// Últimas respostas com seus ETags: com 304 o servidor não consulta nem reenvia os dados
+const conditionalETags = new Map();
+
+// GET com If-None-Match; retorna os dados novos ou null se nada mudou
+async function fetchIfChanged(url) {
+    const headers = { 'Accept': 'application/json' };
+    const etag = conditionalETags.get(url);
+    if (etag) headers['If-None-Match'] = etag;
+    
+    const response = await fetch(url, { credentials: 'same-origin', headers });
+    if (response.status === 401) {
+        window.location.href = '/login';
+        return null;
+    }
+    if (response.status === 304 || !response.ok) return null;
+    
+    const newETag = response.headers.get('ETag');
+    if (newETag) conditionalETags.set(url, newETag);
+    return response.json();
+}
+
+async function pollUpdates() {
+    // Aba em segundo plano: não consulta (retoma quando ficar visível)
+    if (document.hidden) return;
+    try {
+        const user = await fetchIfChanged('/api/user');
+        if (user) {
+            Object.assign(userData, user);
+            initializeData();
+        }
+        const top3 = await fetchIfChanged('/api/ranking/top3');
+        if (top3) {
+            const rankingList = document.getElementById('rankingList');
+            if (rankingList) {
+                rankingList.innerHTML = rankingHTML(top3);
+            }
+        }
+        // A posição muda com as vendas de qualquer embaixador
+        if (user || top3) {
+            loadMyPosition();
+        }
+    } catch (error) {
+        console.error('❌ Erro ao atualizar dados:', error);
+    }
+}
+
+function startPolling() {
+    if (pollTimer) return;
+    pollTimer = setInterval(pollUpdates, POLL_INTERVAL_MS);
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden) pollUpdates();
+    });
+}
+
+// Carregar a posição do usuário logado no ranking completo
+async function loadMyPosition() {
+    const rankingMe = document.getElementById('rankingMe');
+    if (!rankingMe) return;
+    
+    try {
+        const response = await fetch('/api/ranking?around=0&limit=0', {
+            credentials: 'same-origin',
+            headers: {
+                'Accept': 'application/json'
+            }
+        });
+        if (!response.ok) return;
+        
+        const ranking = await response.json();
+        showMyPosition(ranking.position, ranking.total);
+    } catch (error) {
+        console.error('❌ Erro ao carregar posição no ranking:', error);
+    }
+}
+
 // Inicializar quando a página carregar
 function initializePage() {
     console.log('🚀 Inicializando página...');
@@ -391,6 +521,8 @@ function initializePage() {
         console.log('📋 Seção de ranking no DOM:', !!document.querySelector('.ranking-section'));
         console.log('📋 Elemento rankingList no DOM:', !!document.getElementById('rankingList'));
         loadRanking();
+        loadMyPosition();
+        subscribeToUpdates();
     }, 500);
 }
 
@@ -0,0 +1,177 @@
+"""
+Capacidade por processo: WSGI (uma requisição por vez, como um worker do Passenger)
+contra a entrada ASGI (asgi.py, um worker do uvicorn)
+
+Execute: python benchmarks/asgi_capacity.py [--users 1000] [--pollers 16] [--logins 2]
+                                            [--seconds 10] [--modes wsgi,asgi] [--db-latency-ms 2]
+
+Carga mista: `pollers` clientes consultam /api/user e /api/ranking/top3 sem parar
+(como os dashboards abertos) enquanto `logins` clientes fazem login em sequência
+(hash de senha, CPU). No WSGI cada login e cada espera pelo banco seguram o worker;
+no ASGI as consultas esperam o banco no event loop enquanto os hashes rodam no pool.
+--db-latency-ms simula a ida e volta de um banco remoto. Requer uvicorn e aiosqlite.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import HttpDriver, PASSWORD, SEED, make_cpf, percentile, seed
+
+# Servidor em um processo novo; a latência simulada entra em cada comando SQL, na thread
+# que executa o SQLite (a da requisição no WSGI, a do aiosqlite no ASGI), como a ida e
+# volta de rede de um banco remoto
+SERVER = """
+import logging, sqlite3, sqlite3.dbapi2, sys, time
+mode, port, latency = sys.argv[1], int(sys.argv[2]), float(sys.argv[3]) / 1000
+if latency:
+    connect = sqlite3.connect
+    def slow_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(lambda statement: time.sleep(latency))
+        return conn
+    sqlite3.connect = sqlite3.dbapi2.connect = slow_connect  # aiosqlite e SQLAlchemy
+if mode == 'wsgi':
+    from werkzeug.serving import run_simple
+    from app import app
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    run_simple('127.0.0.1', port, app, threaded=False)
+else:
+    import uvicorn
+    uvicorn.run('asgi:application', host='127.0.0.1', port=port, log_level='warning', access_log=False)
+"""
+
+def seed_database(users):
+    import app as A
+    seed(A, users)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(mode, env, latency_ms):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, '-c', SERVER, mode, str(port), str(latency_ms)], cwd=ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'Servidor {mode} não iniciou')
+
+def run_mode(mode, args, env):
+    process, base_url = start_server(mode, env, args.db_latency_ms)
+    stop = threading.Event()
+    results = {'poll': [], 'login': []}
+    errors = {'poll': 0, 'login': 0}
+    lock = threading.Lock()
+
+    def client(kind, index):
+        rng = random.Random(SEED + index)
+        driver = HttpDriver(base_url)
+        if kind == 'poll':
+            driver.request('POST', '/login', {'cpf': make_cpf(100000000 + index), 'password': PASSWORD})
+        paths = ('/api/user', '/api/ranking/top3')
+        count = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            if kind == 'poll':
+                status, _ = driver.request('GET', paths[count % 2])
+            else:
+                cpf = make_cpf(100000000 + rng.randrange(args.users))
+                status, _ = driver.request('POST', '/login', {'cpf': cpf, 'password': PASSWORD})
+            elapsed = time.perf_counter() - started
+            count += 1
+            with lock:
+                results[kind].append(elapsed)
+                if status >= 400:
+                    errors[kind] += 1
+
+    threads = [threading.Thread(target=client, args=('poll', i)) for i in range(args.pollers)]
+    threads += [threading.Thread(target=client, args=('login', args.pollers + i)) for i in range(args.logins)]
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(1)  # logins dos pollers e aquecimento
+        with lock:
+            results['poll'].clear()
+            results['login'].clear()
+            errors.update(poll=0, login=0)
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    summary = {}
+    for kind, latencies in results.items():
+        summary[kind] = {
+            'requests': len(latencies),
+            'errors': errors[kind],
+            'rps': round(len(latencies) / args.seconds, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1)
+        }
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Capacidade por processo: WSGI x ASGI')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--pollers', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--db-latency-ms', type=float, default=2.0,
+                        help='latência simulada por comando SQL (0 = SQLite local puro)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='odonto-asgi-')
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'users.db'),
+               SECRET_KEY='benchmark',
+               SESSION_FILE_DIR=os.path.join(workdir, 'sessions'),
+               RANKING_CACHE_FILE=os.path.join(workdir, '.ranking_version'),
+               COUPON_CACHE_FILE=os.path.join(workdir, '.coupon_version'),
+               EVENTS_FILE=os.path.join(workdir, 'events.db'),
+               TEMPLATE_BYTECODE_DIR=os.path.join(workdir, 'jinja'),
+               LOGIN_RATE_LIMIT_ENABLED='false',  # todas as requisições saem do mesmo IP
+               LOG_LEVEL='WARNING')
+    os.environ.update(env)
+    process = multiprocessing.Process(target=seed_database, args=(args.users,))
+    process.start()
+    process.join()
+
+    print("=" * 72)
+    print(f"{'modo':<8}{'carga':<8}{'reqs':>8}{'req/s':>10}{'erros':>8}{'p50 (ms)':>12}{'p95 (ms)':>12}")
+    print("=" * 72)
+    for mode in args.modes.split(','):
+        summary = run_mode(mode, args, env)
+        for kind, row in summary.items():
+            print(f"{mode:<8}{kind:<8}{row['requests']:>8}{row['rps']:>10}{row['errors']:>8}"
+                  f"{row['p50_ms']:>12}{row['p95_ms']:>12}")
+    print("=" * 72)
+    print(f"{args.pollers} clientes consultando, {args.logins} fazendo login, {args.seconds:g}s por modo, "
+          f"{args.db_latency_ms:g} ms por comando SQL")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
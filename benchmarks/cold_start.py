@@ -0,0 +1,140 @@
+"""
+Subida de um worker novo: tempo até a primeira resposta e perfil de importação
+
+Execute: python benchmarks/cold_start.py [--runs 5] [--path /login] [--top 15] [--no-profile]
+
+Cada execução é um processo Python novo que importa passenger_wsgi.py (como o Passenger
+ao criar um worker) e atende uma requisição pelo test client. O app é copiado para um
+diretório temporário, com banco próprio, em dois cenários:
+  sem preparo   .pyc, cache de templates e .secret_key apagados antes de cada execução
+                (todo worker como o primeiro após um upload)
+  após o deploy python migrations.py executado uma vez (prepare_deployment)
+No fim, o perfil de `python -X importtime` da importação de passenger_wsgi mostra os
+módulos mais caros (tempo acumulado, em ms).
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import passenger_wsgi
+imported = time.perf_counter()
+response = passenger_wsgi.application.test_client().get(sys.argv[1])
+answered = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'request_ms': (answered - imported) * 1000,
+                  'status': response.status_code}), flush=True)
+"""
+
+def copy_app(workdir):
+    """Módulos da raiz e templates; o restante (banco, caches) é criado pelo próprio app"""
+    target = os.path.join(workdir, 'app')
+    os.makedirs(os.path.join(target, 'database'))
+    for path in glob.glob(os.path.join(ROOT, '*.py')):
+        shutil.copy(path, target)
+    shutil.copytree(os.path.join(ROOT, 'pages'), os.path.join(target, 'pages'))
+    return target
+
+def clean_deploy(target):
+    shutil.rmtree(os.path.join(target, '__pycache__'), ignore_errors=True)
+    shutil.rmtree(os.path.join(target, '.jinja_cache'), ignore_errors=True)
+    if os.path.exists(os.path.join(target, '.secret_key')):
+        os.remove(os.path.join(target, '.secret_key'))
+
+def run_worker(target, env, path):
+    """Tempo total (processo novo -> resposta) e as parciais medidas no worker"""
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', CHILD, path], cwd=target, env=env,
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    total_ms = (time.perf_counter() - started) * 1000
+    process.wait()
+    if not line:
+        raise RuntimeError('O worker terminou sem responder')
+    result = json.loads(line)
+    result['total_ms'] = total_ms
+    return result
+
+def import_profile(target, env, top):
+    """Módulos mais caros de `python -X importtime -c "import passenger_wsgi"`"""
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import passenger_wsgi'],
+                             cwd=target, env=env, capture_output=True, text=True)
+    entries = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((int(cumulative_us) / 1000, int(self_us) / 1000, depth, name.strip()))
+
+    # Os filhos vêm antes do pai: o bloco de passenger_wsgi termina na sua linha
+    end = next(i for i, entry in enumerate(entries) if entry[3] == 'passenger_wsgi' and entry[2] == 0)
+    start = end
+    while start > 0 and entries[start - 1][2] > 0:
+        start -= 1
+    # Só os níveis de cima: passenger_wsgi, o app e o que ele importa diretamente
+    block = [entry for entry in entries[start:end + 1] if entry[2] <= 2]
+    return sorted(block, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description='Subida de um worker novo')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/login', help='primeira requisição do worker')
+    parser.add_argument('--top', type=int, default=15, help='módulos listados no perfil de importação')
+    parser.add_argument('--no-profile', action='store_true')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='odonto-start-')
+    target = copy_app(workdir)
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('SECRET_KEY', 'DATABASE_URL', 'TEMPLATE_BYTECODE_DIR', 'PYTHONDONTWRITEBYTECODE')}
+    env['LOG_LEVEL'] = 'WARNING'
+    subprocess.run([sys.executable, 'migrations.py'], cwd=target, env=env, check=True, capture_output=True)
+
+    scenarios = []
+    results = []
+    for _ in range(args.runs):
+        clean_deploy(target)
+        results.append(run_worker(target, env, args.path))
+    scenarios.append(('sem preparo', results))
+
+    clean_deploy(target)
+    subprocess.run([sys.executable, 'migrations.py'], cwd=target, env=env, check=True, capture_output=True)
+    scenarios.append(('após o deploy', [run_worker(target, env, args.path) for _ in range(args.runs)]))
+
+    print("=" * 72)
+    print(f"{'cenário':<16}{'importação':>14}{'1ª requisição':>16}{'total (mediana)':>18}{'mínimo':>8}")
+    print("=" * 72)
+    for name, results in scenarios:
+        statuses = {r['status'] for r in results}
+        print(f"{name:<16}{statistics.median(r['import_ms'] for r in results):>11.1f} ms"
+              f"{statistics.median(r['request_ms'] for r in results):>13.1f} ms"
+              f"{statistics.median(r['total_ms'] for r in results):>15.1f} ms"
+              f"{min(r['total_ms'] for r in results):>8.0f}"
+              + ('' if statuses == {200} else f"  status {sorted(statuses)}"))
+    print("=" * 72)
+    print(f"{args.runs} workers por cenário, primeira requisição GET {args.path}; "
+          "total = do processo novo até a resposta")
+
+    if not args.no_profile:
+        print()
+        print(f"{'módulo (-X importtime)':<40}{'acumulado (ms)':>16}{'próprio (ms)':>16}")
+        print("-" * 72)
+        for cumulative_ms, self_ms, depth, name in import_profile(target, env, args.top):
+            print(f"{'  ' * depth + name:<40}{cumulative_ms:>16.1f}{self_ms:>16.1f}")
+    shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Micro-benchmark da validação/formatação de CPF
+Compara a implementação anterior (filter(str.isdigit) + laço por dígito) com o
+módulo cpf: um valor por vez, com cache (normalize_cpf) e em lote
+(normalize_cpfs em Python puro e com NumPy, se instalado)
+
+Execute: python benchmarks/cpf_validation.py [--count 200000] [--repeat 3] [--invalid 0.1]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cpf
+
+SEED = 42
+
+def legacy_validate_cpf(value):
+    """validate_cpf anterior ao módulo cpf"""
+    value = ''.join(filter(str.isdigit, str(value)))
+    if len(value) != 11:
+        return False
+    if value == value[0] * 11:
+        return False
+
+    def calculate_digit(value, positions):
+        total = 0
+        for i, pos in enumerate(positions):
+            total += int(value[i]) * pos
+        remainder = total % 11
+        return 0 if remainder < 2 else 11 - remainder
+
+    if int(value[9]) != calculate_digit(value[:9], range(10, 1, -1)):
+        return False
+    if int(value[10]) != calculate_digit(value[:10], range(11, 1, -1)):
+        return False
+    return True
+
+def legacy_format_cpf(value):
+    """format_cpf anterior ao módulo cpf"""
+    value = ''.join(filter(str.isdigit, str(value)))
+    if len(value) == 11:
+        return f"{value[:3]}.{value[3:6]}.{value[6:9]}-{value[9:]}"
+    return value
+
+def make_values(count, invalid_ratio):
+    """CPFs sintéticos em formatos variados, com uma fração inválida"""
+    rng = random.Random(SEED)
+    values = []
+    for _ in range(count):
+        digits = [rng.randint(0, 9) for _ in range(9)]
+        for weight in (10, 11):
+            remainder = sum(d * w for d, w in zip(digits, range(weight, 1, -1))) % 11
+            digits.append(0 if remainder < 2 else 11 - remainder)
+        if rng.random() < invalid_ratio:
+            digits[10] = (digits[10] + 1) % 10
+        text = ''.join(map(str, digits))
+        style = rng.randrange(3)
+        if style == 1:
+            text = f"{text[:3]}.{text[3:6]}.{text[6:9]}-{text[9:]}"
+        elif style == 2:
+            text = f" {text[:3]} {text[3:6]} {text[6:9]} {text[9:]} "
+        values.append(text)
+    return values
+
+def legacy_batch(values):
+    return [legacy_format_cpf(v) if legacy_validate_cpf(v) else None for v in values]
+
+def single_batch(values):
+    return [cpf.format_cpf(v) if cpf.validate_cpf(v) else None for v in values]
+
+def cached_batch(values):
+    return [cpf.normalize_cpf(v) for v in values]
+
+CASES = [
+    ('anterior (por valor)', legacy_batch),
+    ('cpf.validate+format', single_batch),
+    ('cpf.normalize_cpf (cache)', cached_batch),
+    ('normalize_cpfs (Python)', lambda values: cpf.normalize_cpfs(values, use_numpy=False)),
+]
+if cpf.load_numpy() is not None:
+    CASES.append(('normalize_cpfs (NumPy)', lambda values: cpf.normalize_cpfs(values, use_numpy=True)))
+
+def best_time(func, values, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(values)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark da validação de CPF')
+    parser.add_argument('--count', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--invalid', type=float, default=0.1, help='fração de CPFs inválidos')
+    args = parser.parse_args()
+
+    values = make_values(args.count, args.invalid)
+    expected = legacy_batch(values)
+
+    print("=" * 72)
+    print(f"{'implementação':<30}{'tempo (s)':>12}{'CPFs/s':>14}{'ganho':>10}")
+    print("=" * 72)
+    baseline = None
+    for name, func in CASES:
+        elapsed, result = best_time(func, values, args.repeat)
+        if result != expected:
+            print(f"ERRO: {name} diverge da implementação anterior")
+            return 1
+        baseline = baseline or elapsed
+        print(f"{name:<30}{elapsed:>12.3f}{args.count / elapsed:>14,.0f}{baseline / elapsed:>9.1f}x")
+    print("=" * 72)
+    if cpf.load_numpy() is None:
+        print("Aviso: NumPy não instalado; o caminho vetorizado não foi medido.")
+    print(f"{args.count} CPFs, {sum(v is None for v in expected)} inválidos, "
+          f"cache de {cpf.NORMALIZE_CACHE_SIZE} entradas")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Benchmark de concorrência no SQLite: erros "database is locked" e latência
+com os ajustes padrão do sqlite3 (journal DELETE) e com SQLITE_PRAGMAS do app.py
+
+Execute: python benchmarks/db_locks.py [--writers 4] [--readers 8] [--seconds 10]
+
+Simula vários workers do Passenger: escritores atualizam vendas (como o admin)
+e leitores consultam o ranking/estatísticas (como os dashboards)
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+def seed(path, users, wal):
+    conn = sqlite3.connect(path)
+    if wal:
+        # journal_mode é persistente: trocar aqui evita a disputa entre os workers
+        conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE user (id INTEGER PRIMARY KEY, name TEXT, total_sales FLOAT, total_lists INTEGER)')
+    conn.execute('CREATE INDEX ix_user_ranking ON user (total_sales DESC, id)')
+    conn.executemany('INSERT INTO user (name, total_sales, total_lists) VALUES (?, ?, ?)',
+                     ((f'Embaixador {i}', random.uniform(0, 50000), i % 50) for i in range(users)))
+    conn.commit()
+    conn.close()
+
+def connect(path, mode, baseline_timeout):
+    if mode == 'tuned':
+        from app import apply_sqlite_pragmas, SQLITE_PRAGMAS
+        conn = sqlite3.connect(path, timeout=SQLITE_PRAGMAS['busy_timeout'] / 1000)
+        apply_sqlite_pragmas(conn)
+    else:
+        conn = sqlite3.connect(path, timeout=baseline_timeout)
+    return conn
+
+def worker(path, mode, role, seconds, users, baseline_timeout, results):
+    ops = errors = 0
+    latencies = []
+    conn = connect(path, mode, baseline_timeout)
+    deadline = time.monotonic() + seconds
+    
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if role == 'writer':
+                user_id = random.randint(1, users)
+                conn.execute('UPDATE user SET total_sales = ?, total_lists = total_lists + 1 WHERE id = ?',
+                             (random.uniform(0, 50000), user_id))
+                conn.commit()
+            else:
+                conn.execute('SELECT name FROM user ORDER BY total_sales DESC, id LIMIT 3').fetchall()
+                conn.execute('SELECT COUNT(id), SUM(total_sales), SUM(total_lists) FROM user').fetchone()
+            ops += 1
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            errors += 1
+            conn.rollback()
+    
+    conn.close()
+    results.put((role, ops, errors, latencies))
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def run(mode, args):
+    path = os.path.join(tempfile.mkdtemp(prefix='odonto-bench-'), 'users.db')
+    seed(path, args.users, wal=(mode == 'tuned'))
+    
+    results = multiprocessing.Queue()
+    roles = ['writer'] * args.writers + ['reader'] * args.readers
+    processes = [
+        multiprocessing.Process(target=worker, args=(path, mode, role, args.seconds, args.users,
+                                                     args.baseline_timeout, results))
+        for role in roles
+    ]
+    for p in processes:
+        p.start()
+    collected = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    
+    summary = {}
+    for role in ('writer', 'reader'):
+        rows = [r for r in collected if r[0] == role]
+        latencies = [lat for r in rows for lat in r[3]]
+        summary[role] = {
+            'ops': sum(r[1] for r in rows),
+            'errors': sum(r[2] for r in rows),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'max_ms': round(max(latencies, default=0) * 1000, 2)
+        }
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de locks do SQLite')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--baseline-timeout', type=float, default=5.0,
+                        help='timeout do sqlite3 no modo padrão (o padrão do Python é 5s)')
+    args = parser.parse_args()
+    
+    print("=" * 72)
+    print(f"{'modo':<10}{'papel':<8}{'ops':>10}{'ops/s':>10}{'locked':>10}{'p95 (ms)':>12}{'máx (ms)':>12}")
+    print("=" * 72)
+    for mode in ('baseline', 'tuned'):
+        summary = run(mode, args)
+        for role, row in summary.items():
+            print(f"{mode:<10}{role:<8}{row['ops']:>10}{row['ops'] / args.seconds:>10.0f}"
+                  f"{row['errors']:>10}{row['p95_ms']:>12}{row['max_ms']:>12}")
+    print("=" * 72)
+
+if __name__ == '__main__':
+    main()
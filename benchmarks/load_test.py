@@ -0,0 +1,357 @@
+"""
+Teste de carga do app: latência (p50/p95/p99) e vazão por rota conforme a base cresce
+
+Execute: python benchmarks/load_test.py [--sizes 1000,10000,100000] [--requests 200]
+                                        [--concurrency 4] [--driver client|server]
+                                        [--output resultado.json] [--baseline base.json]
+
+Para cada tamanho N, um processo novo cria um SQLite temporário com N embaixadores
+sintéticos (CPFs válidos, mesmo algoritmo de validate_cpf) e dispara as requisições
+pelo test client do Flask ou por um servidor WSGI local (werkzeug). Com --baseline,
+compara o p95 com um resultado anterior e sai com código 1 se alguma rota piorou
+além da tolerância.
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = 'senha-benchmark'
+ADMIN_PASSWORD = 'adminmaster123'
+SEED = 42
+NOISE_FLOOR_MS = 1.0  # diferenças menores que isso não contam como regressão
+
+def make_cpf(number):
+    """CPF válido (somente dígitos) a partir dos 9 primeiros dígitos"""
+    digits = [int(c) for c in f'{number:09d}']
+    for weight in (10, 11):
+        total = sum(d * w for d, w in zip(digits, range(weight, 1, -1)))
+        remainder = total % 11
+        digits.append(0 if remainder < 2 else 11 - remainder)
+    return ''.join(map(str, digits))
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+# ==================== CLIENTES ====================
+
+def parse_body(body, content_type):
+    if 'json' not in (content_type or ''):
+        return None
+    return json.loads(body)
+
+class FlaskClientDriver:
+    """Requisições pelo test client do Flask (sem rede); retorna (status, JSON ou None)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, payload=None):
+        response = self.client.open(path, method=method, json=payload)
+        data = parse_body(response.get_data(), response.content_type)
+        response.close()
+        return response.status_code, data
+
+class HttpDriver:
+    """Requisições HTTP ao servidor WSGI local, com cookies por cliente; retorna (status, JSON ou None)"""
+
+    def __init__(self, base_url):
+        import http.cookiejar
+        import urllib.request
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            NoRedirect()
+        )
+
+    def request(self, method, path, payload=None):
+        import urllib.error
+        import urllib.request
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with self.opener.open(req) as response:
+                return response.status, parse_body(response.read(), response.headers.get('Content-Type'))
+        except urllib.error.HTTPError as e:
+            return e.code, parse_body(e.read(), e.headers.get('Content-Type'))
+
+def NoRedirect():
+    import urllib.request
+
+    class Handler(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None  # mede a rota em si, não a página de destino
+
+    return Handler()
+
+# ==================== BASE SINTÉTICA ====================
+
+def seed(app_module, users):
+    """Cria o esquema e insere N embaixadores (um único hash de senha para todos)"""
+    import logging
+    import migrations
+    from cpf import format_cpf, validate_cpf
+    logging.getLogger('migrations').setLevel(logging.ERROR)
+    migrations.migrate()
+
+    A = app_module
+    rng = random.Random(SEED)
+    password_hash = A.password_hasher.hash(PASSWORD)
+    assert validate_cpf(make_cpf(100000000))
+
+    started = time.perf_counter()
+    with A.app.app_context():
+        batch = []
+        for i in range(users):
+            cents = rng.randint(0, 5000000)
+            batch.append({
+                'name': f'Embaixador {i}',
+                'cpf': format_cpf(make_cpf(100000000 + i)),
+                'password': password_hash,
+                'coupon': f'EMB{i}',
+                'total_sales': cents / 100,
+                'sales_cents': cents,
+                'total_lists': rng.randint(0, 200),
+                'goal': 50000.0
+            })
+            if len(batch) == 5000:
+                A.db.session.execute(A.db.insert(A.User), batch)
+                batch = []
+        if batch:
+            A.db.session.execute(A.db.insert(A.User), batch)
+        A.db.session.commit()
+    return time.perf_counter() - started
+
+# ==================== CENÁRIOS ====================
+
+def scenarios(users):
+    """(nome, papel, função(cliente, rng) -> (status, JSON)) na ordem de execução"""
+    created = []
+    created_lock = threading.Lock()
+    cpf_numbers = itertools.count(200000000)
+
+    def login(client, rng):
+        cpf = make_cpf(100000000 + rng.randrange(users))
+        return client.request('POST', '/login', {'cpf': cpf, 'password': PASSWORD})
+
+    def create_user(client, rng):
+        number = next(cpf_numbers)
+        status, data = client.request('POST', '/admin/api/user', {
+            'name': f'C{number % 10000000} Carga',  # prefixos de cupom distintos entre as threads
+            'cpf': make_cpf(number),
+            'password': PASSWORD
+        })
+        if data and data.get('success'):
+            with created_lock:
+                created.append(data['user']['id'])  # excluídos no cenário DELETE
+        return status, data
+
+    def delete_user(client, rng):
+        with created_lock:
+            if not created:
+                return 404, None
+            user_id = created.pop()
+        return client.request('DELETE', f'/admin/api/user/{user_id}')
+
+    def random_id(rng):
+        return rng.randint(1, users)
+
+    return [
+        ('POST /login', 'anon', login),
+        ('GET /dashboard', 'user', lambda c, r: c.request('GET', '/dashboard')),
+        ('GET /api/user', 'user', lambda c, r: c.request('GET', '/api/user')),
+        ('GET /api/ranking/top3', 'user', lambda c, r: c.request('GET', '/api/ranking/top3')),
+        ('GET /admin/dashboard', 'admin', lambda c, r: c.request('GET', '/admin/dashboard')),
+        ('GET /admin/api/users', 'admin', lambda c, r: c.request('GET', '/admin/api/users')),
+        ('GET /admin/api/users?sort=sales', 'admin',
+         lambda c, r: c.request('GET', '/admin/api/users?sort=sales')),
+        ('GET /admin/api/users?q=', 'admin',
+         lambda c, r: c.request('GET', f'/admin/api/users?q=Embaixador%20{r.randrange(users)}')),
+        ('POST /admin/api/user', 'admin', create_user),
+        ('GET /admin/api/user/<id>', 'admin', lambda c, r: c.request('GET', f'/admin/api/user/{random_id(r)}')),
+        ('PUT /admin/api/user/<id>', 'admin', lambda c, r: c.request(
+            'PUT', f'/admin/api/user/{random_id(r)}',
+            {'total_sales': round(r.uniform(0, 50000), 2), 'total_lists': r.randint(0, 200)})),
+        ('DELETE /admin/api/user/<id>', 'admin', delete_user),
+    ]
+
+def logged_in(driver, role):
+    if role == 'user':
+        driver.request('POST', '/login', {'cpf': make_cpf(100000000), 'password': PASSWORD})
+    elif role == 'admin':
+        driver.request('POST', '/admin/login', {'username': 'admin', 'password': ADMIN_PASSWORD})
+    return driver
+
+def run_scenario(make_driver, role, action, requests, concurrency):
+    """Divide as requisições entre `concurrency` clientes; retorna latências e falhas"""
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0)
+                  for i in range(concurrency)]
+    drivers = [logged_in(make_driver(), role) for _ in range(concurrency)]
+
+    def work(index):
+        rng = random.Random(SEED + index)
+        latencies, errors = [], 0
+        for _ in range(per_worker[index]):
+            started = time.perf_counter()
+            status, _ = action(drivers[index], rng)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(work, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [lat for r in results for lat in r[0]]
+    return {
+        'requests': len(latencies),
+        'errors': sum(r[1] for r in results),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0
+    }
+
+def run_size(users, args, results):
+    """Executado em um processo novo: o app lê a configuração na importação"""
+    workdir = tempfile.mkdtemp(prefix='odonto-load-')
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'users.db'),
+        'SECRET_KEY': 'benchmark',
+        'SESSION_FILE_DIR': os.path.join(workdir, 'sessions'),
+        'RANKING_CACHE_FILE': os.path.join(workdir, '.ranking_version'),
+        'COUPON_CACHE_FILE': os.path.join(workdir, '.coupon_version'),
+        'EVENTS_FILE': os.path.join(workdir, 'events.db'),
+        'LOGIN_RATE_LIMIT_ENABLED': 'false',  # todas as requisições saem do mesmo IP
+        'LOG_LEVEL': 'WARNING'
+    })
+    if args.hash_method:
+        os.environ['PASSWORD_HASH_METHOD'] = args.hash_method
+
+    import app as A
+    seconds = seed(A, users)
+
+    server = None
+    if args.driver == 'server':
+        from werkzeug.serving import make_server, WSGIRequestHandler
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server('127.0.0.1', 0, A.app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        make_driver = lambda: HttpDriver(base_url)
+    else:
+        make_driver = lambda: FlaskClientDriver(A.app)
+
+    routes = {}
+    for name, role, action in scenarios(users):
+        if args.routes and not any(f in name for f in args.routes):
+            continue
+        routes[name] = run_scenario(make_driver, role, action, args.requests, args.concurrency)
+
+    if server:
+        server.shutdown()
+    results.put((users, {'seed_seconds': round(seconds, 2), 'routes': routes}))
+
+# ==================== RELATÓRIO ====================
+
+def compare(current, baseline, tolerance):
+    """Lista de regressões de p95: (N, rota, antes, agora)"""
+    regressions = []
+    for size, data in current['results'].items():
+        base_routes = baseline.get('results', {}).get(size, {}).get('routes', {})
+        for route, row in data['routes'].items():
+            before = base_routes.get(route)
+            if not before:
+                continue
+            if row['p95_ms'] > before['p95_ms'] * (1 + tolerance) and \
+                    row['p95_ms'] - before['p95_ms'] > NOISE_FLOOR_MS:
+                regressions.append((size, route, before['p95_ms'], row['p95_ms']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do app')
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='quantidades de embaixadores, separadas por vírgula')
+    parser.add_argument('--requests', type=int, default=200, help='requisições por rota')
+    parser.add_argument('--concurrency', type=int, default=4, help='clientes simultâneos')
+    parser.add_argument('--driver', choices=('client', 'server'), default='client',
+                        help='test client do Flask ou servidor WSGI local')
+    parser.add_argument('--routes', nargs='*', help='executa só as rotas que contêm estes trechos')
+    parser.add_argument('--hash-method', help='PASSWORD_HASH_METHOD para o teste (ex.: pbkdf2:sha256:1000)')
+    parser.add_argument('--output', help='grava o resultado em JSON')
+    parser.add_argument('--baseline', help='JSON de uma execução anterior para comparar o p95')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='piora aceita no p95 (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'driver': args.driver,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'hash_method': args.hash_method,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'results': {}
+    }
+
+    print("=" * 96)
+    print(f"{'N':>8}  {'rota':<34}{'req':>6}{'erros':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>10}")
+    print("=" * 96)
+    for users in sizes:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run_size, args=(users, args, queue))
+        process.start()
+        size, data = queue.get()
+        process.join()
+        report['results'][str(size)] = data
+        for route, row in data['routes'].items():
+            print(f"{size:>8}  {route:<34}{row['requests']:>6}{row['errors']:>7}"
+                  f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['rps']:>10}")
+        print(f"{'':>8}  (base criada em {data['seed_seconds']} s)")
+    print("=" * 96)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Resultado gravado em {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressões de p95 (tolerância {args.tolerance:.0%}):")
+            for size, route, before, after in regressions:
+                print(f"  N={size} {route}: {before} ms -> {after} ms")
+            return 1
+        print("Sem regressões em relação à linha de base.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
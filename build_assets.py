@@ -0,0 +1,194 @@
+"""
+Gera os arquivos estáticos de produção (CSS/JS de assets/ e imagens de images/)
+Execute após cada deploy (antes de reiniciar os workers):
+
+    python build_assets.py              gera assets/dist e o manifest.json
+    python build_assets.py --clean      remove antes as versões antigas
+
+Cada arquivo é minificado (CSS/JS), recebe o hash do conteúdo no nome
+(ex.: CSS/style.3f2a9c1b.css) e ganha as variantes pré-comprimidas .gz e .br
+(esta última só com o pacote brotli instalado). O manifest.json liga o nome
+original ao gerado; os templates usam asset_url('CSS/style.css').
+Versões anteriores são mantidas por padrão: páginas já abertas continuam
+achando os arquivos que referenciam durante a troca dos workers.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+SOURCES = (
+    # (diretório de origem, prefixo no manifest)
+    (os.path.join(basedir, 'assets', 'CSS'), 'CSS'),
+    (os.path.join(basedir, 'assets', 'JS'), 'JS'),
+    (os.path.join(basedir, 'images'), 'images'),
+)
+DEFAULT_OUTPUT = os.path.join(basedir, 'assets', 'dist')
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt')
+MIN_COMPRESS_SIZE = 512  # bytes: abaixo disso a variante comprimida não compensa
+
+# ==================== MINIFICAÇÃO ====================
+
+def minify_css(text):
+    """Remove comentários e espaços desnecessários (sem reescrever regras)"""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    text = text.replace(';}', '}')
+    return text.strip()
+
+# Depois destes caracteres uma / inicia uma expressão regular, não uma divisão
+_REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^')
+
+def minify_js(text):
+    """
+    Remove comentários, indentação e linhas vazias
+    As quebras de linha são mantidas (inserção automática de ';' do JavaScript),
+    e strings, template strings e expressões regulares são preservadas
+    """
+    out = []
+    i, n = 0, len(text)
+    last = ''  # último caractere significativo emitido
+
+    while i < n:
+        c = text[i]
+        if c in '"\'`':
+            j = i + 1
+            while j < n and text[j] != c:
+                j += 2 if text[j] == '\\' else 1
+            out.append(text[i:j + 1])
+            last = c
+            i = j + 1
+        elif text.startswith('//', i):
+            j = text.find('\n', i)
+            i = n if j == -1 else j
+        elif text.startswith('/*', i):
+            j = text.find('*/', i + 2)
+            i = n if j == -1 else j + 2
+        elif c == '/' and (last in _REGEX_PREFIX or last == '' or
+                           re.search(r'\b(return|typeof|case|in|of)\s*$', ''.join(out[-8:]))):
+            j, in_class = i + 1, False
+            while j < n and text[j] != '\n':
+                if text[j] == '\\':
+                    j += 2
+                    continue
+                if text[j] == '[':
+                    in_class = True
+                elif text[j] == ']':
+                    in_class = False
+                elif text[j] == '/' and not in_class:
+                    break
+                j += 1
+            m = re.match(r'[a-z]*', text[j + 1:])
+            end = j + 1 + m.end()
+            out.append(text[i:end])
+            last = '/'
+            i = end
+        else:
+            out.append(c)
+            if not c.isspace():
+                last = c
+            i += 1
+
+    lines = (line.strip() for line in ''.join(out).splitlines())
+    return '\n'.join(line for line in lines if line) + '\n'
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+# ==================== GERAÇÃO ====================
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:8]
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, path)
+
+def build_file(source, logical_name, output_dir, minify=True):
+    """Gera a versão com hash e as variantes comprimidas; retorna (nome gerado, tamanhos)"""
+    with open(source, 'rb') as f:
+        data = f.read()
+
+    root, ext = os.path.splitext(logical_name)
+    minifier = MINIFIERS.get(ext.lower()) if minify else None
+    if minifier:
+        data = minifier(data.decode('utf-8')).encode('utf-8')
+
+    built_name = f'{root}.{fingerprint(data)}{ext}'
+    built_path = os.path.join(output_dir, built_name)
+    sizes = {'original': os.path.getsize(source), 'built': len(data)}
+
+    write_file(built_path, data)
+    if ext.lower() in COMPRESSIBLE and len(data) >= MIN_COMPRESS_SIZE:
+        # mtime=0: o .gz tem o mesmo conteúdo a cada build
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        write_file(built_path + '.gz', gz)
+        sizes['gzip'] = len(gz)
+        if brotli is not None:
+            br = brotli.compress(data, quality=11)
+            write_file(built_path + '.br', br)
+            sizes['br'] = len(br)
+    return built_name, sizes
+
+def build(output_dir=DEFAULT_OUTPUT, minify=True, clean=False):
+    """Gera todos os arquivos e grava o manifest; retorna {nome original: (gerado, tamanhos)}"""
+    if clean and os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+
+    results = {}
+    for source_dir, prefix in SOURCES:
+        for dirpath, _, filenames in os.walk(source_dir):
+            if os.path.abspath(dirpath).startswith(os.path.abspath(output_dir)):
+                continue
+            for name in sorted(filenames):
+                source = os.path.join(dirpath, name)
+                relative = os.path.relpath(source, source_dir).replace(os.sep, '/')
+                logical_name = f'{prefix}/{relative}'
+                results[logical_name] = build_file(source, logical_name, output_dir, minify)
+
+    manifest = {name: built for name, (built, _) in sorted(results.items())}
+    write_file(os.path.join(output_dir, MANIFEST_NAME),
+               json.dumps(manifest, indent=2).encode('utf-8'))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera os arquivos estáticos com hash e pré-comprimidos')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Diretório de saída (padrão: assets/dist)')
+    parser.add_argument('--no-minify', action='store_true', help='Não minifica CSS/JS')
+    parser.add_argument('--clean', action='store_true', help='Remove as versões geradas anteriormente')
+    args = parser.parse_args()
+
+    results = build(args.output, minify=not args.no_minify, clean=args.clean)
+
+    print("=" * 60)
+    print("Arquivos Estáticos")
+    print("=" * 60)
+    for name, (built, sizes) in sorted(results.items()):
+        compressed = ' '.join(f"{kind}={sizes[kind]}" for kind in ('gzip', 'br') if kind in sizes)
+        print(f"{name:<28} {sizes['original']:>7} -> {sizes['built']:>7}  {compressed}")
+        print(f"  {built}")
+    print("=" * 60)
+    if brotli is None:
+        print("Aviso: pacote brotli não instalado; apenas variantes .gz geradas.")
+    print(f"✅ {len(results)} arquivo(s) gerados em {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
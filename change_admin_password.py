@@ -3,8 +3,7 @@ Script para alterar a senha do administrador
 Execute: python change_admin_password.py
 """
 
-from app import app, db, Admin
-from werkzeug.security import generate_password_hash
+from app import app, db, Admin, password_hasher
 import getpass
 
 def change_admin_password():
@@ -38,7 +37,7 @@ def change_admin_password():
             return
         
         # Atualizar senha
-        admin.password = generate_password_hash(new_password)
+        admin.password = password_hasher.hash(new_password)
         db.session.commit()
         
         print("=" * 60)
@@ -0,0 +1,144 @@
+"""
+Validação e formatação de CPF
+validate_cpf/format_cpf tratam um valor por vez; normalize_cpf (usado pelas
+rotas) guarda em cache os resultados recentes. normalize_cpfs trata listas
+inteiras de uma vez (importações, cadastros em lote, conciliações): com NumPy
+os dígitos verificadores são calculados em vetores, sem ele em Python puro.
+O NumPy só é importado no primeiro lote grande: a subida dos workers não paga por ele.
+"""
+
+import re
+from functools import lru_cache
+from operator import mul
+
+_NON_DIGITS = re.compile(r'[^0-9]')
+FIRST_WEIGHTS = tuple(range(10, 1, -1))
+SECOND_WEIGHTS = tuple(range(11, 2, -1))  # o 10º dígito (1º verificador) tem peso 2
+# Os dígitos são somados como bytes ASCII ('0' = 48): desconta-se 48 * soma dos pesos
+FIRST_OFFSET = 48 * sum(FIRST_WEIGHTS)
+SECOND_OFFSET = 48 * sum(SECOND_WEIGHTS)
+NUMPY_MIN_BATCH = 256  # abaixo disso a conversão para arrays não compensa
+NORMALIZE_CACHE_SIZE = 4096
+
+_numpy = None  # False = não instalado
+
+def load_numpy():
+    """Módulo numpy (importado na primeira chamada) ou None se não estiver instalado"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+def cpf_digits(value):
+    """Apenas os dígitos do valor ('123.456.789-09' -> '12345678909')"""
+    if value is None:
+        return ''
+    text = str(value)
+    if text.isascii() and text.isdigit():
+        return text
+    return _NON_DIGITS.sub('', text)
+
+def _check_digit(total):
+    remainder = total % 11
+    return 0 if remainder < 2 else 11 - remainder
+
+def _valid_digits(cpf):
+    """cpf: apenas dígitos"""
+    if len(cpf) != 11 or cpf == cpf[0] * 11:
+        return False
+    digits = cpf.encode('ascii')
+    first = _check_digit(sum(map(mul, digits, FIRST_WEIGHTS)) - FIRST_OFFSET)
+    if digits[9] - 48 != first:
+        return False
+    second = _check_digit(sum(map(mul, digits, SECOND_WEIGHTS)) - SECOND_OFFSET + first * 2)
+    return digits[10] - 48 == second
+
+def _format_digits(cpf):
+    return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
+
+def validate_cpf(cpf):
+    """
+    Valida CPF brasileiro
+    Remove formatação e verifica se é válido
+    """
+    return _valid_digits(cpf_digits(cpf))
+
+def format_cpf(cpf):
+    """
+    Formata CPF removendo caracteres não numéricos e adicionando formatação
+    """
+    cpf = cpf_digits(cpf)
+    if len(cpf) == 11:
+        return _format_digits(cpf)
+    return cpf
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize_text(text):
+    cpf = cpf_digits(text)
+    return _format_digits(cpf) if _valid_digits(cpf) else None
+
+def normalize_cpf(value):
+    """CPF formatado (000.000.000-00) se válido, senão None"""
+    if value is None:
+        return None
+    return _normalize_text(str(value))
+
+# ==================== LOTES ====================
+
+def _normalize_python(digits):
+    return [_format_digits(cpf) if _valid_digits(cpf) else None for cpf in digits]
+
+def _normalize_numpy(digits):
+    numpy = load_numpy()
+    result = [None] * len(digits)
+    positions = [i for i, cpf in enumerate(digits) if len(cpf) == 11]
+    if not positions:
+        return result
+
+    # Uma linha de 11 bytes ASCII por CPF
+    raw = numpy.frombuffer(''.join(digits[i] for i in positions).encode('ascii'),
+                           dtype=numpy.uint8).reshape(-1, 11)
+    values = raw.astype(numpy.int32) - 48
+
+    first = values[:, :9] @ numpy.array(FIRST_WEIGHTS, dtype=numpy.int32) % 11
+    first = numpy.where(first < 2, 0, 11 - first)
+    second = (values[:, :9] @ numpy.array(SECOND_WEIGHTS, dtype=numpy.int32) + first * 2) % 11
+    second = numpy.where(second < 2, 0, 11 - second)
+    valid = ((values[:, 9] == first) & (values[:, 10] == second)
+             & ~(values == values[:, :1]).all(axis=1))
+
+    # 000.000.000-00 montado direto nos bytes
+    formatted = numpy.empty((len(positions), 14), dtype=numpy.uint8)
+    formatted[:, 0:3] = raw[:, 0:3]
+    formatted[:, 4:7] = raw[:, 3:6]
+    formatted[:, 8:11] = raw[:, 6:9]
+    formatted[:, 12:14] = raw[:, 9:11]
+    formatted[:, 3] = formatted[:, 7] = ord('.')
+    formatted[:, 11] = ord('-')
+    text = formatted.tobytes().decode('ascii')
+
+    for k in numpy.flatnonzero(valid).tolist():
+        result[positions[k]] = text[k * 14:k * 14 + 14]
+    return result
+
+def normalize_cpfs(values, use_numpy=None):
+    """
+    Lista com o CPF formatado de cada valor (None para os inválidos), na mesma ordem
+    use_numpy: None escolhe pelo tamanho do lote (e se o NumPy está instalado)
+    """
+    digits = [cpf_digits(value) for value in values]
+    if use_numpy is None:
+        use_numpy = len(digits) >= NUMPY_MIN_BATCH and load_numpy() is not None
+    if use_numpy:
+        if load_numpy() is None:
+            raise RuntimeError('NumPy não está instalado')
+        return _normalize_numpy(digits)
+    return _normalize_python(digits)
+
+def validate_cpfs(values, use_numpy=None):
+    """Lista de bool indicando os CPFs válidos"""
+    return [cpf is not None for cpf in normalize_cpfs(values, use_numpy)]
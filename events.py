@@ -0,0 +1,194 @@
+"""
+Eventos em tempo real (Server-Sent Events)
+As rotas de escrita publicam o nome do canal alterado ('ranking', 'stats',
+'user:5'...); cada conexão SSE assina alguns canais e recebe apenas o aviso,
+montando os dados na hora a partir dos caches. Avisos repetidos são
+agrupados, a fila de cada cliente é limitada e, se ela encher, o cliente
+recebe uma atualização completa em vez dos avisos perdidos.
+Com o log em SQLite, os avisos publicados em um worker chegam aos demais.
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class TooManySubscribers(Exception):
+    """Limite de conexões SSE do processo atingido"""
+
+class Subscription:
+    """Fila limitada de avisos de um cliente"""
+
+    def __init__(self, broker, channels, queue_size):
+        self.broker = broker
+        self.channels = frozenset(channels)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._overflow = False
+
+    def put(self, channel):
+        try:
+            self._queue.put_nowait(channel)
+        except queue.Full:
+            self._overflow = True  # cliente lento: recebe tudo de novo quando alcançar
+
+    def wait(self, timeout):
+        """Canais alterados desde a última chamada (agrupados) ou set() após o timeout"""
+        try:
+            changed = {self._queue.get(timeout=timeout)}
+        except queue.Empty:
+            return set()
+        while True:
+            try:
+                changed.add(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if self._overflow:
+            self._overflow = False
+            return set(self.channels)
+        return changed
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class SQLiteEventLog:
+    """Avisos em um arquivo SQLite lido por todos os workers (mantidos por 'retention' segundos)"""
+
+    def __init__(self, path, retention=60):
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS event ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def append(self, channels):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT INTO event (channel, created_at) VALUES (?, ?)',
+                             [(channel, now) for channel in channels])
+            self._writes += 1
+            if self._writes % 100 == 0:
+                conn.execute('DELETE FROM event WHERE created_at < ?', (now - self.retention,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def last_id(self):
+        return self._connection().execute('SELECT COALESCE(MAX(id), 0) FROM event').fetchone()[0]
+
+    def read_after(self, last_id):
+        return self._connection().execute(
+            'SELECT id, channel FROM event WHERE id > ? ORDER BY id', (last_id,)
+        ).fetchall()
+
+class EventBroker:
+    """
+    Publicação/assinatura de avisos por canal
+    log: SQLiteEventLog para distribuir entre workers (None = apenas este processo)
+    poll_interval: segundos entre leituras do log (só enquanto houver assinantes)
+    """
+
+    def __init__(self, log=None, poll_interval=0.25, queue_size=32, max_subscribers=50):
+        self.log = log
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._has_subscribers = threading.Event()
+        self._poller = None
+        self.stats = {'published': 0, 'delivered': 0, 'overflows': 0, 'rejected': 0}
+
+    def subscribe(self, channels):
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                self.stats['rejected'] += 1
+                raise TooManySubscribers()
+            subscription = Subscription(self, channels, self.queue_size)
+            self._subscribers.add(subscription)
+            self._has_subscribers.set()
+            if self.log is not None and self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, name='event-poller', daemon=True)
+                self._poller.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            if not self._subscribers:
+                self._has_subscribers.clear()
+
+    def publish(self, *channels):
+        """Avisa os assinantes dos canais (de todos os workers, com o log em SQLite)"""
+        if not channels:
+            return
+        self.stats['published'] += len(channels)
+        if self.log is None:
+            self._dispatch(channels)
+            return
+        try:
+            self.log.append(channels)
+        except Exception:
+            # Os avisos são uma otimização: a escrita que os gerou já foi gravada
+            logger.exception('Falha ao publicar eventos')
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _dispatch(self, channels):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            for channel in channels:
+                if channel in subscription.channels:
+                    overflowed = subscription._overflow
+                    subscription.put(channel)
+                    self.stats['delivered'] += 1
+                    if subscription._overflow and not overflowed:
+                        self.stats['overflows'] += 1
+
+    def _poll_loop(self):
+        last_id = None
+        while True:
+            if not self._has_subscribers.is_set():
+                # Sem assinantes não há o que entregar; quem conectar recebe o estado atual
+                self._has_subscribers.wait()
+                last_id = None
+            try:
+                if last_id is None:
+                    last_id = self.log.last_id()
+                rows = self.log.read_after(last_id)
+                if rows:
+                    last_id = rows[-1][0]
+                    self._dispatch([channel for _, channel in rows])
+            except Exception:
+                logger.exception('Falha ao ler eventos')
+            time.sleep(self.poll_interval)
+
+def format_sse(event, data, event_id=None):
+    """Mensagem no formato text/event-stream (data já serializado em JSON)"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.extend(f'data: {line}' for line in data.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,72 @@
+"""
+Script para exportar os embaixadores (CSV ou NDJSON) sem carregar a tabela em memória
+Execute: python export_users.py [--output embaixadores.csv] [--format csv|ndjson]
+                                [--columns name,cpf,...] [--goal-reached | --goal-not-reached]
+                                [--min-sales 1000] [--search termo] [--sort ranking|id] [--delimiter ';']
+
+Colunas: position, id, name, cpf, coupon, total_sales, total_lists, goal, progress
+Sem --output, o arquivo é escrito na saída padrão
+"""
+
+import argparse
+import sys
+import time
+
+from app import app, parse_export_options, generate_export, EXPORT_COLUMNS, EXPORT_FORMATS, EXPORT_SORTS
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporta os embaixadores em CSV ou NDJSON')
+    parser.add_argument('--output', help='Arquivo de saída (padrão: saída padrão)')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--columns', help=f'Colunas separadas por vírgula ({",".join(EXPORT_COLUMNS)})')
+    goal = parser.add_mutually_exclusive_group()
+    goal.add_argument('--goal-reached', dest='goal_reached', action='store_const', const='true',
+                      help='Apenas quem atingiu a meta')
+    goal.add_argument('--goal-not-reached', dest='goal_reached', action='store_const', const='false',
+                      help='Apenas quem ainda não atingiu a meta')
+    parser.add_argument('--min-sales', help='Vendas mínimas em reais')
+    parser.add_argument('--search', help='Nome, CPF ou cupom contendo o termo')
+    parser.add_argument('--sort', choices=list(EXPORT_SORTS), default='ranking')
+    parser.add_argument('--delimiter', choices=[',', ';'], default=',', help='Separador do CSV')
+    args = parser.parse_args()
+
+    try:
+        options = parse_export_options({
+            'format': args.format,
+            'columns': args.columns,
+            'q': args.search,
+            'goal_reached': args.goal_reached,
+            'min_sales': args.min_sales,
+            'sort': args.sort,
+            'delimiter': args.delimiter
+        })
+    except ValueError as e:
+        print(f"ERRO: {str(e)}", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    stats = {}
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        with app.app_context():
+            for chunk in generate_export(options, stats):
+                out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    elapsed = time.perf_counter() - started
+
+    # O resumo vai para stderr: a saída padrão pode ser o próprio arquivo
+    print("=" * 60, file=sys.stderr)
+    print("Exportação de Embaixadores", file=sys.stderr)
+    print("=" * 60, file=sys.stderr)
+    print(f"Linhas exportadas: {stats['rows']}", file=sys.stderr)
+    print(f"Colunas: {', '.join(options['columns'])}", file=sys.stderr)
+    print(f"Tempo: {elapsed:.3f}s", file=sys.stderr)
+    print("=" * 60, file=sys.stderr)
+    if args.output:
+        print(f"✅ Arquivo gravado em {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
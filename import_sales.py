@@ -0,0 +1,55 @@
+"""
+Script para importar vendas dos embaixadores em lote (CSV ou XLSX)
+Execute: python import_sales.py vendas.csv [--key coupon|cpf] [--dry-run]
+
+Colunas aceitas: cupom (coupon) ou cpf, vendas (total_sales),
+listas (total_lists) e meta (goal)
+"""
+
+import argparse
+import csv
+import sys
+
+from app import app, read_import_file, import_sales
+
+def main():
+    parser = argparse.ArgumentParser(description='Importa vendas dos embaixadores em lote')
+    parser.add_argument('arquivo', help='Planilha .csv ou .xlsx')
+    parser.add_argument('--key', choices=['coupon', 'cpf'], help='Coluna usada para identificar o embaixador')
+    parser.add_argument('--dry-run', action='store_true', help='Apenas valida a planilha, sem gravar')
+    args = parser.parse_args()
+    
+    with app.app_context(), open(args.arquivo, 'rb') as f:
+        try:
+            fields, rows = read_import_file(f, args.arquivo)
+            report = import_sales(fields, rows, args.key, args.dry_run)
+        except (ValueError, csv.Error) as e:
+            print(f"ERRO: Planilha inválida: {str(e)}")
+            return 1
+    
+    print("=" * 60)
+    print("Importação de Vendas")
+    print("=" * 60)
+    print(f"Linhas processadas: {report['processed']}")
+    suffix = ' (simulação)' if report['dry_run'] else ''
+    print(f"Embaixadores atualizados: {report['updated']}{suffix}")
+    print(f"Erros: {report['error_count']}")
+    print(f"Tempo: {report['elapsed_seconds']}s ({report['rows_per_second']} linhas/s)")
+    print("=" * 60)
+    
+    for error in report['errors']:
+        print(f"Linha {error['line']}: {error['message']}")
+    if report['error_count'] > len(report['errors']):
+        print(f"... e mais {report['error_count'] - len(report['errors'])} erro(s)")
+    
+    if not report['success']:
+        print("❌ Nenhuma alteração aplicada: corrija os erros da planilha.")
+        return 1
+    if report['dry_run']:
+        print("✅ Planilha válida (nada foi gravado: --dry-run).")
+    else:
+        print("✅ Vendas importadas com sucesso!")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Métricas da aplicação no formato texto do Prometheus
+Latência por rota (histograma), consultas ao banco por requisição, tempo de hash
+de senha e suspeitas de N+1. Os valores são por processo: com vários workers
+do Passenger, cada coleta mostra os números do worker que a atendeu.
+"""
+
+import bisect
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+class Histogram:
+    """Histograma cumulativo com limites fixos (le)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for le, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{_labels(labels, le=le)} {cumulative}'
+        yield f'{name}_sum{_labels(labels)} {self.sum:.6f}'
+        yield f'{name}_count{_labels(labels)} {self.count}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+class MetricsRegistry:
+    """Contadores e histogramas das requisições, do banco e do hash de senhas"""
+
+    def __init__(self, n_plus_one_threshold=10):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self._latency = {}        # (endpoint, method) -> Histogram
+        self._queries = {}        # endpoint -> Histogram (consultas por requisição)
+        self._requests = {}       # (endpoint, method, status) -> total
+        self._db_seconds = {}     # endpoint -> segundos no banco
+        self._n_plus_one = {}     # endpoint -> requisições com suspeita de N+1
+        self._hashing = {}        # operação -> Histogram
+
+    def observe_request(self, endpoint, method, status, seconds, queries, query_seconds):
+        with self._lock:
+            key = (endpoint, method)
+            if key not in self._latency:
+                self._latency[key] = Histogram(LATENCY_BUCKETS)
+            self._latency[key].observe(seconds)
+            if endpoint not in self._queries:
+                self._queries[endpoint] = Histogram(QUERY_COUNT_BUCKETS)
+            self._queries[endpoint].observe(queries)
+
+            status_key = (endpoint, method, status)
+            self._requests[status_key] = self._requests.get(status_key, 0) + 1
+            self._db_seconds[endpoint] = self._db_seconds.get(endpoint, 0.0) + query_seconds
+
+    def repeated_statements(self, statements):
+        """
+        Consultas repetidas na mesma requisição (statements: sql -> [vezes, segundos])
+        Retorna [(sql, vezes)] acima do limite de N+1
+        """
+        return [(sql, stat[0]) for sql, stat in statements.items() if stat[0] >= self.n_plus_one_threshold]
+
+    def observe_n_plus_one(self, endpoint):
+        with self._lock:
+            self._n_plus_one[endpoint] = self._n_plus_one.get(endpoint, 0) + 1
+
+    def observe_password_hash(self, operation, seconds):
+        with self._lock:
+            if operation not in self._hashing:
+                self._hashing[operation] = Histogram(LATENCY_BUCKETS)
+            self._hashing[operation].observe(seconds)
+
+    def render(self, gauges=()):
+        """
+        Texto no formato de exposição do Prometheus
+        gauges: (nome, ajuda, {rótulos(tupla de pares): valor}) calculados na hora da coleta
+        """
+        with self._lock:
+            out = []
+
+            def family(name, kind, help_text):
+                out.append(f'# HELP {name} {help_text}')
+                out.append(f'# TYPE {name} {kind}')
+
+            family('http_requests_total', 'counter', 'Requisições atendidas por rota, método e status')
+            for (endpoint, method, status), total in sorted(self._requests.items()):
+                out.append(f'http_requests_total{_labels([("endpoint", endpoint), ("method", method), ("status", status)])} {total}')
+
+            family('http_request_duration_seconds', 'histogram', 'Tempo de resposta por rota')
+            for (endpoint, method), histogram in sorted(self._latency.items()):
+                out.extend(histogram.lines('http_request_duration_seconds', [('endpoint', endpoint), ('method', method)]))
+
+            family('db_queries_per_request', 'histogram', 'Consultas SQL por requisição')
+            for endpoint, histogram in sorted(self._queries.items()):
+                out.extend(histogram.lines('db_queries_per_request', [('endpoint', endpoint)]))
+
+            family('db_query_seconds_total', 'counter', 'Tempo total gasto no banco por rota')
+            for endpoint, seconds in sorted(self._db_seconds.items()):
+                out.append(f'db_query_seconds_total{_labels([("endpoint", endpoint)])} {seconds:.6f}')
+
+            family('db_n_plus_one_total', 'counter', 'Requisições com a mesma consulta repetida (suspeita de N+1)')
+            for endpoint, total in sorted(self._n_plus_one.items()):
+                out.append(f'db_n_plus_one_total{_labels([("endpoint", endpoint)])} {total}')
+
+            family('password_hash_duration_seconds', 'histogram', 'Tempo de geração/conferência de hash de senha')
+            for operation, histogram in sorted(self._hashing.items()):
+                out.extend(histogram.lines('password_hash_duration_seconds', [('operation', operation)]))
+
+        for name, help_text, values in gauges:
+            family(name, 'gauge', help_text)
+            for labels, value in values.items():
+                out.append(f'{name}{_labels(labels)} {value}')
+
+        return '\n'.join(out) + '\n'
@@ -0,0 +1,303 @@
+"""
+Migrações versionadas do banco de dados
+Execute após cada deploy (e antes de reiniciar os workers):
+
+    python migrations.py            aplica as migrações pendentes e prepara o deploy
+                                    (SECRET_KEY, bytecode dos módulos e templates)
+    python migrations.py --status   mostra as migrações aplicadas e pendentes
+
+As versões aplicadas ficam na tabela schema_version. Cada migração deve ser
+idempotente: no SQLite o DDL não é transacional pelo driver sqlite3, então uma
+migração interrompida precisa poder ser executada de novo com segurança.
+"""
+
+import argparse
+import logging
+import sys
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from app import (app, db, User, Admin, SalesEvent, SalesBucket, SessionRecord,
+                 ChangeCounter, UserTombstone, ranking_index, ranking_cache, password_hasher,
+                 prepare_deployment)
+
+logger = logging.getLogger('migrations')
+
+schema_version = sa.Table(
+    'schema_version', sa.MetaData(),
+    sa.Column('version', sa.Integer, primary_key=True),
+    sa.Column('description', sa.String(200), nullable=False),
+    sa.Column('applied_at', sa.DateTime, nullable=False)
+)
+
+MIGRATIONS = []
+
+def migration(version, description):
+    """Registra uma função de migração: recebe a conexão (transação aberta)"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+# ==================== MIGRAÇÕES ====================
+
+def add_column_if_missing(conn, table_name, column_name, column_ddl):
+    """Adiciona a coluna se ela ainda não existir (ALTER TABLE ... ADD COLUMN)"""
+    columns = [col['name'] for col in sa.inspect(conn).get_columns(table_name)]
+    if column_name in columns:
+        return False
+    table = conn.dialect.identifier_preparer.quote(table_name)
+    conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {column_name} {column_ddl}')
+    return True
+
+def _legacy_email_to_cpf(conn):
+    """
+    Migra a coluna email para cpf na tabela user (bancos SQLite antigos)
+    """
+    inspector = sa.inspect(conn)
+    if 'user' not in inspector.get_table_names():
+        return  # Tabela não existe ainda
+
+    columns = [col['name'] for col in inspector.get_columns('user')]
+
+    # Se já tem cpf e não tem email, já está migrado
+    # Se não tem email e não tem cpf, não precisa migrar
+    if 'email' not in columns:
+        return
+
+    # Recriar a tabela sem a coluna email
+    conn.exec_driver_sql('DROP TABLE IF EXISTS user_new')
+    conn.exec_driver_sql('''
+        CREATE TABLE user_new (
+            id INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            cpf VARCHAR(14) NOT NULL UNIQUE,
+            password VARCHAR(200) NOT NULL,
+            coupon VARCHAR(50) NOT NULL UNIQUE,
+            total_sales FLOAT,
+            total_lists INTEGER,
+            goal FLOAT
+        )
+    ''')
+
+    if 'cpf' in columns:
+        # Copiar apenas usuários com CPF válido (não o padrão)
+        conn.exec_driver_sql('''
+            INSERT INTO user_new (id, name, cpf, password, coupon, total_sales, total_lists, goal)
+            SELECT id, name, cpf, password, coupon, total_sales, total_lists, goal
+            FROM user
+            WHERE cpf IS NOT NULL AND cpf != '000.000.000-00'
+        ''')
+    else:
+        # Não há como converter email para CPF: o admin precisará recriar os usuários
+        logger.warning('Usuários existentes serão removidos pois não há como converter email para CPF. '
+                       'O administrador precisará recriar os usuários com CPF.')
+
+    conn.exec_driver_sql('DROP TABLE user')
+    conn.exec_driver_sql('ALTER TABLE user_new RENAME TO user')
+    logger.info('Migração de email para cpf concluída com sucesso!')
+
+@migration(1, 'Esquema inicial (user e admin)')
+def create_initial_schema(conn):
+    if conn.dialect.name == 'sqlite':
+        _legacy_email_to_cpf(conn)
+    db.metadata.create_all(conn, tables=[User.__table__, Admin.__table__])
+
+@migration(2, 'Índice do ranking em user (total_sales DESC, id)')
+def add_ranking_index(conn):
+    ranking_index.create(conn, checkfirst=True)
+
+@migration(3, 'Administrador padrão')
+def create_default_admin(conn):
+    admin_table = Admin.__table__
+    exists = conn.execute(
+        sa.select(admin_table.c.id).where(admin_table.c.username == 'admin')
+    ).first()
+    if exists:
+        return
+
+    conn.execute(admin_table.insert().values(
+        username='admin',
+        email='admin@odontomaster.com',
+        password=password_hasher.hash('adminmaster123'),
+        name='Administrador',
+        created_at=datetime.utcnow()
+    ))
+    logger.warning('Admin padrão criado: admin / adminmaster123 (altere a senha)')
+
+@migration(4, 'Livro de vendas: user.sales_cents, sales_event e sales_bucket')
+def create_sales_ledger(conn):
+    user_table = User.__table__
+    if add_column_if_missing(conn, 'user', 'sales_cents', 'BIGINT NOT NULL DEFAULT 0'):
+        conn.execute(user_table.update().values(
+            sales_cents=sa.cast(sa.func.round(sa.func.coalesce(user_table.c.total_sales, 0) * 100), sa.BigInteger)
+        ))
+    
+    db.metadata.create_all(conn, tables=[SalesEvent.__table__, SalesBucket.__table__])
+    
+    # Saldo de abertura: a soma dos eventos de cada embaixador confere com o total.
+    # Não entra nos buckets, pois as vendas anteriores não têm data conhecida
+    event_table = SalesEvent.__table__
+    has_events = sa.select(event_table.c.id).where(event_table.c.user_id == user_table.c.id).exists()
+    conn.execute(event_table.insert().from_select(
+        ['user_id', 'sales_cents', 'lists', 'source', 'note', 'created_at'],
+        sa.select(
+            user_table.c.id,
+            user_table.c.sales_cents,
+            sa.func.coalesce(user_table.c.total_lists, 0),
+            sa.literal('opening'),
+            sa.literal('Saldo anterior ao livro de vendas'),
+            sa.literal(datetime.now())
+        ).where(
+            sa.or_(user_table.c.sales_cents != 0, sa.func.coalesce(user_table.c.total_lists, 0) != 0),
+            ~has_events
+        )
+    ))
+
+@migration(5, 'Sessões no servidor (server_session)')
+def create_server_session(conn):
+    db.metadata.create_all(conn, tables=[SessionRecord.__table__])
+
+@migration(6, 'Versão das linhas de user (version, updated_at) para ETag/Last-Modified')
+def add_user_row_version(conn):
+    user_table = User.__table__
+    add_column_if_missing(conn, 'user', 'version', 'INTEGER NOT NULL DEFAULT 1')
+    if add_column_if_missing(conn, 'user', 'updated_at', 'TIMESTAMP'):
+        conn.execute(user_table.update().values(updated_at=datetime.utcnow()))
+
+@migration(7, 'Sincronização incremental: user.change_seq, change_counter e user_tombstone')
+def create_change_tracking(conn):
+    add_column_if_missing(conn, 'user', 'change_seq', 'BIGINT NOT NULL DEFAULT 0')
+    for index in User.__table__.indexes:
+        if index.name == 'ix_user_change_seq':
+            index.create(conn, checkfirst=True)
+    db.metadata.create_all(conn, tables=[ChangeCounter.__table__, UserTombstone.__table__])
+    
+    counter_table = ChangeCounter.__table__
+    exists = conn.execute(
+        sa.select(counter_table.c.name).where(counter_table.c.name == 'user')
+    ).first()
+    if not exists:
+        conn.execute(counter_table.insert().values(name='user', value=0))
+
+@migration(8, 'user.total_sales nulo (bancos antigos) preenchido a partir de sales_cents')
+def fill_null_total_sales(conn):
+    # A migração 4 calculou sales_cents com coalesce(total_sales, 0), mas manteve os nulos:
+    # a paginação por vendas (keyset em total_sales, id) não atravessa essas linhas
+    user_table = User.__table__
+    conn.execute(user_table.update().where(user_table.c.total_sales.is_(None)).values(
+        total_sales=user_table.c.sales_cents / 100.0
+    ))
+
+@migration(9, 'user.total_sales NOT NULL com padrão 0 (ordenação do ranking e da paginação)')
+def require_total_sales(conn):
+    # Linhas gravadas fora do ORM não voltam a ter total_sales nulo
+    fill_null_total_sales(conn)
+    
+    if conn.dialect.name != 'sqlite':
+        table = conn.dialect.identifier_preparer.quote('user')
+        conn.exec_driver_sql(f'ALTER TABLE {table} ALTER COLUMN total_sales SET DEFAULT 0')
+        conn.exec_driver_sql(f'ALTER TABLE {table} ALTER COLUMN total_sales SET NOT NULL')
+        return
+    
+    columns = {col['name']: col for col in sa.inspect(conn).get_columns('user')}
+    if not columns['total_sales']['nullable']:
+        return  # Banco criado com o esquema atual
+    
+    # O SQLite não altera colunas: recria a tabela com o mesmo conteúdo
+    conn.exec_driver_sql('DROP TABLE IF EXISTS user_new')
+    conn.exec_driver_sql('''
+        CREATE TABLE user_new (
+            id INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            cpf VARCHAR(14) NOT NULL UNIQUE,
+            password VARCHAR(200) NOT NULL,
+            coupon VARCHAR(50) NOT NULL UNIQUE,
+            total_sales FLOAT NOT NULL DEFAULT 0,
+            total_lists INTEGER,
+            goal FLOAT,
+            sales_cents BIGINT NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 1,
+            updated_at DATETIME,
+            change_seq BIGINT NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.exec_driver_sql('''
+        INSERT INTO user_new (id, name, cpf, password, coupon, total_sales, total_lists, goal,
+                              sales_cents, version, updated_at, change_seq)
+        SELECT id, name, cpf, password, coupon, total_sales, total_lists, goal,
+               sales_cents, version, updated_at, change_seq
+        FROM user
+    ''')
+    conn.exec_driver_sql('DROP TABLE user')
+    conn.exec_driver_sql('ALTER TABLE user_new RENAME TO user')
+    for index in User.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+# ==================== EXECUÇÃO ====================
+
+def applied_versions(conn):
+    schema_version.create(conn, checkfirst=True)
+    return set(conn.execute(sa.select(schema_version.c.version)).scalars())
+
+def migrate():
+    """Aplica as migrações pendentes em ordem; retorna as versões aplicadas"""
+    applied = []
+    with app.app_context():
+        engine = db.engine
+        with engine.begin() as conn:
+            done = applied_versions(conn)
+
+        for version, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if version in done:
+                continue
+            # Cada migração e seu registro em schema_version na mesma transação
+            with engine.begin() as conn:
+                func(conn)
+                conn.execute(schema_version.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow()
+                ))
+            applied.append(version)
+            logger.info('Migração %04d aplicada: %s', version, description)
+
+    if not applied:
+        logger.info('Banco de dados já está atualizado.')
+    else:
+        # Dados alterados fora das rotas: caches e ETags dos workers deixam de valer
+        ranking_cache.invalidate()
+    return applied
+
+def status():
+    with app.app_context():
+        with db.engine.begin() as conn:
+            done = applied_versions(conn)
+
+    print("=" * 60)
+    print("Migrações do banco de dados")
+    print("=" * 60)
+    for version, description, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+        state = 'aplicada' if version in done else 'PENDENTE'
+        print(f"{version:04d}  {state:<9} {description}")
+    print("=" * 60)
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrações do banco de dados')
+    parser.add_argument('--status', action='store_true', help='Apenas lista as migrações')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.status:
+        status()
+    else:
+        migrate()
+        # Feito aqui uma vez, em vez de em cada worker novo
+        prepared = prepare_deployment()
+        logger.info('Deploy preparado: SECRET_KEY %s, %d módulos e %d templates compilados.',
+                    prepared['secret_key'], prepared['modules'], prepared['templates'])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Script para cadastrar embaixadores em lote a partir de uma planilha (CSV ou XLSX)
+Execute: python onboard_users.py embaixadores.csv [--output cupons.csv] [--processes N] [--dry-run]
+
+Colunas obrigatórias: nome (name), cpf e senha (password)
+"""
+
+import argparse
+import csv
+import sys
+
+from app import app, read_import_file, onboard_users, csv_safe, ONBOARD_COLUMNS, ONBOARD_HASH_PROCESSES
+
+def main():
+    parser = argparse.ArgumentParser(description='Cadastra embaixadores em lote')
+    parser.add_argument('arquivo', help='Planilha .csv ou .xlsx')
+    parser.add_argument('--output', help='Grava nome, CPF e cupom gerado neste CSV')
+    parser.add_argument('--processes', type=int, default=ONBOARD_HASH_PROCESSES,
+                        help='Processos usados para gerar os hashes das senhas')
+    parser.add_argument('--dry-run', action='store_true', help='Apenas valida a planilha, sem gravar')
+    args = parser.parse_args()
+    
+    with app.app_context(), open(args.arquivo, 'rb') as f:
+        try:
+            fields, rows = read_import_file(f, args.arquivo, ONBOARD_COLUMNS)
+            report = onboard_users(fields, rows, args.dry_run, args.processes)
+        except (ValueError, csv.Error) as e:
+            print(f"ERRO: Planilha inválida: {str(e)}")
+            return 1
+    
+    print("=" * 60)
+    print("Cadastro de Embaixadores em Lote")
+    print("=" * 60)
+    print(f"Linhas processadas: {report['processed']}")
+    print(f"Usuários cadastrados: {report['created']}")
+    print(f"Erros: {report['error_count']}")
+    print(f"Tempo: {report['elapsed_seconds']}s ({report['rows_per_second']} linhas/s)")
+    print("=" * 60)
+    
+    for error in report['errors']:
+        print(f"Linha {error['line']}: {error['message']}")
+    if report['error_count'] > len(report['errors']):
+        print(f"... e mais {report['error_count'] - len(report['errors'])} erro(s)")
+    
+    if not report['success']:
+        print("❌ Nenhum usuário cadastrado: corrija os erros da planilha.")
+        return 1
+    if report['dry_run']:
+        print("✅ Planilha válida (nada foi gravado: --dry-run).")
+        return 0
+    
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as out:
+            writer = csv.writer(out)
+            writer.writerow(['nome', 'cpf', 'cupom'])
+            for user in report['users']:
+                writer.writerow([csv_safe(user['name']), user['cpf'], user['coupon']])
+        print(f"Cupons gravados em {args.output}")
+    print("✅ Usuários cadastrados com sucesso!")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
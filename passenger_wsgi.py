@@ -20,7 +20,13 @@ if base_dir not in sys.path:
 os.environ.setdefault('FLASK_ENV', 'production')
 
 # Importa a aplicação Flask
-from app import app as application, create_tables
+# O esquema do banco NÃO é verificado aqui: após cada deploy, execute
+#   python migrations.py
+# para criar/atualizar as tabelas e o admin padrão e gravar a SECRET_KEY e o bytecode
+# dos módulos e templates (cada worker novo só lê), e
+#   python build_assets.py
+# para gerar os CSS/JS/imagens com hash (assets/dist)
+from app import app as application, init_worker
 
-# Garante que as tabelas e o admin padrão sejam criados
-create_tables()
+# Banco, templates e manifest dos estáticos antes da primeira requisição
+init_worker()
@@ -0,0 +1,130 @@
+"""
+Serviço de hash de senhas
+Centraliza algoritmo e custo (configuráveis), a atualização de hashes antigos
+no login e o pool limitado que tira o hashing da thread da requisição
+"""
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+import logging
+import threading
+import time
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+class PasswordHasherBusy(Exception):
+    """Fila de hashing cheia: a requisição deve ser recusada (503)"""
+
+class PasswordHasher:
+    """
+    Gera e confere hashes de senha
+
+    method: método do Werkzeug com custo, ex. 'scrypt:32768:8:1' ou 'pbkdf2:sha256:600000'
+    workers: threads dedicadas ao hashing (0 = executa na própria requisição)
+    max_queue: máximo de hashes em andamento + aguardando; acima disso levanta PasswordHasherBusy
+    observer: função opcional observer(operação, segundos) chamada após cada hash/conferência
+
+    O scrypt e o pbkdf2 do hashlib liberam o GIL, então threads usam vários núcleos
+    """
+
+    def __init__(self, method='scrypt', workers=0, max_queue=32, observer=None):
+        self.method = method
+        self.observer = observer
+        self.workers = workers
+        self.max_queue = max_queue
+        self._method_prefix = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_queue) if workers > 0 else None
+        self.stats = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0}
+
+    def _timed(self, operation, func, *args):
+        started = time.perf_counter()
+        try:
+            return self._run(func, *args)
+        finally:
+            if self.observer:
+                self.observer(operation, time.perf_counter() - started)
+
+    def _run(self, func, *args):
+        """Executa func no pool (se configurado), respeitando o limite da fila"""
+        if not self.workers:
+            return func(*args)
+
+        if not self._slots.acquire(blocking=False):
+            self.stats['rejected'] += 1
+            raise PasswordHasherBusy('Fila de hashing de senhas cheia')
+        try:
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='password-hash')
+        return self._executor
+
+    def hash(self, password):
+        """Gera o hash da senha com o método configurado"""
+        self.stats['hashed'] += 1
+        return self._timed('hash', generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        """Confere a senha com o hash armazenado"""
+        self.stats['verified'] += 1
+        return self._timed('verify', check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """Indica se o hash foi gerado com outro método/custo que o configurado"""
+        if self._method_prefix is None:
+            # O Werkzeug completa os parâmetros omitidos (ex.: 'scrypt' -> 'scrypt:32768:8:1');
+            # um hash descartável revela a forma completa uma única vez por processo
+            self._method_prefix = generate_password_hash('', self.method, salt_length=1).split('$', 1)[0]
+        return stored_hash.split('$', 1)[0] != self._method_prefix
+
+    def verify_and_update(self, stored_hash, password):
+        """
+        Confere a senha e, se o hash estiver desatualizado, gera um novo
+        Retorna (senha correta, novo hash ou None)
+        """
+        if not self.verify(stored_hash, password):
+            return False, None
+        if self.needs_rehash(stored_hash):
+            self.stats['rehashed'] += 1
+            return True, self.hash(password)
+        return True, None
+
+    def hash_many(self, passwords, processes=1, min_pool_size=20):
+        """
+        Gera hashes em lote (cadastros em massa)
+        Por padrão usa o pool de threads do serviço, com no máximo `workers` hashes na fila
+        por vez para não atrasar os logins. processes > 1 usa um pool de processos: só em
+        scripts, nunca em um worker web (fork de um processo com threads em execução)
+        Abaixo de min_pool_size senhas o custo de subir o pool de processos não compensa
+        """
+        passwords = list(passwords)
+        self.stats['hashed'] += len(passwords)
+        hash_one = partial(generate_password_hash, method=self.method)
+
+        if processes > 1 and len(passwords) >= min_pool_size:
+            try:
+                with ProcessPoolExecutor(max_workers=processes) as executor:
+                    chunksize = max(1, len(passwords) // (processes * 4))
+                    return list(executor.map(hash_one, passwords, chunksize=chunksize))
+            except (OSError, NotImplementedError) as e:
+                # Hospedagens sem suporte a multiprocessing: segue no processo atual
+                logger.warning('Pool de processos indisponível (%s), gerando hashes em série', e)
+        if not self.workers:
+            return [hash_one(p) for p in passwords]
+
+        executor = self._get_executor()
+        hashes = []
+        for start in range(0, len(passwords), self.workers):
+            futures = [executor.submit(hash_one, p) for p in passwords[start:start + self.workers]]
+            hashes.extend(future.result() for future in futures)
+        return hashes
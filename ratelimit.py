@@ -0,0 +1,186 @@
+"""
+Limite de tentativas de login (janela deslizante)
+Conta as falhas por chave (IP, CPF, usuário admin) e recusa novas tentativas
+acima do limite antes de qualquer consulta ao banco ou cálculo de hash.
+Os contadores ficam em memória (por processo) ou em um arquivo SQLite
+compartilhado entre os workers.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+
+def parse_rule(value):
+    """Converte 'tentativas/segundos' (ex.: '5/300') em (limite, janela)"""
+    limit, window = str(value).split('/', 1)
+    limit, window = int(limit), int(window)
+    if limit < 1 or window < 1:
+        raise ValueError(f'Regra de limite inválida: {value}')
+    return limit, window
+
+def _counts(record, bucket, window):
+    """(falhas na janela atual, falhas na anterior) a partir do registro (início, atual, anterior)"""
+    if record is None:
+        return 0, 0
+    start, current, previous = record
+    if start == bucket:
+        return current, previous
+    if start == bucket - window:
+        return 0, current
+    return 0, 0
+
+class MemoryRateStore:
+    """Contadores em um dict chave -> (início da janela, atual, anterior)"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def incr(self, key, bucket, window):
+        with self._lock:
+            current, previous = _counts(self._entries.get(key), bucket, window)
+            if key not in self._entries and len(self._entries) >= self.max_keys:
+                self._prune(bucket, window)
+            self._entries[key] = (bucket, current + 1, previous)
+
+    def reset(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def size(self):
+        return len(self._entries)
+
+    def _prune(self, bucket, window):
+        # Remove as chaves sem falhas nas duas últimas janelas; se não bastar, as mais antigas
+        self._entries = {k: v for k, v in self._entries.items() if v[0] >= bucket - window}
+        while len(self._entries) >= self.max_keys:
+            self._entries.pop(next(iter(self._entries)))
+
+class SQLiteRateStore:
+    """Contadores em um arquivo SQLite, vistos por todos os workers da hospedagem"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit ('
+                'key TEXT PRIMARY KEY, start INTEGER NOT NULL, '
+                'current INTEGER NOT NULL, previous INTEGER NOT NULL) WITHOUT ROWID'
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        return self._connection().execute(
+            'SELECT start, current, previous FROM rate_limit WHERE key = ?', (key,)
+        ).fetchone()
+
+    def incr(self, key, bucket, window):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            current, previous = _counts(self.get(key), bucket, window)
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_limit (key, start, current, previous) VALUES (?, ?, ?, ?)',
+                (key, bucket, current + 1, previous)
+            )
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                conn.execute('DELETE FROM rate_limit WHERE start < ?', (bucket - window,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def reset(self, key):
+        self._connection().execute('DELETE FROM rate_limit WHERE key = ?', (key,))
+
+    def size(self):
+        return self._connection().execute('SELECT COUNT(*) FROM rate_limit').fetchone()[0]
+
+class SlidingWindowLimiter:
+    """
+    Limites de falhas por regra, ex.: {'ip': (20, 300), 'cpf': (5, 300)}
+    Janela deslizante aproximada: falhas da janela atual + as da anterior
+    proporcionais ao tempo que ainda se sobrepõe à janela deslizante
+    """
+
+    def __init__(self, rules, store=None, enabled=True):
+        self.rules = rules
+        self.store = store or MemoryRateStore()
+        self.enabled = enabled
+        self.stats = {'checked': 0, 'rejected': 0, 'failures': 0,
+                      'rejected_by_rule': {name: 0 for name in rules}}
+
+    def _retry_after(self, rule, value, now):
+        limit, window = self.rules[rule]
+        bucket = int(now // window) * window
+        current, previous = _counts(self.store.get(f'{rule}:{value}'), bucket, window)
+        elapsed = now - bucket
+        if previous * (1 - elapsed / window) + current < limit:
+            return 0
+
+        # Tempo até a estimativa cair abaixo do limite
+        if current >= limit:
+            wait = window - elapsed  # a janela atual passa a ser a anterior
+            previous, elapsed = current, 0
+            current = 0
+        else:
+            wait = 0
+        needed = window * (1 - (limit - current) / previous) - elapsed
+        return max(1, math.ceil(wait + max(needed, 0)))
+
+    def retry_after(self, checks):
+        """
+        checks: pares (regra, valor) a conferir antes do login
+        Retorna 0 se liberado ou os segundos de espera (maior entre as regras estouradas)
+        """
+        if not self.enabled:
+            return 0
+        self.stats['checked'] += 1
+        now = time.time()
+        wait = 0
+        for rule, value in checks:
+            rule_wait = self._retry_after(rule, value, now)
+            if rule_wait:
+                self.stats['rejected_by_rule'][rule] += 1
+                wait = max(wait, rule_wait)
+        if wait:
+            self.stats['rejected'] += 1
+        return wait
+
+    def hit(self, checks):
+        """Registra uma tentativa de login que falhou"""
+        if not self.enabled:
+            return
+        self.stats['failures'] += 1
+        now = time.time()
+        for rule, value in checks:
+            window = self.rules[rule][1]
+            self.store.incr(f'{rule}:{value}', int(now // window) * window, window)
+
+    def reset(self, rule, value):
+        """Zera a contagem de uma chave (ex.: CPF após login correto)"""
+        if self.enabled:
+            self.store.reset(f'{rule}:{value}')
+
+    def snapshot(self):
+        """Contadores para monitoramento"""
+        return dict(self.stats,
+                    rejected_by_rule=dict(self.stats['rejected_by_rule']),
+                    tracked_keys=self.store.size() if self.enabled else 0)
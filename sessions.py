@@ -0,0 +1,313 @@
+"""
+Sessões guardadas no servidor
+O cookie leva apenas um identificador aleatório; os dados ficam em um armazenamento
+(tabela do banco ou arquivos em diretórios fragmentados). A sessão só é lida quando
+a requisição a usa e só é gravada quando muda, e as expiradas são removidas por
+uma thread em segundo plano. Permite revogar as sessões de um usuário na hora.
+"""
+
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+
+import sqlalchemy as sa
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+
+logger = logging.getLogger(__name__)
+
+SID_PATTERN = re.compile(r'[A-Za-z0-9_-]{43}')  # secrets.token_urlsafe(32)
+
+class ServerSession(dict, SessionMixin):
+    """
+    Sessão com carregamento sob demanda: o armazenamento só é consultado
+    no primeiro acesso aos dados
+    """
+
+    def __init__(self, sid=None, loader=None):
+        super().__init__()
+        self.sid = sid
+        self.new = loader is None
+        self.modified = False
+        self.accessed = False
+        self.owner = None       # dono no momento da leitura (detecta login/troca de usuário)
+        self.expires_at = 0.0
+        self._loader = loader
+
+    def _load(self):
+        self.accessed = True
+        if self._loader is None:
+            return
+        loader, self._loader = self._loader, None
+        record = loader()
+        if record is None:
+            self.new = True  # sid desconhecido ou expirado: nunca reaproveitado
+            return
+        data, self.owner, self.expires_at = record
+        dict.update(self, data)
+
+def _reader(name):
+    def method(self, *args, **kwargs):
+        self._load()
+        return getattr(dict, name)(self, *args, **kwargs)
+    method.__name__ = name
+    return method
+
+def _writer(name):
+    def method(self, *args, **kwargs):
+        self._load()
+        self.modified = True
+        return getattr(dict, name)(self, *args, **kwargs)
+    method.__name__ = name
+    return method
+
+for _name in ('__getitem__', '__contains__', '__iter__', '__len__', '__repr__',
+              'get', 'keys', 'values', 'items', 'copy'):
+    setattr(ServerSession, _name, _reader(_name))
+for _name in ('__setitem__', '__delitem__', 'clear', 'pop', 'popitem', 'setdefault', 'update'):
+    setattr(ServerSession, _name, _writer(_name))
+
+# ==================== ARMAZENAMENTOS ====================
+
+class DatabaseSessionStore:
+    """
+    Sessões em uma tabela (sid, owner, data, expires_at)
+    engine: função que retorna o engine (ex.: lambda: db.engine)
+    """
+
+    def __init__(self, table, engine):
+        self.table = table
+        self._engine = engine
+
+    def load(self, sid):
+        t = self.table
+        with self._engine().connect() as conn:
+            row = conn.execute(
+                sa.select(t.c.data, t.c.owner, t.c.expires_at).where(t.c.sid == sid)
+            ).first()
+        if row is None or row.expires_at < time.time():
+            return None
+        return session_json_serializer.loads(row.data), row.owner, row.expires_at
+
+    def save(self, sid, data, owner, expires_at):
+        t = self.table
+        values = {'owner': owner, 'data': session_json_serializer.dumps(data), 'expires_at': int(expires_at)}
+        with self._engine().begin() as conn:
+            result = conn.execute(t.update().where(t.c.sid == sid).values(**values))
+            if result.rowcount == 0:
+                conn.execute(t.insert().values(sid=sid, **values))
+
+    def touch(self, sid, expires_at):
+        t = self.table
+        with self._engine().begin() as conn:
+            conn.execute(t.update().where(t.c.sid == sid).values(expires_at=int(expires_at)))
+
+    def delete(self, sid):
+        t = self.table
+        with self._engine().begin() as conn:
+            conn.execute(t.delete().where(t.c.sid == sid))
+
+    def revoke(self, owner):
+        t = self.table
+        with self._engine().begin() as conn:
+            return conn.execute(t.delete().where(t.c.owner == owner)).rowcount
+
+    def sweep(self):
+        t = self.table
+        with self._engine().begin() as conn:
+            return conn.execute(t.delete().where(t.c.expires_at < int(time.time()))).rowcount
+
+class FileSessionStore:
+    """
+    Sessões em arquivos: <root>/ab/cd/<sid>, um arquivo JSON por sessão
+    O mtime do arquivo guarda a expiração (renovar = os.utime, sem reescrever)
+    e <root>/owners/<dono>/<sid> indexa as sessões de cada usuário para a revogação
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, sid):
+        return os.path.join(self.root, sid[:2], sid[2:4], sid)
+
+    def _owner_dir(self, owner):
+        return os.path.join(self.root, 'owners', owner.replace(':', '-'))
+
+    def load(self, sid):
+        path = self._path(sid)
+        try:
+            expires_at = os.stat(path).st_mtime
+            if expires_at < time.time():
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                record = session_json_serializer.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        return record['data'], record['owner'], expires_at
+
+    def save(self, sid, data, owner, expires_at):
+        path = self._path(sid)
+        tmp_file = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(session_json_serializer.dumps({'data': data, 'owner': owner}))
+        os.utime(tmp_file, (expires_at, expires_at))
+        os.replace(tmp_file, path)
+
+        if owner:
+            owner_dir = self._owner_dir(owner)
+            os.makedirs(owner_dir, exist_ok=True)
+            open(os.path.join(owner_dir, sid), 'a').close()
+
+    def touch(self, sid, expires_at):
+        try:
+            os.utime(self._path(sid), (expires_at, expires_at))
+        except OSError:
+            pass
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except OSError:
+            pass
+        # O marcador em owners/ é removido pela varredura
+
+    def revoke(self, owner):
+        owner_dir = self._owner_dir(owner)
+        try:
+            sids = os.listdir(owner_dir)
+        except OSError:
+            return 0
+
+        revoked = 0
+        for sid in sids:
+            try:
+                os.remove(self._path(sid))
+                revoked += 1
+            except OSError:
+                pass
+            try:
+                os.remove(os.path.join(owner_dir, sid))
+            except OSError:
+                pass
+        return revoked
+
+    def sweep(self):
+        now = time.time()
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root:
+                dirnames[:] = [d for d in dirnames if d != 'owners']
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.stat(path).st_mtime < now:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+
+        # Marcadores de sessões que não existem mais
+        owners_root = os.path.join(self.root, 'owners')
+        for dirpath, _, filenames in os.walk(owners_root):
+            for sid in filenames:
+                if not os.path.exists(self._path(sid)):
+                    try:
+                        os.remove(os.path.join(dirpath, sid))
+                    except OSError:
+                        pass
+        return removed
+
+# ==================== INTERFACE DO FLASK ====================
+
+class ServerSessionInterface(SessionInterface):
+    """
+    SessionInterface do Flask sobre um dos armazenamentos acima
+
+    owner: função que recebe os dados da sessão e retorna o dono (ex.: 'user:5') ou None
+    refresh_interval: segundos mínimos entre renovações da expiração de uma sessão não alterada
+    sweep_interval: segundos entre varreduras de sessões expiradas (0 = desligado)
+    """
+
+    def __init__(self, store, owner=None, refresh_interval=60, sweep_interval=900):
+        self.store = store
+        self.owner = owner or (lambda data: None)
+        self.refresh_interval = refresh_interval
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+        self._sweeper_lock = threading.Lock()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or not SID_PATTERN.fullmatch(sid):
+            return ServerSession()
+        return ServerSession(sid, lambda: self.store.load(sid))
+
+    def save_session(self, app, session, response):
+        if not session.accessed:
+            return  # requisição não usou a sessão: nenhuma leitura, escrita ou cookie
+        response.vary.add('Cookie')
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        expires_at = now + lifetime
+        owner = self.owner(session)
+
+        if session.modified or session.new:
+            # Novo sid a cada login/troca de dono (evita fixação de sessão)
+            if session.new or owner != session.owner:
+                if not session.new:
+                    self.store.delete(session.sid)
+                session.sid = secrets.token_urlsafe(32)
+            self.store.save(session.sid, dict(session), owner, expires_at)
+        elif session.expires_at - lifetime + self.refresh_interval <= now:
+            self.store.touch(session.sid, expires_at)
+        else:
+            return
+
+        response.set_cookie(
+            name, session.sid,
+            expires=expires_at if session.permanent else None,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+        self._start_sweeper(app)
+
+    def revoke(self, owner):
+        """Remove todas as sessões do dono; retorna quantas foram removidas"""
+        return self.store.revoke(owner)
+
+    def _start_sweeper(self, app):
+        if not self.sweep_interval or self._sweeper is not None:
+            return
+        with self._sweeper_lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, args=(app,),
+                                                 name='session-sweeper', daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self, app):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                with app.app_context():
+                    self.store.sweep()
+            except Exception:
+                logger.exception('Falha ao remover sessões expiradas')
@@ -0,0 +1,24 @@
+"""
+Configuração dos testes: banco SQLite e arquivos auxiliares em um diretório temporário
+As variáveis de ambiente precisam estar definidas antes do primeiro "import app"
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_workdir = tempfile.mkdtemp(prefix='odonto-tests-')
+os.environ.update(
+    DATABASE_URL='sqlite:///' + os.path.join(_workdir, 'users.db'),
+    SECRET_KEY='testes',
+    SESSION_FILE_DIR=os.path.join(_workdir, 'sessions'),
+    RANKING_CACHE_FILE=os.path.join(_workdir, '.ranking_version'),
+    COUPON_CACHE_FILE=os.path.join(_workdir, '.coupon_version'),
+    EVENTS_FILE=os.path.join(_workdir, 'events.db'),
+    LOGIN_RATE_LIMIT_FILE=os.path.join(_workdir, 'ratelimit.db'),
+    TEMPLATE_BYTECODE_DIR='',
+    LOG_LEVEL='WARNING'
+)
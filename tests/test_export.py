@@ -0,0 +1,38 @@
+"""Exportação da base de embaixadores (generate_export)"""
+
+import csv
+import io
+import json
+
+import pytest
+
+import app as A
+import migrations
+
+@pytest.fixture
+def users():
+    migrations.migrate()
+    with A.app.app_context():
+        A.db.session.query(A.User).delete()
+        for i, (name, cpf) in enumerate([('=HYPERLINK("http://x")', '529.982.247-25'),
+                                         ('-2+3', '111.444.777-35'), ('Ana', '123.456.789-09')]):
+            A.db.session.add(A.User(name=name, cpf=cpf, password='x', coupon=f'CUPOM{i}',
+                                    total_sales=float(i), sales_cents=i * 100))
+        A.db.session.commit()
+        yield
+        A.db.session.query(A.User).delete()
+        A.db.session.commit()
+
+def export(fmt):
+    options = A.parse_export_options({'format': fmt, 'columns': 'name,total_sales', 'sort': 'id'})
+    return ''.join(A.generate_export(options))
+
+def test_csv_cells_are_not_read_as_formulas(users):
+    with A.app.app_context():
+        rows = list(csv.reader(io.StringIO(export('csv').lstrip('\ufeff'))))
+    assert rows == [['nome', 'vendas'], ['\'=HYPERLINK("http://x")', '0.0'], ["'-2+3", '1.0'], ['Ana', '2.0']]
+
+def test_ndjson_keeps_names_unchanged(users):
+    with A.app.app_context():
+        records = [json.loads(line) for line in export('ndjson').splitlines()]
+    assert [r['name'] for r in records] == ['=HYPERLINK("http://x")', '-2+3', 'Ana']
@@ -0,0 +1,43 @@
+"""Migrações aplicadas a um banco no esquema anterior"""
+
+import sqlalchemy as sa
+
+import app as A
+import migrations
+
+# Tabela user como ficava depois das migrações 1, 4, 6 e 7 (total_sales ainda anulável)
+LEGACY_USER_DDL = '''
+    CREATE TABLE user (
+        id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, cpf VARCHAR(14) NOT NULL,
+        password VARCHAR(200) NOT NULL, coupon VARCHAR(50) NOT NULL, total_sales FLOAT,
+        total_lists INTEGER, goal FLOAT, sales_cents BIGINT NOT NULL DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 1, updated_at TIMESTAMP, change_seq BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (id), UNIQUE (cpf), UNIQUE (coupon)
+    )
+'''
+
+def test_null_total_sales_filled_and_made_not_null():
+    engine = sa.create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.exec_driver_sql(LEGACY_USER_DDL)
+        A.ranking_index.create(conn)
+        conn.exec_driver_sql("""
+            INSERT INTO user (id, name, cpf, password, coupon, total_sales, sales_cents) VALUES
+                (1, 'Ana', '529.982.247-25', 'x', 'ANA', 120.5, 12050),
+                (2, 'Bruno', '111.444.777-35', 'x', 'BRUNO', NULL, 990)
+        """)
+
+    with engine.begin() as conn:
+        migrations.fill_null_total_sales(conn)
+        migrations.require_total_sales(conn)
+
+    with engine.begin() as conn:
+        columns = {col['name']: col for col in sa.inspect(conn).get_columns('user')}
+        assert not columns['total_sales']['nullable']
+        indexes = {index['name'] for index in sa.inspect(conn).get_indexes('user')}
+        assert {'ix_user_ranking', 'ix_user_change_seq'} <= indexes
+        rows = conn.exec_driver_sql('SELECT id, total_sales FROM user ORDER BY id').all()
+        assert rows == [(1, 120.5), (2, 9.9)]
+
+        conn.exec_driver_sql("INSERT INTO user (name, cpf, password, coupon) VALUES ('Caio', 'c', 'x', 'CAIO')")
+        assert conn.exec_driver_sql("SELECT total_sales FROM user WHERE coupon = 'CAIO'").scalar() == 0.0
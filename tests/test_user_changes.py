@@ -0,0 +1,72 @@
+"""Sincronização incremental da tabela do admin (/admin/api/users/changes)"""
+
+import pytest
+
+import app as A
+import migrations
+
+@pytest.fixture
+def admin():
+    migrations.migrate()
+    with A.app.app_context():
+        A.db.session.query(A.User).delete()
+        A.db.session.query(A.UserTombstone).delete()
+        A.db.session.commit()
+    client = A.app.test_client()
+    response = client.post('/admin/login', json={'username': 'admin', 'password': 'adminmaster123'})
+    assert response.get_json()['success']
+    yield client
+    with A.app.app_context():
+        A.db.session.query(A.User).delete()
+        A.db.session.query(A.UserTombstone).delete()
+        A.db.session.commit()
+
+def create_user(client, name, cpf):
+    response = client.post('/admin/api/user', json={'name': name, 'cpf': cpf, 'password': 'segredo1'})
+    return response.get_json()['user']['id']
+
+def changes(client, since):
+    return client.get(f'/admin/api/users/changes?since={since}').get_json()
+
+def test_reused_id_is_not_listed_as_deleted(admin):
+    first = create_user(admin, 'Ana', '529.982.247-25')
+    since = changes(admin, 0)['version']
+    assert admin.delete(f'/admin/api/user/{first}').get_json()['success']
+    assert changes(admin, since)['deleted'] == [first]
+
+    # Sem AUTOINCREMENT o SQLite devolve o mesmo id ao próximo usuário
+    second = create_user(admin, 'Bruno', '111.444.777-35')
+    assert second == first
+    result = changes(admin, since)
+    assert [u['id'] for u in result['users']] == [second]
+    assert result['deleted'] == []
+
+def test_reused_id_does_not_repeat_etag(admin):
+    first = create_user(admin, 'Ana', '529.982.247-25')
+    etag = admin.get(f'/admin/api/user/{first}').headers['ETag']
+    assert admin.delete(f'/admin/api/user/{first}').get_json()['success']
+
+    second = create_user(admin, 'Bruno', '111.444.777-35')
+    assert second == first
+    response = admin.get(f'/admin/api/user/{second}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['name'] == 'Bruno'
+
+def test_sales_and_goal_edit_advances_row_once(admin):
+    user_id = create_user(admin, 'Ana', '529.982.247-25')
+    with A.app.app_context():
+        before = A.db.session.get(A.User, user_id)
+        version, change_seq = before.version, before.change_seq
+
+    response = admin.put(f'/admin/api/user/{user_id}', json={'total_sales': 150.25, 'goal': 1000})
+    assert response.get_json()['user']['goal'] == 1000
+    with A.app.app_context():
+        after = A.db.session.get(A.User, user_id)
+        assert (after.version, after.change_seq) == (version + 1, change_seq + 1)
+        assert after.sales_cents == 15025
+
+    # Só a meta: o evento do ORM incrementa a versão
+    admin.put(f'/admin/api/user/{user_id}', json={'goal': 2000})
+    with A.app.app_context():
+        after = A.db.session.get(A.User, user_id)
+        assert (after.version, after.goal) == (version + 2, 2000)
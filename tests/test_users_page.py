@@ -0,0 +1,65 @@
+"""Paginação por keyset da listagem de usuários do admin (query_users_page)"""
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import app as A
+import migrations
+from cpf import format_cpf
+
+def make_cpf(number):
+    """CPF válido formatado a partir dos 9 primeiros dígitos"""
+    digits = [int(c) for c in f'{number:09d}']
+    for weight in (10, 11):
+        total = sum(d * w for d, w in zip(digits, range(weight, 1, -1)))
+        remainder = total % 11
+        digits.append(0 if remainder < 2 else 11 - remainder)
+    return format_cpf(''.join(map(str, digits)))
+
+@pytest.fixture
+def users():
+    """5 usuários; 2 sem vendas, como as linhas de total_sales nulo depois das migrações 8 e 9"""
+    migrations.migrate()
+    with A.app.app_context():
+        A.db.session.query(A.User).delete()
+        sales = [300.0, 0.0, 150.0, 0.0, 150.0]
+        for i, value in enumerate(sales):
+            A.db.session.add(A.User(name=f'Embaixador {i}', cpf=make_cpf(100000001 + i), password='x',
+                                    coupon=f'CUPOM{i}', total_sales=value, sales_cents=round(value * 100)))
+        A.db.session.commit()
+        yield [u.id for u in A.User.query.order_by(A.User.id)]
+        A.db.session.query(A.User).delete()
+        A.db.session.commit()
+
+def all_pages(sort, limit):
+    seen, cursor = [], None
+    while True:
+        page, next_cursor = A.query_users_page(sort=sort, cursor=cursor, limit=limit)
+        seen.extend(u.id for u in page)
+        if next_cursor is None:
+            return seen
+        cursor = A.decode_cursor(next_cursor, sort)
+
+def test_sales_pages_cross_rows_without_sales(users):
+    with A.app.app_context():
+        # Página de 2: a borda cai entre as linhas empatadas em zero
+        seen = all_pages('sales', limit=2)
+        assert seen == [users[0], users[2], users[4], users[1], users[3]]
+
+def test_total_sales_is_never_null(users):
+    table = A.User.__table__
+    with A.app.app_context():
+        # Inserção fora do ORM sem total_sales recebe o padrão do banco
+        A.db.session.execute(table.insert().values(name='Sem ORM', cpf=make_cpf(100000009), password='x',
+                                                   coupon='SEMORM', sales_cents=0))
+        A.db.session.commit()
+        assert A.db.session.execute(
+            A.db.select(table.c.total_sales).where(table.c.coupon == 'SEMORM')).scalar_one() == 0.0
+
+        with pytest.raises(IntegrityError):
+            A.db.session.execute(table.update().where(table.c.id == users[0]).values(total_sales=None))
+        A.db.session.rollback()
+
+def test_recent_pages_list_every_user_once(users):
+    with A.app.app_context():
+        assert all_pages('recent', limit=2) == sorted(users, reverse=True)